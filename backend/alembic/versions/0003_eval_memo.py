@@ -0,0 +1,34 @@
+"""add eval memo
+
+Revision ID: 0003_eval_memo
+Revises: 0002_evals
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_eval_memo"
+down_revision = "0002_evals"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "eval_memo",
+        sa.Column("key", sa.String(length=64), primary_key=True),
+        sa.Column("evaluator", sa.String(length=100), nullable=False),
+        sa.Column("version", sa.String(length=32), nullable=False),
+        sa.Column("scores", sa.JSON(), nullable=True),
+        sa.Column("notes", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("eval_memo")
@@ -0,0 +1,29 @@
+"""add run_evals.idempotency_key
+
+Revision ID: 0004_run_eval_idempotency
+Revises: 0003_eval_memo
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_run_eval_idempotency"
+down_revision = "0003_eval_memo"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("run_evals", sa.Column("idempotency_key", sa.String(length=200), nullable=True))
+    op.create_index(
+        "ix_run_evals_idempotency_key", "run_evals", ["idempotency_key"], unique=True, if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_run_evals_idempotency_key", table_name="run_evals")
+    op.drop_column("run_evals", "idempotency_key")
@@ -0,0 +1,45 @@
+"""add run similarity (MinHash/LSH) index
+
+Revision ID: 0005_run_similarity
+Revises: 0004_run_eval_idempotency
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_run_similarity"
+down_revision = "0004_run_eval_idempotency"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "run_minhash",
+        sa.Column(
+            "run_id", sa.Integer(), sa.ForeignKey("agent_runs.id", ondelete="CASCADE"), primary_key=True
+        ),
+        sa.Column("signature", sa.LargeBinary(), nullable=False),
+        sa.Column("indexed_at", sa.DateTime(timezone=True), nullable=False),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "run_lsh_buckets",
+        sa.Column("band", sa.SmallInteger(), primary_key=True),
+        sa.Column("bucket", sa.BigInteger(), primary_key=True),
+        sa.Column(
+            "run_id", sa.Integer(), sa.ForeignKey("agent_runs.id", ondelete="CASCADE"), primary_key=True
+        ),
+        if_not_exists=True,
+    )
+    op.create_index("ix_run_lsh_buckets_run_id", "run_lsh_buckets", ["run_id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_run_lsh_buckets_run_id", table_name="run_lsh_buckets")
+    op.drop_table("run_lsh_buckets")
+    op.drop_table("run_minhash")
@@ -0,0 +1,59 @@
+"""add replay suites
+
+Revision ID: 0006_replay_suites
+Revises: 0005_run_similarity
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_replay_suites"
+down_revision = "0005_run_similarity"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "replay_suites",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(length=200), nullable=True),
+        sa.Column("model", sa.String(length=200), nullable=True),
+        sa.Column("concurrency", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=50), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("completed", sa.Integer(), nullable=False),
+        sa.Column("failed", sa.Integer(), nullable=False),
+        sa.Column("summary", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "replay_suite_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "suite_id", sa.Integer(), sa.ForeignKey("replay_suites.id", ondelete="CASCADE"), nullable=False
+        ),
+        sa.Column("run_id", sa.Integer(), sa.ForeignKey("agent_runs.id", ondelete="SET NULL"), nullable=True),
+        sa.Column(
+            "replay_run_id", sa.Integer(), sa.ForeignKey("agent_runs.id", ondelete="SET NULL"), nullable=True
+        ),
+        sa.Column("status", sa.String(length=50), nullable=False),
+        sa.Column("diff", sa.JSON(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_replay_suite_items_suite_id", "replay_suite_items", ["suite_id"], if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_replay_suite_items_suite_id", table_name="replay_suite_items")
+    op.drop_table("replay_suite_items")
+    op.drop_table("replay_suites")
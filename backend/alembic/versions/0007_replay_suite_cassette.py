@@ -0,0 +1,25 @@
+"""add replay_suites.cassette
+
+Revision ID: 0007_replay_suite_cassette
+Revises: 0006_replay_suites
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007_replay_suite_cassette"
+down_revision = "0006_replay_suites"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("replay_suites", sa.Column("cassette", sa.String(length=20), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("replay_suites", "cassette")
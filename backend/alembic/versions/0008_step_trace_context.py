@@ -0,0 +1,29 @@
+"""add agent_steps.trace_id / span_id
+
+Revision ID: 0008_step_trace_context
+Revises: 0007_replay_suite_cassette
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008_step_trace_context"
+down_revision = "0007_replay_suite_cassette"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("agent_steps", sa.Column("trace_id", sa.String(length=32), nullable=True))
+    op.add_column("agent_steps", sa.Column("span_id", sa.String(length=16), nullable=True))
+    op.create_index("ix_agent_steps_trace_id", "agent_steps", ["trace_id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_agent_steps_trace_id", table_name="agent_steps")
+    op.drop_column("agent_steps", "span_id")
+    op.drop_column("agent_steps", "trace_id")
@@ -0,0 +1,29 @@
+"""add agent_runs.otlp_trace_id
+
+Revision ID: 0009_otlp_runs
+Revises: 0008_step_trace_context
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009_otlp_runs"
+down_revision = "0008_step_trace_context"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("agent_runs", sa.Column("otlp_trace_id", sa.String(length=32), nullable=True))
+    op.create_index(
+        "ux_agent_runs_otlp_trace_id", "agent_runs", ["otlp_trace_id"], unique=True, if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_agent_runs_otlp_trace_id", table_name="agent_runs")
+    op.drop_column("agent_runs", "otlp_trace_id")
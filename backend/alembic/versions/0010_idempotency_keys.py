@@ -0,0 +1,42 @@
+"""add client idempotency keys to agent_runs and agent_steps
+
+Revision ID: 0010_idempotency_keys
+Revises: 0009_otlp_runs
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010_idempotency_keys"
+down_revision = "0009_otlp_runs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("agent_runs", sa.Column("idempotency_key", sa.String(length=64), nullable=True))
+    op.create_index(
+        "ux_agent_runs_idempotency_key", "agent_runs", ["idempotency_key"], unique=True, if_not_exists=True
+    )
+
+    op.add_column("agent_steps", sa.Column("idempotency_key", sa.String(length=64), nullable=True))
+    op.add_column("agent_steps", sa.Column("seq", sa.Integer(), nullable=True))
+    op.create_index(
+        "ux_agent_steps_run_idempotency_key",
+        "agent_steps",
+        ["run_id", "idempotency_key"],
+        unique=True,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_agent_steps_run_idempotency_key", table_name="agent_steps")
+    op.drop_column("agent_steps", "seq")
+    op.drop_column("agent_steps", "idempotency_key")
+    op.drop_index("ux_agent_runs_idempotency_key", table_name="agent_runs")
+    op.drop_column("agent_runs", "idempotency_key")
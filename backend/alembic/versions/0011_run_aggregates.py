@@ -0,0 +1,35 @@
+"""add incrementally maintained step aggregates to agent_runs
+
+Revision ID: 0011_run_aggregates
+Revises: 0010_idempotency_keys
+Create Date: 2026-10-19
+
+Existing runs start at zero; the orchestrai.backfill_run_totals task (POST /runs/totals/backfill)
+recomputes them from their steps.
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0011_run_aggregates"
+down_revision = "0010_idempotency_keys"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("agent_runs", sa.Column("step_count", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("agent_runs", sa.Column("error_count", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("agent_runs", sa.Column("total_latency_ms", sa.Float(), nullable=False, server_default="0"))
+    op.add_column("agent_runs", sa.Column("first_step_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("agent_runs", sa.Column("last_step_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("agent_runs", "last_step_at")
+    op.drop_column("agent_runs", "first_step_at")
+    op.drop_column("agent_runs", "total_latency_ms")
+    op.drop_column("agent_runs", "error_count")
+    op.drop_column("agent_runs", "step_count")
@@ -0,0 +1,296 @@
+"""Auto-evaluation consumer: scores every finished run without a per-run API call.
+
+Reads run completions from the FINISHED_RUNS_STREAM consumer group, samples them per agent,
+and hands micro-batches to the Celery eval worker. With the similarity index enabled, every
+completion in the batch is also (re)indexed for `GET /runs/{id}/similar`. Entries are acknowledged only after the
+batch task succeeds, so processing is at-least-once; the worker's idempotent RunEval writes
+make redelivery harmless. Failed entries are retried one at a time and dead-lettered after
+AUTO_EVAL_MAX_DELIVERIES attempts. In embedded mode the API runs the consumer on a thread instead.
+
+    python -m app.auto_eval
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import statistics
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any
+
+import redis
+
+from app.config import settings
+from app.events import FINISHED_RUNS_STREAM
+from app.local_bus import bus as local_bus
+
+log = logging.getLogger("orchestrai.auto_eval")
+
+GROUP = "auto-eval"
+STATS_KEY = "orchestrai:auto_eval:stats"
+# Completions that kept failing, with their entry id and delivery count, for inspection.
+DEAD_LETTER_STREAM = FINISHED_RUNS_STREAM + ":dead"
+
+# Entries pending this long on another consumer are assumed orphaned and claimed.
+CLAIM_IDLE_MS = 60_000
+BATCH_TIMEOUT_S = 300
+
+
+def sample_rate(agent_name: str) -> float:
+    return settings.auto_eval_agent_sample_rates.get(agent_name, settings.auto_eval_sample_rate)
+
+
+def sampled(run_id: int, agent_name: str) -> bool:
+    """Deterministic per-run sampling, so a redelivered completion gets the same decision."""
+    rate = sample_rate(agent_name)
+    if rate >= 1.0:
+        return True
+    if rate <= 0.0:
+        return False
+    return zlib.crc32(str(run_id).encode()) % 10_000 < rate * 10_000
+
+
+class AutoEvalConsumer:
+    def __init__(self, r: redis.Redis | None, name: str, batch_size: int, max_wait_ms: int) -> None:
+        self.r = r
+        self.name = name
+        self.batch_size = batch_size
+        self.max_wait_ms = max_wait_ms
+        self.lags_ms: deque[float] = deque(maxlen=1000)
+        self.evaluated = 0
+        self.skipped = 0
+        self.indexed = 0
+
+    def ensure_group(self) -> None:
+        try:
+            self.r.xgroup_create(FINISHED_RUNS_STREAM, GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def recover(self) -> list[tuple[str, dict]]:
+        """Entries delivered before but never acked: our own pending list, then stale ones from others.
+
+        Both are re-claimed, which counts as a delivery. Entries delivered more than
+        AUTO_EVAL_MAX_DELIVERIES times are moved to DEAD_LETTER_STREAM and acked, not retried.
+        """
+        pending = self.r.xpending_range(FINISHED_RUNS_STREAM, GROUP, "-", "+", self.batch_size, consumername=self.name)
+        own = [p["message_id"] for p in pending]
+        entries = self.r.xclaim(FINISHED_RUNS_STREAM, GROUP, self.name, 0, own) if own else []
+        if len(own) < self.batch_size:
+            _, claimed, *_ = self.r.xautoclaim(
+                FINISHED_RUNS_STREAM, GROUP, self.name, CLAIM_IDLE_MS, "0-0", count=self.batch_size - len(own)
+            )
+            entries.extend(claimed)
+        # Entries trimmed from the stream come back without fields (or not at all). Ack them, or
+        # they would stay pending and, once batch_size of them piled up, crowd real entries out.
+        returned = {entry_id for entry_id, _ in entries}
+        trimmed = [entry_id for entry_id, fields in entries if not fields] + [i for i in own if i not in returned]
+        if trimmed:
+            self.ack(trimmed)
+        entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+        if not entries:
+            return []
+
+        # Every entry is now on our pending list, within its first batch_size ids.
+        deliveries = {
+            p["message_id"]: p["times_delivered"]
+            for p in self.r.xpending_range(
+                FINISHED_RUNS_STREAM, GROUP, "-", "+", self.batch_size, consumername=self.name
+            )
+        }
+        dead = [(i, f) for i, f in entries if deliveries.get(i, 1) > settings.auto_eval_max_deliveries]
+        if dead:
+            self.dead_letter(dead, deliveries)
+        return [(i, f) for i, f in entries if deliveries.get(i, 1) <= settings.auto_eval_max_deliveries]
+
+    def dead_letter(self, entries: list[tuple[str, dict]], deliveries: dict[str, int]) -> None:
+        for entry_id, fields in entries:
+            log.warning("completion %s failed %d deliveries; dead-lettered", entry_id, deliveries[entry_id])
+            self.r.xadd(
+                DEAD_LETTER_STREAM,
+                {**fields, "entry_id": entry_id, "deliveries": deliveries[entry_id]},
+                maxlen=settings.auto_eval_stream_maxlen,
+                approximate=True,
+            )
+        self.ack([entry_id for entry_id, _ in entries])
+
+    def next_batch(self) -> list[tuple[str, dict]]:
+        """Collect up to batch_size new entries, waiting at most max_wait_ms after the first."""
+        batch: list[tuple[str, dict]] = []
+        deadline: float | None = None
+        while len(batch) < self.batch_size:
+            if deadline is None:
+                block_ms = self.max_wait_ms
+            else:
+                block_ms = int((deadline - time.monotonic()) * 1000)
+                if block_ms <= 0:
+                    break
+            res = self.r.xreadgroup(
+                GROUP, self.name, {FINISHED_RUNS_STREAM: ">"}, count=self.batch_size - len(batch), block=block_ms
+            )
+            if not res:
+                if batch:
+                    break
+                continue
+            if deadline is None:
+                deadline = time.monotonic() + self.max_wait_ms / 1000
+            batch.extend(res[0][1])
+        return batch
+
+    def process(self, entries: list[tuple[str, dict]]) -> None:
+        from app.worker import send_task
+
+        # Latest completion per run wins within a batch.
+        items: dict[int, dict[str, Any]] = {}
+        run_ids: set[int] = set()
+        for entry_id, fields in entries:
+            run_id = int(fields["run_id"])
+            run_ids.add(run_id)
+            if not settings.auto_eval_enabled or not sampled(run_id, fields.get("agent_name", "")):
+                self.skipped += 1
+                continue
+            items[run_id] = {"run_id": run_id, "key": f"auto:{entry_id}", "finished_at": float(fields["finished_at"])}
+
+        if items:
+            job = send_task("orchestrai.evaluate_runs_batch", args=[list(items.values())])
+            result = job.get(timeout=BATCH_TIMEOUT_S)
+            self.evaluated += result.get("evaluated", 0)
+            self.lags_ms.extend(result.get("lag_ms", []))
+
+        if settings.similarity_index_enabled and run_ids:
+            job = send_task("orchestrai.index_runs_similarity", args=[sorted(run_ids)])
+            self.indexed += job.get(timeout=BATCH_TIMEOUT_S).get("indexed", 0)
+
+        self.ack([entry_id for entry_id, _ in entries])
+        self.publish_stats(len(entries))
+
+    def process_recovered(self, entries: list[tuple[str, dict]]) -> None:
+        """Retry recovered entries one at a time, so a poison entry fails (and dead-letters) alone."""
+        if entries:
+            log.info("recovered %d pending completions", len(entries))
+        for entry in entries:
+            try:
+                self.process([entry])
+            except redis.ConnectionError:
+                raise
+            except Exception:
+                log.exception("auto-eval of recovered completion %s failed", entry[0])
+
+    def ack(self, entry_ids: list[str]) -> None:
+        self.r.xack(FINISHED_RUNS_STREAM, GROUP, *entry_ids)
+
+    def stats(self) -> dict[str, Any]:
+        lags = sorted(self.lags_ms)
+        return {
+            "consumer": self.name,
+            "evaluated": self.evaluated,
+            "skipped_by_sampling": self.skipped,
+            "similarity_indexed": self.indexed,
+            "lag_ms_p50": round(statistics.median(lags), 1) if lags else None,
+            "lag_ms_p95": lags[min(len(lags) - 1, int(0.95 * len(lags)))] if lags else None,
+            "lag_ms_max": lags[-1] if lags else None,
+            "updated_at": time.time(),
+        }
+
+    def publish_stats(self, batch_len: int) -> None:
+        stats = self.stats()
+        stats["last_batch_size"] = batch_len
+        self.r.hset(STATS_KEY, self.name, json.dumps(stats))
+
+    def run_forever(self) -> None:
+        self.ensure_group()
+        log.info("auto-eval consumer %s started", self.name)
+
+        last_claim: float | None = None
+        while True:
+            try:
+                # First pass picks up what was pending before a restart.
+                if last_claim is None or time.monotonic() - last_claim > CLAIM_IDLE_MS / 1000:
+                    last_claim = time.monotonic()
+                    self.process_recovered(self.recover())
+
+                batch = self.next_batch()
+                if batch:
+                    self.process(batch)
+            except redis.ConnectionError:
+                log.exception("redis unavailable; retrying")
+                time.sleep(1.0)
+            except Exception:
+                # Unacked entries stay pending and are retried by recover().
+                log.exception("auto-eval batch failed")
+                time.sleep(1.0)
+
+
+class LocalAutoEvalConsumer(AutoEvalConsumer):
+    """Embedded mode: consumes app.local_bus's finished-runs queue on a thread of the API.
+
+    Completions are held in memory only, so there is nothing to recover or acknowledge.
+    """
+
+    def __init__(self, batch_size: int, max_wait_ms: int) -> None:
+        super().__init__(None, "embedded", batch_size, max_wait_ms)
+        self.last_stats: dict[str, Any] | None = None
+
+    def ensure_group(self) -> None:
+        pass
+
+    def recover(self) -> list[tuple[str, dict]]:
+        return []
+
+    def next_batch(self) -> list[tuple[str, dict]]:
+        batch = local_bus.pop_finished(self.batch_size, self.max_wait_ms / 1000)
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while batch and len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            batch.extend(local_bus.pop_finished(self.batch_size - len(batch), remaining))
+        return batch
+
+    def ack(self, entry_ids: list[str]) -> None:
+        pass
+
+    def publish_stats(self, batch_len: int) -> None:
+        self.last_stats = {**self.stats(), "last_batch_size": batch_len}
+
+
+_local_consumer: LocalAutoEvalConsumer | None = None
+
+
+def start_local_consumer() -> None:
+    """Run the consumer on a daemon thread of this process (embedded mode)."""
+    global _local_consumer
+    if _local_consumer is not None:
+        return
+    _local_consumer = LocalAutoEvalConsumer(settings.auto_eval_batch_size, settings.auto_eval_max_wait_ms)
+    threading.Thread(target=_local_consumer.run_forever, name="orchestrai-auto-eval", daemon=True).start()
+
+
+def consumer_stats() -> dict[str, Any]:
+    if settings.embedded:
+        consumer = _local_consumer
+        if consumer is None or consumer.last_stats is None:
+            return {}
+        return {consumer.name: consumer.last_stats}
+    r = redis.Redis.from_url(settings.redis_url, decode_responses=True)
+    try:
+        return {name: json.loads(raw) for name, raw in r.hgetall(STATS_KEY).items()}
+    finally:
+        r.close()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)-5.5s [%(name)s] %(message)s")
+    r = redis.Redis.from_url(settings.redis_url, decode_responses=True)
+    name = os.environ.get("AUTO_EVAL_CONSUMER") or f"{socket.gethostname()}-{os.getpid()}"
+    AutoEvalConsumer(r, name, settings.auto_eval_batch_size, settings.auto_eval_max_wait_ms).run_forever()
+
+
+if __name__ == "__main__":
+    main()
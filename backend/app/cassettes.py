@@ -0,0 +1,269 @@
+"""Record/replay cassettes for provider HTTP traffic.
+
+Every provider adapter builds its httpx client with `provider_transport(provider)`. With
+cassettes on, that transport keys each request by its normalized form (method, URL without
+credentials, canonical JSON body) and either records the response or serves a recorded one:
+
+- "off":    plain httpx (default)
+- "record": call the provider and record every response
+- "replay": serve only from the cassette; a missing entry raises CassetteMiss
+- "auto":   serve recorded entries, record the rest
+
+A cassette is one gzip'd JSON-lines file, `<cassette_dir>/<name>.jsonl.gz`, appended to as
+entries are recorded (gzip members concatenate), so it stays compact and diff-free to grow.
+Recording stops once the file reaches CASSETTE_MAX_BYTES. Cassettes hold full prompts and
+responses, so recording is opt-in per environment.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Literal
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+from app.config import settings
+from app.metrics import ProviderMetricsTransport
+
+log = logging.getLogger(__name__)
+
+CassetteMode = Literal["off", "record", "replay", "auto"]
+
+# Never part of a key or a recording.
+_SECRET_PARAMS = {"key", "api_key", "apikey", "access_token"}
+
+_override: contextvars.ContextVar[tuple[str, CassetteMode] | None] = contextvars.ContextVar(
+    "cassette_override", default=None
+)
+
+
+class CassetteMiss(RuntimeError):
+    pass
+
+
+def _normalized_url(url: httpx.URL) -> str:
+    params = sorted((k, v) for k, v in parse_qsl(url.query.decode()) if k.lower() not in _SECRET_PARAMS)
+    return str(url.copy_with(query=urlencode(params).encode() or None))
+
+
+def _normalized_body(request: httpx.Request) -> str:
+    body = request.content.decode("utf-8", errors="replace")
+    try:
+        return json.dumps(json.loads(body), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        return body
+
+
+def request_key(request: httpx.Request) -> str:
+    h = hashlib.sha256()
+    for part in (request.method.upper(), _normalized_url(request.url), _normalized_body(request)):
+        data = part.encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+@dataclass
+class Recording:
+    status: int
+    content_type: str | None
+    body: str
+    elapsed_ms: float
+
+
+class Cassette:
+    """One cassette file, shared by every process that records or replays it.
+
+    Appends take an exclusive `flock` and write one whole gzip member, so concurrent writers
+    (API, replay worker processes) never interleave. Entries are indexed incrementally: a
+    lookup miss reads only the bytes appended since the last read, under a shared lock.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: dict[str, Recording] = {}
+        self._offset = 0
+        self._full_logged = False
+
+    def _size(self) -> int:
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _index_from(self, f: BinaryIO) -> None:
+        # Caller holds self._lock and a file lock, so the tail is whole gzip members.
+        f.seek(self._offset)
+        tail = f.read()
+        if not tail:
+            return
+        for line in gzip.decompress(tail).decode("utf-8").splitlines():
+            e = json.loads(line)
+            self._entries[e["key"]] = Recording(e["status"], e.get("content_type"), e["body"], e["elapsed_ms"])
+        self._offset += len(tail)
+
+    def _refresh(self) -> None:
+        if self._size() <= self._offset:
+            return
+        with open(self.path, "rb") as f:
+            _flock(f, shared=True)
+            self._index_from(f)
+
+    def get(self, key: str) -> Recording | None:
+        with self._lock:
+            recorded = self._entries.get(key)
+            if recorded is None:
+                # Another process (e.g. the API recording live runs) may have appended it.
+                self._refresh()
+                recorded = self._entries.get(key)
+            return recorded
+
+    def put(self, key: str, request: httpx.Request, recording: Recording) -> None:
+        line = json.dumps(
+            {
+                "key": key,
+                "method": request.method,
+                "url": _normalized_url(request.url),
+                "request": _normalized_body(request),
+                "status": recording.status,
+                "content_type": recording.content_type,
+                "body": recording.body,
+                "elapsed_ms": recording.elapsed_ms,
+                "recorded_at": time.time(),
+            },
+            separators=(",", ":"),
+        )
+        member = gzip.compress((line + "\n").encode("utf-8"))
+        with self._lock:
+            if self._size() + len(member) > settings.cassette_max_bytes:
+                if not self._full_logged:
+                    log.warning("cassette %s is full (CASSETTE_MAX_BYTES); not recording", self.path)
+                    self._full_logged = True
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a+b") as f:
+                _flock(f, shared=False)
+                # Pick up other processes' appends first, so our offset stays exact.
+                self._index_from(f)
+                f.seek(0, os.SEEK_END)
+                f.write(member)
+                f.flush()
+                self._offset += len(member)
+            self._entries[key] = recording
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._entries)
+
+
+def _flock(f: BinaryIO, shared: bool) -> None:
+    """Lock the whole file until it is closed (no-op where flock is unavailable)."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+
+_cassettes: dict[Path, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(name: str, directory: str | None = None) -> Cassette:
+    path = Path(directory or settings.cassette_dir) / f"{name}.jsonl.gz"
+    with _cassettes_lock:
+        return _cassettes.setdefault(path, Cassette(path))
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    def __init__(
+        self,
+        cassette: Cassette,
+        mode: CassetteMode,
+        inner: httpx.AsyncBaseTransport | None = None,
+        simulate_latency: bool = False,
+    ) -> None:
+        self.cassette = cassette
+        self.mode = mode
+        self.inner = inner or httpx.AsyncHTTPTransport()
+        self.simulate_latency = simulate_latency
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = request_key(request)
+
+        if self.mode in ("replay", "auto"):
+            # File IO (and an incremental re-index on a miss) stays off the event loop.
+            recorded = await asyncio.to_thread(self.cassette.get, key)
+            if recorded is not None:
+                if self.simulate_latency:
+                    await asyncio.sleep(recorded.elapsed_ms / 1000)
+                return _response(request, recorded)
+            if self.mode == "replay":
+                raise CassetteMiss(f"no cassette entry for {request.method} {_normalized_url(request.url)}")
+
+        start = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        body = await response.aread()
+        await response.aclose()
+        recording = Recording(
+            status=response.status_code,
+            content_type=response.headers.get("content-type"),
+            body=body.decode("utf-8", errors="replace"),
+            elapsed_ms=round((time.perf_counter() - start) * 1000, 1),
+        )
+        # Only successful calls are recorded; errors stay live so a retry can succeed.
+        if response.status_code < 400:
+            await asyncio.to_thread(self.cassette.put, key, request, recording)
+        return _response(request, recording)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+def _response(request: httpx.Request, recording: Recording) -> httpx.Response:
+    headers = {"content-type": recording.content_type} if recording.content_type else {}
+    return httpx.Response(
+        recording.status, headers=headers, content=recording.body.encode("utf-8"), request=request
+    )
+
+
+def provider_transport(provider: str) -> httpx.AsyncBaseTransport:
+    """Transport for a provider adapter's httpx client.
+
+    Network calls are timed per provider (app/metrics.py); with cassettes on, recorded entries
+    are served before reaching the network and are not counted as provider calls.
+    """
+    network = ProviderMetricsTransport(httpx.AsyncHTTPTransport(), provider)
+    name, mode = _override.get() or (settings.cassette_name, settings.cassette_mode)
+    if mode == "off":
+        return network
+    return CassetteTransport(
+        get_cassette(name), mode, inner=network, simulate_latency=settings.cassette_simulate_latency
+    )
+
+
+@contextlib.contextmanager
+def use_cassette(name: str, mode: CassetteMode = "replay") -> Iterator[Cassette]:
+    """Route provider calls in this context (thread / task) through the named cassette."""
+    token = _override.set((name, mode))
+    try:
+        yield get_cassette(name)
+    finally:
+        _override.reset(token)
+
@@ -1,17 +1,54 @@
 from __future__ import annotations
 
-from sqlalchemy import create_engine
+from sqlalchemy import JSON, create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy.pool import StaticPool
 
 from app.config import settings
+from app.metrics import instrument_sessions
+
+# JSONB on Postgres, JSON (text) elsewhere, i.e. SQLite in embedded mode.
+JSONDoc = JSON().with_variant(postgresql.JSONB(), "postgresql")
 
 
 class Base(DeclarativeBase):
     pass
 
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
+def _sqlite_engine(url: str):
+    kwargs: dict = {"connect_args": {"check_same_thread": False}}
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        # One shared connection, or every session would see its own empty database.
+        kwargs["poolclass"] = StaticPool
+    eng = create_engine(url, **kwargs)
+
+    @event.listens_for(eng, "connect")
+    def _pragmas(dbapi_conn, _record) -> None:
+        cur = dbapi_conn.cursor()
+        # WAL lets readers (API requests) proceed while a task thread writes.
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA foreign_keys=ON")
+        cur.execute("PRAGMA busy_timeout=5000")
+        cur.close()
+
+    return eng
+
+
+if settings.embedded:
+    engine = _sqlite_engine(settings.embedded_database_url)
+else:
+    engine = create_engine(settings.database_url, pool_pre_ping=True)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+instrument_sessions(SessionLocal)
+
+
+def dialect_insert(table):
+    """INSERT with ON CONFLICT / RETURNING support for the engine's dialect (Postgres or SQLite)."""
+    if engine.dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
 
 
 def get_db():
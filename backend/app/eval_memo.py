@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import dialect_insert
+from app.evals import EvalResult
+from app.models import EvalMemo
+
+BatchEvaluator = Callable[[Sequence[tuple[str, str | None]]], list[EvalResult]]
+
+
+def memo_key(evaluator: str, version: str, input_prompt: str, final_output: str | None) -> str:
+    h = hashlib.sha256()
+    for part in (evaluator, version, input_prompt, final_output or ""):
+        data = part.encode("utf-8", errors="surrogatepass")
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") hash differently.
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+@dataclass
+class MemoLookup:
+    keys: list[str]
+    found: dict[str, EvalResult]
+    todo: dict[str, int]
+
+    def pending_pairs(self, pairs: Sequence[tuple[str, str | None]]) -> list[tuple[str, str | None]]:
+        return [pairs[i] for i in self.todo.values()]
+
+    def hits(self) -> list[bool]:
+        return [key in self.found for key in self.keys]
+
+
+class _LRU:
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, EvalResult] = OrderedDict()
+        # Celery may run tasks on threads (see docker-compose worker).
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> EvalResult | None:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: EvalResult) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class EvalResultMemo:
+    """Memoized evaluator results: a per-process LRU in front of the eval_memo table.
+
+    The evaluator version is part of the key, so bumping it invalidates old entries without
+    touching the table.
+    """
+
+    def __init__(self, lru_size: int) -> None:
+        self.lru = _LRU(lru_size)
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, db: Session, keys: Sequence[str]) -> dict[str, EvalResult]:
+        found: dict[str, EvalResult] = {}
+        missing: list[str] = []
+        for key in keys:
+            cached = self.lru.get(key)
+            if cached is not None:
+                found[key] = cached
+            else:
+                missing.append(key)
+
+        if missing:
+            rows = db.execute(
+                select(EvalMemo.key, EvalMemo.evaluator, EvalMemo.scores, EvalMemo.notes).where(
+                    EvalMemo.key.in_(set(missing))
+                )
+            )
+            for row in rows:
+                result = EvalResult(provider=row.evaluator, scores=row.scores or {}, notes=row.notes)
+                self.lru.put(row.key, result)
+                found[row.key] = result
+        return found
+
+    def put_many(self, db: Session, version: str, results: dict[str, EvalResult]) -> None:
+        """Stage new entries in the caller's transaction; concurrent writers of a key are harmless."""
+        if not results:
+            return
+        db.execute(
+            dialect_insert(EvalMemo)
+            .values(
+                [
+                    {"key": key, "evaluator": r.provider, "version": version, "scores": r.scores, "notes": r.notes}
+                    for key, r in results.items()
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=[EvalMemo.key])
+        )
+        for key, r in results.items():
+            self.lru.put(key, r)
+
+    def lookup(self, db: Session, evaluator: str, version: str, pairs: Sequence[tuple[str, str | None]]) -> MemoLookup:
+        """First phase of an evaluation: find memoized results and what is left to compute."""
+        keys = [memo_key(evaluator, version, prompt, output) for prompt, output in pairs]
+        found = self.get_many(db, keys)
+
+        # First index of each distinct key that still needs computing.
+        todo: dict[str, int] = {}
+        for i, key in enumerate(keys):
+            if key not in found:
+                todo.setdefault(key, i)
+        return MemoLookup(keys=keys, found=found, todo=todo)
+
+    def store(self, db: Session, version: str, lookup: MemoLookup, computed: list[EvalResult]) -> list[EvalResult]:
+        """Second phase: memoize results computed for `lookup.todo` and return results for all pairs."""
+        fresh = dict(zip(lookup.todo, computed))
+        self.put_many(db, version, fresh)
+
+        self.hits += len(lookup.keys) - len(lookup.todo)
+        self.misses += len(lookup.todo)
+        return [lookup.found.get(key) or fresh[key] for key in lookup.keys]
+
+    def evaluate(
+        self,
+        db: Session,
+        evaluator: str,
+        version: str,
+        fn: BatchEvaluator,
+        pairs: Sequence[tuple[str, str | None]],
+    ) -> tuple[list[EvalResult], list[bool]]:
+        """Evaluate pairs, computing only those without a memoized result.
+
+        Returns the results and, per pair, whether it was a memo hit.
+        """
+        lookup = self.lookup(db, evaluator, version, pairs)
+        computed = fn(lookup.pending_pairs(pairs)) if lookup.todo else []
+        return self.store(db, version, lookup, computed), lookup.hits()
+
+
+memo = EvalResultMemo(settings.eval_memo_lru_size)
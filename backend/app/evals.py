@@ -1,7 +1,15 @@
 from __future__ import annotations
 
+import itertools
+import json
+import re
+import zlib
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Callable, Sequence
+
+import numpy as np
+
+from app.config import settings
 
 
 @dataclass
@@ -9,34 +17,262 @@ class EvalResult:
     provider: str
     scores: dict[str, Any]
     notes: str | None = None
+    # "failed" when every evaluator raised (notes say why); callers keep the run's snapshot.
+    status: str = "success"
+
+
+# Same boundaries as str.split(): both use the interpreter's Unicode whitespace table.
+_TOKEN = re.compile(r"\S+")
+_PUNCT = ".,:;!?()[]{}\"'"
+
+OFFLINE_BASIC = "offline_basic"
+# Bump whenever offline_batch_eval's scores change; memoized results of older versions are ignored.
+OFFLINE_BASIC_VERSION = "2"
+OFFLINE_BASIC_NOTES = "Offline heuristic eval (no external calls)."
 
 
 def offline_basic_eval(input_prompt: str, final_output: str | None) -> EvalResult:
     """Free/offline evaluation.
 
-    This intentionally avoids any LLM/API calls.
+    This intentionally avoids any LLM/API calls. See `offline_batch_eval` for the metrics;
+    this is the single-run form of it.
+    """
+    return offline_batch_eval([(input_prompt, final_output)])[0]
+
+
+def _tokens(text: str) -> list[str]:
+    return _TOKEN.findall(text)
+
+
+def tokens(text: str) -> list[str]:
+    """Words of `text` as the offline evaluator sees them, for similarity search and suite diffs.
+
+    Lower-cased, with surrounding punctuation stripped; punctuation-only tokens are dropped.
+    """
+    return [w for w in map(str.strip, _TOKEN.findall(text.lower()), itertools.repeat(_PUNCT)) if w]
+
+
+def _segments(lengths: list[int]) -> np.ndarray:
+    # Document index for every element of a flattened list of per-document arrays.
+    return np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
 
-    Metrics (simple heuristics):
-    - non_empty_output
-    - output_length
-    - mentions_prompt_keywords (naive)
+
+def _distinct(keys: np.ndarray) -> np.ndarray:
+    # Sorted distinct values; plain sort + mask beats np.unique's hashing path on int64 keys.
+    keys = np.sort(keys)
+    if len(keys) == 0:
+        return keys
+    return keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+
+
+def _dense_ranks(keys: np.ndarray) -> tuple[np.ndarray, int]:
+    # Replace each key by its rank among the distinct keys (np.unique(return_inverse=True)).
+    order = np.argsort(keys, kind="stable")
+    ordered = keys[order]
+    ranks = np.concatenate(([0], np.cumsum(ordered[1:] != ordered[:-1])))
+    inverse = np.empty_like(ranks)
+    inverse[order] = ranks
+    return inverse, int(ranks[-1]) + 1
+
+
+def _unique_per_doc(doc: np.ndarray, ids: np.ndarray, width: int) -> np.ndarray:
+    # Distinct (doc, id) pairs, encoded as one int64 key: doc * width + id.
+    return _distinct(doc * width + ids)
+
+
+def _count_per_doc(keys: np.ndarray, width: int, n_docs: int) -> np.ndarray:
+    return np.bincount(keys // width, minlength=n_docs)
+
+
+def offline_batch_eval(pairs: Sequence[tuple[str, str | None]]) -> list[EvalResult]:
+    """Score many (prompt, output) pairs in one pass.
+
+    Every text is tokenized once; tokens are mapped to integer ids through one shared
+    vocabulary and the set metrics are computed for the whole batch with NumPy.
+
+    Metrics:
+    - non_empty_output, output_length (characters of the stripped output)
+    - keyword_overlap: distinct prompt words longer than 3 characters found in the output (naive)
+    - jaccard: distinct-token Jaccard similarity of prompt and output
+    - length_ratio_chars, length_ratio_tokens: output size relative to the prompt
+    - repetition_rate: share of output tokens that repeat an earlier token
+    - novel_bigram_rate: share of distinct output bigrams not present in the prompt
+    - valid_json: output parses as a JSON object or array
+    - balanced_code_fences: output has an even number of ``` fences
     """
+    n = len(pairs)
+    if n == 0:
+        return []
+
+    # Token -> id. Ids come from a shared counter, so they are unique but not dense; that only
+    # widens the key space. map() keeps the per-token work in C.
+    vocab: dict[str, int] = {}
+    intern = vocab.setdefault
+    counter = itertools.count()
+
+    prompt_ids: list[int] = []
+    prompt_raw_lens: list[int] = []
+    output_ids: list[int] = []
+    prompt_lens: list[int] = []
+    output_lens: list[int] = []
+    texts: list[str] = []
+
+    for prompt, output in pairs:
+        # Lower-casing never adds or removes whitespace, so tokens of prompt.lower() line up
+        # with tokens of prompt; the keyword length test uses the original token.
+        before = len(prompt_ids)
+        prompt_raw_lens.extend(map(len, _tokens(prompt)))
+        prompt_ids.extend(map(intern, map(str.strip, _tokens(prompt.lower()), itertools.repeat(_PUNCT)), counter))
+        prompt_lens.append(len(prompt_ids) - before)
+
+        text = (output or "").strip()
+        texts.append(text)
+        before = len(output_ids)
+        output_ids.extend(map(intern, map(str.strip, _tokens(text.lower()), itertools.repeat(_PUNCT)), counter))
+        output_lens.append(len(output_ids) - before)
+
+    width = max(next(counter), 1)
+    p_doc, o_doc = _segments(prompt_lens), _segments(output_lens)
+    p_ids = np.asarray(prompt_ids, dtype=np.int64)
+    o_ids = np.asarray(output_ids, dtype=np.int64)
+    is_keyword = np.asarray(prompt_raw_lens, dtype=np.int64) > 3
+    k_doc, k_ids = p_doc[is_keyword], p_ids[is_keyword]
+
+    p_set = _unique_per_doc(p_doc, p_ids, width)
+    k_set = _unique_per_doc(k_doc, k_ids, width)
+    o_set = _unique_per_doc(o_doc, o_ids, width)
+
+    keyword_overlap = _count_per_doc(np.intersect1d(k_set, o_set, assume_unique=True), width, n)
+    shared = _count_per_doc(np.intersect1d(p_set, o_set, assume_unique=True), width, n)
+    p_distinct = _count_per_doc(p_set, width, n)
+    o_distinct = _count_per_doc(o_set, width, n)
+    union = p_distinct + o_distinct - shared
+
+    p_tokens = np.asarray(prompt_lens, dtype=np.int64)
+    o_tokens = np.asarray(output_lens, dtype=np.int64)
+    p_chars = np.fromiter((len(p) for p, _ in pairs), dtype=np.int64, count=n)
+    o_chars = np.fromiter((len(t) for t in texts), dtype=np.int64, count=n)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        jaccard = np.where(union > 0, shared / union, 0.0)
+        ratio_chars = np.where(p_chars > 0, o_chars / p_chars, 0.0)
+        ratio_tokens = np.where(p_tokens > 0, o_tokens / p_tokens, 0.0)
+        repetition = np.where(o_tokens > 0, 1.0 - o_distinct / o_tokens, 0.0)
+
+    novel_bigrams = _novel_bigram_rate(p_ids, p_doc, o_ids, o_doc, width, n)
+
+    results = []
+    for i, text in enumerate(texts):
+        results.append(
+            EvalResult(
+                provider=OFFLINE_BASIC,
+                scores={
+                    "non_empty_output": bool(text),
+                    "output_length": len(text),
+                    "keyword_overlap": int(keyword_overlap[i]),
+                    "jaccard": round(float(jaccard[i]), 4),
+                    "length_ratio_chars": round(float(ratio_chars[i]), 4),
+                    "length_ratio_tokens": round(float(ratio_tokens[i]), 4),
+                    "repetition_rate": round(float(repetition[i]), 4),
+                    "novel_bigram_rate": round(float(novel_bigrams[i]), 4),
+                    "valid_json": _is_json(text),
+                    "balanced_code_fences": text.count("```") % 2 == 0,
+                },
+                notes=OFFLINE_BASIC_NOTES,
+            )
+        )
+    return results
+
+
+def _bigrams(ids: np.ndarray, doc: np.ndarray, width: int) -> tuple[np.ndarray, np.ndarray]:
+    # Adjacent token pairs that stay within one document.
+    if len(ids) < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    same = doc[1:] == doc[:-1]
+    return ids[:-1][same] * width + ids[1:][same], doc[1:][same]
+
+
+def _novel_bigram_rate(
+    p_ids: np.ndarray, p_doc: np.ndarray, o_ids: np.ndarray, o_doc: np.ndarray, width: int, n: int
+) -> np.ndarray:
+    p_bi, p_bi_doc = _bigrams(p_ids, p_doc, width)
+    o_bi, o_bi_doc = _bigrams(o_ids, o_doc, width)
+    if len(o_bi) == 0:
+        return np.zeros(n)
+
+    # Re-number bigrams densely so (doc, bigram) keys stay well inside int64.
+    inverse, bwidth = _dense_ranks(np.concatenate([p_bi, o_bi]))
+    p_set = _unique_per_doc(p_bi_doc, inverse[: len(p_bi)], bwidth)
+    o_set = _unique_per_doc(o_bi_doc, inverse[len(p_bi) :], bwidth)
+
+    o_distinct = _count_per_doc(o_set, bwidth, n)
+    seen = _count_per_doc(np.intersect1d(p_set, o_set, assume_unique=True), bwidth, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(o_distinct > 0, (o_distinct - seen) / o_distinct, 0.0)
+
+
+def _is_json(text: str) -> bool:
+    if not text or text[0] not in "{[":
+        return False
+    try:
+        json.loads(text)
+    except ValueError:
+        return False
+    return True
+
+
+EMBEDDING_SIMILARITY = "embedding_similarity"
+EMBEDDING_SIMILARITY_VERSION = "1"
+
+# Feature-hashing dimension for the dependency-free embedder.
+_HASHING_DIM = 1024
+
+Embedder = Callable[[list[str]], np.ndarray]
+
+_embedder: Embedder | None = None
+
+
+def _hashing_embed(texts: list[str]) -> np.ndarray:
+    """L2-normalized bag of hashed character trigrams (crc32, so stable across processes)."""
+    out = np.zeros((len(texts), _HASHING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        t = f" {text.lower()} "
+        grams = [
+            zlib.crc32(t[i : i + 3].encode("utf-8", errors="surrogatepass")) % _HASHING_DIM
+            for i in range(len(t) - 2)
+        ]
+        if grams:
+            np.add.at(out[row], grams, 1.0)
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return out / np.where(norms > 0, norms, 1.0)
+
+
+def load_embedder() -> Embedder:
+    """Load the embedding model once per process (pool workers call this at start-up)."""
+    global _embedder
+    if _embedder is None:
+        if settings.eval_embedding_model == "hashing":
+            _embedder = _hashing_embed
+        else:
+            # Optional dependency, only needed for model-based embeddings.
+            from sentence_transformers import SentenceTransformer
+
+            model = SentenceTransformer(settings.eval_embedding_model)
+            _embedder = lambda texts: np.asarray(model.encode(texts, normalize_embeddings=True))  # noqa: E731
+    return _embedder
+
 
-    text = (final_output or "").strip()
-    non_empty = bool(text)
-    output_length = len(text)
-
-    # Very naive keyword overlap: split prompt into words and see overlap.
-    prompt_words = {w.lower().strip(".,:;!?()[]{}\"'") for w in input_prompt.split() if len(w) > 3}
-    out_words = {w.lower().strip(".,:;!?()[]{}\"'") for w in text.split()}
-    overlap = len(prompt_words.intersection(out_words))
-
-    return EvalResult(
-        provider="offline_basic",
-        scores={
-            "non_empty_output": non_empty,
-            "output_length": output_length,
-            "keyword_overlap": overlap,
-        },
-        notes="Offline heuristic eval (no external calls).",
-    )
+def embedding_similarity_eval(pairs: Sequence[tuple[str, str | None]]) -> list[EvalResult]:
+    """Cosine similarity of prompt and output embeddings."""
+    embed = load_embedder()
+    prompts = embed([p for p, _ in pairs])
+    outputs = embed([(o or "").strip() for _, o in pairs])
+    sims = np.sum(prompts * outputs, axis=1)
+    return [
+        EvalResult(
+            provider=EMBEDDING_SIMILARITY,
+            scores={"embedding_similarity": round(float(sim), 4)},
+            notes=f"Local embedding similarity ({settings.eval_embedding_model}).",
+        )
+        for sim in sims
+    ]
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Literal, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.eval_memo import BatchEvaluator, memo
+from app.evals import (
+    EMBEDDING_SIMILARITY,
+    EMBEDDING_SIMILARITY_VERSION,
+    OFFLINE_BASIC,
+    OFFLINE_BASIC_VERSION,
+    EvalResult,
+    embedding_similarity_eval,
+    load_embedder,
+    offline_batch_eval,
+)
+
+log = logging.getLogger(__name__)
+
+# "cheap": runs inline in the Celery task. "cpu": runs in the persistent process pool.
+CostClass = Literal["cheap", "cpu"]
+
+
+@dataclass(frozen=True)
+class Evaluator:
+    name: str
+    version: str
+    fn: BatchEvaluator
+    cost: CostClass = "cheap"
+    # Preloads models; called once in every pool process at start-up.
+    load: Callable[[], object] | None = None
+
+
+# Simple evaluator registry so evaluation becomes pluggable (see replay.AGENT_EXECUTORS).
+EVALUATORS: dict[str, Evaluator] = {
+    OFFLINE_BASIC: Evaluator(OFFLINE_BASIC, OFFLINE_BASIC_VERSION, offline_batch_eval),
+    EMBEDDING_SIMILARITY: Evaluator(
+        EMBEDDING_SIMILARITY,
+        f"{EMBEDDING_SIMILARITY_VERSION}:{settings.eval_embedding_model}",
+        embedding_similarity_eval,
+        cost="cpu",
+        load=load_embedder,
+    ),
+}
+
+
+def enabled_evaluators() -> list[Evaluator]:
+    names = settings.eval_evaluators or [OFFLINE_BASIC]
+    return [EVALUATORS[name] for name in names if name in EVALUATORS]
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+# Set when the pool can't be created in this process (e.g. a daemonic prefork child).
+_pool_unavailable = False
+
+
+def _init_pool_process() -> None:
+    for ev in EVALUATORS.values():
+        if ev.cost == "cpu" and ev.load is not None:
+            try:
+                ev.load()
+            except Exception:
+                log.exception("failed to preload evaluator %s", ev.name)
+
+
+def _call_in_pool(name: str, pairs: list[tuple[str, str | None]]) -> list[EvalResult]:
+    return EVALUATORS[name].fn(pairs)
+
+
+def _get_pool() -> ProcessPoolExecutor | None:
+    global _pool, _pool_unavailable
+    if settings.eval_pool_workers <= 0 or _pool_unavailable:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            try:
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.eval_pool_workers, initializer=_init_pool_process
+                )
+            except Exception:
+                # e.g. inside a daemonic Celery prefork child; run the --pool threads worker instead.
+                log.exception("evaluator process pool unavailable; running CPU evaluators inline")
+                _pool_unavailable = True
+                return None
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _merge(results: list[EvalResult], failures: list[str]) -> EvalResult:
+    if len(results) == 1 and not failures:
+        return results[0]
+    if not results and failures:
+        return EvalResult(provider="none", scores={}, notes=" ".join(failures), status="failed")
+    scores: dict = {}
+    for r in results:
+        scores.update(r.scores)
+    notes = [r.notes for r in results if r.notes] + failures
+    return EvalResult(
+        provider="+".join(r.provider for r in results) or "none", scores=scores, notes=" ".join(notes) or None
+    )
+
+
+def run_evaluators(
+    db: Session, pairs: Sequence[tuple[str, str | None]], evaluators: list[Evaluator] | None = None
+) -> tuple[list[EvalResult], list[bool]]:
+    """Run every enabled evaluator over the pairs and merge their scores per pair.
+
+    Memoized results are reused. CPU-class evaluators are submitted to the process pool first so
+    they run concurrently with the cheap ones. An evaluator that fails is left out of the merge
+    (and noted) rather than failing the whole evaluation; if all of them fail, each result has
+    status "failed". Returns results and, per pair, whether every evaluator was a memo hit.
+    """
+    evaluators = evaluators if evaluators is not None else enabled_evaluators()
+    pool = _get_pool() if any(ev.cost == "cpu" for ev in evaluators) else None
+
+    lookups = [memo.lookup(db, ev.name, ev.version, pairs) for ev in evaluators]
+
+    futures: dict[str, Future] = {}
+    for ev, lookup in zip(evaluators, lookups):
+        if lookup.todo and ev.cost == "cpu" and pool is not None:
+            futures[ev.name] = pool.submit(_call_in_pool, ev.name, lookup.pending_pairs(pairs))
+
+    per_evaluator: list[list[EvalResult]] = []
+    failures: list[str] = []
+    for ev, lookup in zip(evaluators, lookups):
+        computed: list[EvalResult] = []
+        try:
+            if ev.name in futures:
+                computed = futures[ev.name].result()
+            elif lookup.todo:
+                computed = ev.fn(lookup.pending_pairs(pairs))
+        except Exception as e:
+            log.exception("evaluator %s failed", ev.name)
+            failures.append(f"{ev.name} failed: {e}")
+            continue
+        per_evaluator.append(memo.store(db, ev.version, lookup, computed))
+
+    merged = [_merge([results[i] for results in per_evaluator], failures) for i in range(len(pairs))]
+
+    hits_by_evaluator = [lookup.hits() for lookup in lookups]
+    hits = [all(h[i] for h in hits_by_evaluator) for i in range(len(pairs))]
+    return merged, hits
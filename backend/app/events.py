@@ -1,18 +1,173 @@
 from __future__ import annotations
 
 import json
+import time
+from functools import lru_cache
 from typing import Any
 
 import redis
 
 from app.config import settings
+from app.local_bus import bus as local_bus
+from app.metrics import REDIS_PUBLISH_SECONDS
 
+# Pub/Sub channel carrying every run/step/eval event across all runs.
+FIREHOSE_CHANNEL = "orchestrai:firehose"
 
+# Durable queue of run completions consumed by the auto-eval pipeline.
+FINISHED_RUNS_STREAM = "orchestrai:runs:finished"
+FINISHED_STATUSES = ("success", "failed", "replayed")
+
+# Cancellation flags for background replays; checked by the replay worker between steps.
+REPLAY_CANCEL_TTL_S = 3600
+
+# Append to the run's stream and fan out in one round trip. Pub/Sub frames are
+# "<stream id>|<json>" so live subscribers learn the event id without re-reading the stream.
+_PUBLISH_SCRIPT = """
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'data', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+local frame = id .. '|' .. ARGV[2]
+redis.call('PUBLISH', KEYS[2], frame)
+redis.call('PUBLISH', KEYS[3], frame)
+return id
+"""
+
+
+def run_channel(run_id: int) -> str:
+    # Pub/Sub channel: orchestrai:run:<id>
+    return f"orchestrai:run:{run_id}"
+
+
+def run_stream(run_id: int) -> str:
+    # Stream holding the same events with sequence ids, for backfill on (re)connect.
+    return f"orchestrai:run:{run_id}:events"
+
+
+@lru_cache(maxsize=1)
 def _redis_client() -> redis.Redis:
     return redis.Redis.from_url(settings.redis_url, decode_responses=True)
 
 
-def publish_step(run_id: int, step: dict[str, Any]) -> None:
-    # Pub/Sub channel: orchestrai:run:<id>
-    r = _redis_client()
-    r.publish(f"orchestrai:run:{run_id}", json.dumps(step, default=str))
+@lru_cache(maxsize=1)
+def _publish_script():
+    return _redis_client().register_script(_PUBLISH_SCRIPT)
+
+
+def suite_channel(suite_id: int) -> str:
+    return f"orchestrai:replay_suite:{suite_id}"
+
+
+def suite_stream(suite_id: int) -> str:
+    return f"orchestrai:replay_suite:{suite_id}:events"
+
+
+def _publish(stream: str, channel: str, event: dict[str, Any]) -> str:
+    if settings.embedded:
+        return local_bus.publish(stream, [channel, FIREHOSE_CHANNEL], json.dumps(event, default=str))
+    with REDIS_PUBLISH_SECONDS.time():
+        return _publish_script()(
+            keys=[stream, channel, FIREHOSE_CHANNEL],
+            args=[settings.run_stream_maxlen, json.dumps(event, default=str), settings.run_stream_ttl_s],
+        )
+
+
+def publish_event(run_id: int, event: dict[str, Any]) -> str:
+    """Record an event on the run's stream and publish it live. Returns the stream id."""
+    return _publish(run_stream(run_id), run_channel(run_id), event)
+
+
+def publish_suite_event(suite_id: int, event: dict[str, Any]) -> str:
+    """Same as publish_event, for a replay suite's progress stream."""
+    return _publish(suite_stream(suite_id), suite_channel(suite_id), {"suite_id": suite_id, **event})
+
+
+def publish_step(run_id: int, step: dict[str, Any]) -> str:
+    return publish_event(run_id, step)
+
+
+def publish_run_step(run: Any, step: Any) -> str:
+    """Publish a persisted AgentStep as a "step" event on its run's channel."""
+    return publish_step(
+        run.id,
+        {
+            "event": "step",
+            "run_id": run.id,
+            "agent_name": run.agent_name,
+            "step": {
+                "id": step.id,
+                "run_id": step.run_id,
+                "step_type": step.step_type,
+                "name": step.name,
+                "input": step.input,
+                "output": step.output,
+                "latency_ms": step.latency_ms,
+                "cost_usd": step.cost_usd,
+                "tokens": step.tokens,
+                "error_message": step.error_message,
+                "trace_id": step.trace_id,
+                "span_id": step.span_id,
+                "created_at": step.created_at,
+            },
+        },
+    )
+
+
+def _replay_cancel_key(run_id: int) -> str:
+    return f"orchestrai:replay:{run_id}:cancel"
+
+
+def request_replay_cancel(run_id: int) -> None:
+    if settings.embedded:
+        local_bus.set_flag(_replay_cancel_key(run_id), REPLAY_CANCEL_TTL_S)
+    else:
+        _redis_client().set(_replay_cancel_key(run_id), "1", ex=REPLAY_CANCEL_TTL_S)
+
+
+def replay_cancel_requested(run_id: int) -> bool:
+    if settings.embedded:
+        return local_bus.has_flag(_replay_cancel_key(run_id))
+    return bool(_redis_client().exists(_replay_cancel_key(run_id)))
+
+
+def enqueue_finished_run(run: Any) -> None:
+    """Queue a finished run for automatic evaluation and similarity indexing."""
+    fields = {"run_id": run.id, "agent_name": run.agent_name, "finished_at": time.time()}
+    if settings.embedded:
+        local_bus.push_finished(fields)
+    else:
+        _redis_client().xadd(
+            FINISHED_RUNS_STREAM, fields, maxlen=settings.auto_eval_stream_maxlen, approximate=True
+        )
+
+
+def publish_run_event(event: str, run: Any, **extra: Any) -> str:
+    """Publish a run-level event (run_created, status, eval, run_deleted) with a run summary.
+
+    Status events for finished runs also feed the finished-runs queue when this process
+    produces it (FINISHED_RUNS_STREAM_ENABLED, or a consumer flag in embedded mode).
+    """
+    produce = settings.finished_runs_stream_enabled or settings.auto_eval_enabled or settings.similarity_index_enabled
+    if event == "status" and produce and run.status in FINISHED_STATUSES:
+        enqueue_finished_run(run)
+
+    return publish_event(
+        run.id,
+        {
+            "event": event,
+            "run_id": run.id,
+            "agent_name": run.agent_name,
+            "run": {
+                "id": run.id,
+                "agent_name": run.agent_name,
+                "status": run.status,
+                "total_tokens": run.total_tokens,
+                "total_cost_usd": run.total_cost_usd,
+                "error_message": run.error_message,
+                "eval_status": run.eval_status,
+                "eval_scores": run.eval_scores,
+                "created_at": run.created_at,
+                "updated_at": run.updated_at,
+            },
+            **extra,
+        },
+    )
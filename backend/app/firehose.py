@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from fastapi import WebSocket
+
+from app.events import FIREHOSE_CHANNEL
+from app.metrics import ACTIVE_WEBSOCKETS
+from app.ws import PING, HubMessage, Subscription, hub
+
+# Bounded per-client send queue. Once full, the client switches to coalesced delivery.
+FIREHOSE_QUEUE_SIZE = 512
+
+# While coalescing we keep only the latest event of each type per run; past this many pending
+# frames the client is disconnected instead of growing without bound.
+FIREHOSE_MAX_COALESCED_RUNS = 5000
+
+# WebSocket close code for evicted slow consumers ("try again later").
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class RateMeter:
+    """Event count over a sliding window of one-second buckets."""
+
+    def __init__(self, window_s: int = 60) -> None:
+        self.window_s = window_s
+        self.total = 0
+        self._buckets: deque[list[int]] = deque()
+
+    def mark(self, n: int = 1) -> None:
+        now = int(time.monotonic())
+        self.total += n
+        if self._buckets and self._buckets[-1][0] == now:
+            self._buckets[-1][1] += n
+        else:
+            self._buckets.append([now, n])
+        self._trim(now)
+
+    def rate(self) -> float:
+        self._trim(int(time.monotonic()))
+        return sum(n for _, n in self._buckets) / self.window_s
+
+    def _trim(self, now: int) -> None:
+        while self._buckets and self._buckets[0][0] <= now - self.window_s:
+            self._buckets.popleft()
+
+
+def _values(params: Any, name: str) -> frozenset[str]:
+    values: set[str] = set()
+    for raw in params.getlist(name):
+        values.update(v.strip() for v in raw.split(",") if v.strip())
+    return frozenset(values)
+
+
+@dataclass(frozen=True)
+class FirehoseFilter:
+    """Server-side filter fixed when the client subscribes.
+
+    Each filter only matches events that carry the field it tests: `status` matches run-level
+    events, `step_type` matches step events, `agent_name` matches everything.
+    """
+
+    events: frozenset[str] = frozenset()
+    agent_names: frozenset[str] = frozenset()
+    statuses: frozenset[str] = frozenset()
+    step_types: frozenset[str] = frozenset()
+    errors_only: bool = False
+
+    @classmethod
+    def from_query(cls, params: Any) -> FirehoseFilter:
+        return cls(
+            events=_values(params, "event"),
+            agent_names=_values(params, "agent_name"),
+            statuses=_values(params, "status"),
+            step_types=_values(params, "step_type"),
+            errors_only=(params.get("errors_only") or "").lower() in ("1", "true", "yes"),
+        )
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "event": sorted(self.events),
+            "agent_name": sorted(self.agent_names),
+            "status": sorted(self.statuses),
+            "step_type": sorted(self.step_types),
+            "errors_only": self.errors_only,
+        }
+
+    def matches(self, payload: dict[str, Any]) -> bool:
+        if self.events and payload.get("event") not in self.events:
+            return False
+        if self.agent_names and payload.get("agent_name") not in self.agent_names:
+            return False
+
+        step = payload.get("step") if isinstance(payload.get("step"), dict) else None
+        run = payload.get("run") if isinstance(payload.get("run"), dict) else None
+
+        if self.step_types and (step is None or step.get("step_type") not in self.step_types):
+            return False
+        if self.statuses and (run is None or run.get("status") not in self.statuses):
+            return False
+        if self.errors_only and not _is_error(payload, step, run):
+            return False
+        return True
+
+
+def _is_error(payload: dict[str, Any], step: dict | None, run: dict | None) -> bool:
+    if step is not None:
+        return step.get("step_type") == "error" or bool(step.get("error_message"))
+    if run is not None:
+        if payload.get("event") == "eval":
+            return run.get("eval_status") not in (None, "success")
+        return run.get("status") == "failed" or bool(run.get("error_message"))
+    return False
+
+
+@dataclass(eq=False)
+class FirehoseSubscription(Subscription):
+    filter: FirehoseFilter = field(default_factory=FirehoseFilter)
+    max_coalesced: int = FIREHOSE_MAX_COALESCED_RUNS
+    connected_at: float = field(default_factory=time.time)
+
+    sent: int = 0
+    filtered: int = 0
+    coalesced: int = 0
+    coalescing: bool = False
+    pending: OrderedDict[Any, HubMessage] = field(default_factory=OrderedDict)
+    evicted: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def offer(self, message: HubMessage) -> bool:
+        if message is not PING and not self.filter.matches(message.payload):
+            self.filtered += 1
+            return False
+
+        if not self.coalescing:
+            try:
+                self.queue.put_nowait(message)
+                return False
+            except asyncio.QueueFull:
+                if message is PING:
+                    return False
+                # Stay in coalescing mode until the writer flushes, so per-run order holds.
+                self.coalescing = True
+        elif message is PING:
+            return False
+
+        if self.evicted.is_set():
+            self.dropped += 1
+            return True
+
+        # Latest frame per run and event type: a step frame never replaces a pending status.
+        key = (message.payload.get("run_id"), message.payload.get("event"))
+        self.pending.pop(key, None)
+        self.pending[key] = message
+        self.coalesced += 1
+        stats.coalesced.mark()
+
+        if len(self.pending) > self.max_coalesced:
+            self.pending.clear()
+            self.evicted.set()
+        return True
+
+    def take_pending(self) -> list[HubMessage]:
+        frames = list(self.pending.values())
+        self.pending.clear()
+        self.coalescing = False
+        return frames
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "filter": self.filter.describe(),
+            "connected_s": round(time.time() - self.connected_at, 1),
+            "queued": self.queue.qsize(),
+            "pending_coalesced": len(self.pending),
+            "sent": self.sent,
+            "filtered": self.filtered,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+        }
+
+
+class FirehoseStats:
+    def __init__(self) -> None:
+        self.clients: set[FirehoseSubscription] = set()
+        self.sent = RateMeter()
+        self.coalesced = RateMeter()
+        self.evicted = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "clients": len(self.clients),
+            "sent_total": self.sent.total,
+            "sent_per_s": round(self.sent.rate(), 2),
+            "coalesced_total": self.coalesced.total,
+            "coalesced_per_s": round(self.coalesced.rate(), 2),
+            "evicted_total": self.evicted,
+            "per_client": [c.describe() for c in self.clients],
+        }
+
+
+stats = FirehoseStats()
+
+
+async def stream_firehose(websocket: WebSocket) -> None:
+    """Stream run/step/status/eval events across all runs, filtered per client.
+
+    Filters come from the query string at connect time (repeat or comma-separate values):
+    event, agent_name, status, step_type, errors_only.
+    """
+    await websocket.accept()
+
+    sub = FirehoseSubscription(
+        channel=FIREHOSE_CHANNEL,
+        queue=asyncio.Queue(maxsize=FIREHOSE_QUEUE_SIZE),
+        filter=FirehoseFilter.from_query(websocket.query_params),
+    )
+    await hub.subscribe(FIREHOSE_CHANNEL, sub)
+    stats.clients.add(sub)
+    ACTIVE_WEBSOCKETS.labels("firehose").inc()
+
+    writer = asyncio.create_task(_write(websocket, sub))
+    evicted = asyncio.create_task(sub.evicted.wait())
+    try:
+        await asyncio.wait({writer, evicted}, return_when=asyncio.FIRST_COMPLETED)
+        if sub.evicted.is_set():
+            stats.evicted += 1
+            try:
+                await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason="slow consumer")
+            except Exception:
+                pass
+    finally:
+        writer.cancel()
+        evicted.cancel()
+        stats.clients.discard(sub)
+        ACTIVE_WEBSOCKETS.labels("firehose").dec()
+        await hub.unsubscribe(sub)
+
+
+async def _write(websocket: WebSocket, sub: FirehoseSubscription) -> None:
+    try:
+        while True:
+            if sub.queue.empty() and sub.pending:
+                frames = sub.take_pending()
+                await websocket.send_text(json.dumps({"event": "lagged", "coalesced_runs": len(frames)}))
+                for message in frames:
+                    await _send(websocket, sub, message)
+                continue
+
+            message = await sub.queue.get()
+            await _send(websocket, sub, message)
+    except Exception:
+        # Client disconnected or server shutting down.
+        pass
+
+
+async def _send(websocket: WebSocket, sub: FirehoseSubscription, message: HubMessage) -> None:
+    await websocket.send_text(message.text)
+    if message is not PING:
+        sub.sent += 1
+        stats.sent.mark()
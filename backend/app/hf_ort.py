@@ -5,11 +5,14 @@ from typing import Any
 
 import httpx
 
+from app.cassettes import provider_transport
+
 
 @dataclass
 class HFOrtResult:
     text: str
     raw: Any
+    usage: dict[str, Any] | None = None
 
 
 async def hf_ort_generate(
@@ -33,10 +36,12 @@ async def hf_ort_generate(
         "max_new_tokens": max_new_tokens,
     }
 
-    async with httpx.AsyncClient(timeout=timeout_s) as client:
+    async with httpx.AsyncClient(timeout=timeout_s, transport=provider_transport("hf-ort")) as client:
         r = await client.post(f"{base_url}/generate", json=payload)
         r.raise_for_status()
         raw = r.json()
 
     text = raw.get("text") or ""
-    return HFOrtResult(text=text, raw=raw)
+    # Engines that count tokens report them at the top level or in their engine details.
+    usage = raw.get("usage") or (raw.get("raw") or {}).get("usage")
+    return HFOrtResult(text=text, raw=raw, usage=usage)
@@ -5,6 +5,8 @@ from typing import Any
 
 import httpx
 
+from app.cassettes import provider_transport
+
 
 @dataclass
 class TGIResult:
@@ -30,7 +32,7 @@ async def tgi_generate(*, base_url: str, prompt: str, max_new_tokens: int = 256)
     }
 
     timeout = httpx.Timeout(60.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
+    async with httpx.AsyncClient(timeout=timeout, transport=provider_transport("hf-tgi")) as client:
         r = await client.post(f"{base_url}/v1/completions", json=payload)
         r.raise_for_status()
         raw = r.json()
@@ -0,0 +1,92 @@
+"""Idempotent run and step inserts for the REST ingest endpoints.
+
+Agents and the client SDK retry on timeouts, so a request may arrive twice. Runs and steps may
+carry a client-supplied idempotency key (steps: unique per run). Keyed rows are written with
+a single INSERT ... ON CONFLICT DO NOTHING RETURNING against the unique index, so the normal
+path costs no extra read; only a retry, which inserts nothing, looks up the id stored by the
+first attempt. Callers publish events for inserted rows only, so retries are not republished.
+Inserted steps are added to their run's totals (app/run_totals.py). Nothing here commits.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db import dialect_insert
+from app.models import AgentRun, AgentStep
+from app.run_totals import record_steps
+
+
+def insert_run(db: Session, values: dict[str, Any]) -> tuple[AgentRun, bool]:
+    """Stage a run. Returns (run, created); with a known key, the existing run and False."""
+    key = values.get("idempotency_key")
+    if key is None:
+        run = AgentRun(**values)
+        db.add(run)
+        db.flush()
+        return run, True
+
+    run = db.scalars(
+        dialect_insert(AgentRun)
+        .values(**values)
+        .on_conflict_do_nothing(index_elements=[AgentRun.idempotency_key])
+        .returning(AgentRun)
+    ).one_or_none()
+    if run is not None:
+        return run, True
+    return db.scalars(select(AgentRun).where(AgentRun.idempotency_key == key)).one(), False
+
+
+def insert_steps(db: Session, run_id: int, steps: list[dict[str, Any]]) -> tuple[list[int], list[AgentStep]]:
+    """Stage steps of one run.
+
+    Returns the id of every given step (the stored id for a retried one) and the steps that
+    were actually inserted, both in the order given.
+    """
+    keyed = [s for s in steps if s.get("idempotency_key") is not None]
+    inserted: dict[str, AgentStep] = {}
+    stored: dict[str, int] = {}
+    if keyed:
+        rows = db.scalars(
+            dialect_insert(AgentStep)
+            .on_conflict_do_nothing(index_elements=[AgentStep.run_id, AgentStep.idempotency_key])
+            .returning(AgentStep),
+            [{**s, "run_id": run_id} for s in keyed],
+        ).all()
+        inserted = {step.idempotency_key: step for step in rows}
+        retried = {s["idempotency_key"] for s in keyed} - inserted.keys()
+        if retried:
+            stored = dict(
+                db.execute(
+                    select(AgentStep.idempotency_key, AgentStep.id).where(
+                        AgentStep.run_id == run_id, AgentStep.idempotency_key.in_(retried)
+                    )
+                ).all()
+            )
+
+    unkeyed = [AgentStep(**{**s, "run_id": run_id}) for s in steps if s.get("idempotency_key") is None]
+    if unkeyed:
+        db.add_all(unkeyed)
+        db.flush()
+
+    ids: list[int] = []
+    new: list[AgentStep] = []
+    pending = iter(unkeyed)
+    for s in steps:
+        key = s.get("idempotency_key")
+        if key is None:
+            step = next(pending)
+        elif key in inserted:
+            # The same key twice in one request is one step.
+            step = inserted.pop(key)
+            stored[key] = step.id
+        else:
+            ids.append(stored[key])
+            continue
+        ids.append(step.id)
+        new.append(step)
+    record_steps(db, new)
+    return ids, new
@@ -0,0 +1,169 @@
+"""In-process stand-in for Redis in embedded mode (EMBEDDED=true).
+
+Covers what the API uses Redis for: append-only per-run event streams with XADD-style ids
+(for WebSocket backfill), Pub/Sub fan-out to the WebSocket hub, replay cancellation flags and
+the finished-runs queue feeding auto-evaluation. Everything lives in this process and is lost
+on restart, which is the point: one process, no services to run.
+
+Publishers may be request threads or task threads; subscribers are asyncio Pub/Sub objects
+that receive messages on their own loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any
+
+from app.config import settings
+
+# Streams are dropped least-recently-written first beyond this many (Redis expires them by TTL).
+MAX_STREAMS = 10_000
+
+
+def _id_key(event_id: str) -> tuple[int, int]:
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class LocalBus:
+    def __init__(self, stream_maxlen: int, finished_maxlen: int) -> None:
+        self.stream_maxlen = stream_maxlen
+        self._lock = threading.Lock()
+        self._streams: OrderedDict[str, deque[tuple[str, str]]] = OrderedDict()
+        self._last_id = (0, 0)
+        self._pubsubs: set[LocalPubSub] = set()
+        self._flags: dict[str, float] = {}
+        self._finished: deque[tuple[str, dict[str, Any]]] = deque(maxlen=finished_maxlen)
+        self._finished_ready = threading.Condition(self._lock)
+
+    def _next_id(self) -> str:
+        ms, seq = int(time.time() * 1000), 0
+        last_ms, last_seq = self._last_id
+        if ms <= last_ms:
+            ms, seq = last_ms, last_seq + 1
+        self._last_id = (ms, seq)
+        return f"{ms}-{seq}"
+
+    def publish(self, stream: str, channels: list[str], data: str) -> str:
+        """XADD `data` to `stream` and publish "<id>|<data>" on each channel; returns the id."""
+        with self._lock:
+            event_id = self._next_id()
+            entries = self._streams.get(stream)
+            if entries is None:
+                entries = self._streams[stream] = deque(maxlen=self.stream_maxlen)
+                while len(self._streams) > MAX_STREAMS:
+                    self._streams.popitem(last=False)
+            else:
+                self._streams.move_to_end(stream)
+            entries.append((event_id, data))
+            pubsubs = list(self._pubsubs)
+        frame = f"{event_id}|{data}"
+        for channel in channels:
+            for pubsub in pubsubs:
+                pubsub.deliver(channel, frame)
+        return event_id
+
+    def xrange(self, stream: str, after: str, count: int) -> list[tuple[str, dict[str, str]]]:
+        """Entries strictly after `after`, oldest first, in redis-py's (id, fields) shape."""
+        after_key = _id_key(after)
+        with self._lock:
+            entries = list(self._streams.get(stream, ()))
+        out = [(event_id, {"data": data}) for event_id, data in entries if _id_key(event_id) > after_key]
+        return out[:count]
+
+    def set_flag(self, key: str, ttl_s: float) -> None:
+        with self._lock:
+            self._flags[key] = time.monotonic() + ttl_s
+
+    def has_flag(self, key: str) -> bool:
+        with self._lock:
+            expires = self._flags.get(key)
+            if expires is not None and expires < time.monotonic():
+                del self._flags[key]
+                expires = None
+        return expires is not None
+
+    def push_finished(self, fields: dict[str, Any]) -> None:
+        with self._lock:
+            self._finished.append((self._next_id(), fields))
+            self._finished_ready.notify()
+
+    def pop_finished(self, max_items: int, timeout_s: float) -> list[tuple[str, dict[str, Any]]]:
+        """Up to max_items queued completions, waiting up to timeout_s for the first one."""
+        with self._lock:
+            if not self._finished:
+                self._finished_ready.wait(timeout_s)
+            items = []
+            while self._finished and len(items) < max_items:
+                items.append(self._finished.popleft())
+            return items
+
+    def _attach(self, pubsub: LocalPubSub) -> None:
+        with self._lock:
+            self._pubsubs.add(pubsub)
+
+    def _detach(self, pubsub: LocalPubSub) -> None:
+        with self._lock:
+            self._pubsubs.discard(pubsub)
+
+
+class LocalPubSub:
+    """The subset of redis.asyncio's PubSub used by app.ws.SubscriptionHub."""
+
+    def __init__(self, bus: LocalBus) -> None:
+        self.bus = bus
+        self.channels: frozenset[str] = frozenset()
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        bus._attach(self)
+
+    def deliver(self, channel: str, frame: str) -> None:
+        # Called from any thread; the queue belongs to the subscriber's loop.
+        if channel in self.channels:
+            message = {"type": "message", "channel": channel, "data": frame}
+            try:
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, message)
+            except RuntimeError:
+                self.bus._detach(self)  # loop closed
+
+    async def subscribe(self, *channels: str) -> None:
+        self.channels = self.channels | set(channels)
+
+    async def unsubscribe(self, *channels: str) -> None:
+        self.channels = self.channels - set(channels)
+
+    async def get_message(
+        self, ignore_subscribe_messages: bool = False, timeout: float = 0.0
+    ) -> dict[str, Any] | None:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self) -> None:
+        self.bus._detach(self)
+
+
+class LocalRedis:
+    """The subset of redis.asyncio.Redis used by app.ws.SubscriptionHub."""
+
+    def __init__(self, bus: LocalBus) -> None:
+        self.bus = bus
+
+    def pubsub(self) -> LocalPubSub:
+        return LocalPubSub(self.bus)
+
+    async def xrange(
+        self, stream: str, min: str = "-", max: str = "+", count: int | None = None
+    ) -> list[tuple[str, dict[str, str]]]:
+        after = min[1:] if min.startswith("(") else "0-0"
+        return self.bus.xrange(stream, after, count or 1 << 31)
+
+    async def aclose(self) -> None:
+        pass
+
+
+bus = LocalBus(settings.run_stream_maxlen, settings.auto_eval_stream_maxlen)
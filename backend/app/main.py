@@ -2,11 +2,12 @@ from __future__ import annotations
 
 import time
 from datetime import datetime
-from typing import Any
+from typing import Any, Literal
 
-from fastapi import Depends, FastAPI, HTTPException, WebSocket
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response, WebSocket
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from opentelemetry import trace
 from sqlalchemy import select
 from sqlalchemy.orm import Session
@@ -14,34 +15,72 @@ from sqlalchemy.orm import Session
 from app.config import settings
 import os
 
-from alembic import command
-from alembic.config import Config
-
-from app.db import get_db
-from app.events import publish_step
-from app.models import AgentRun, AgentStep, RunStatus, StepType
-from app.replay import replay_with_executor
+from app.auto_eval import consumer_stats as auto_eval_consumer_stats, start_local_consumer
+from app.db import Base, engine, get_db
+from app.events import (
+    publish_run_event,
+    publish_run_step,
+    request_replay_cancel,
+    suite_channel,
+    suite_stream,
+)
+from app.firehose import stats as firehose_stats, stream_firehose
+from app.ingest import insert_run, insert_steps
+from app.migrations import migrate, require_current
+from app.models import AgentRun, AgentStep, ReplaySuite, RunStatus, StepType
+from app.replay import is_replay, start_replay
+from app.replay_suites import create_suite, describe_suite
+from app.run_totals import record_steps, usage_totals
 from app.schemas import (
     AgentRunDetailOut,
     AgentRunOut,
     ApiRunCreate,
+    BulkEvaluateRequest,
     HuggingFaceRunCreate,
     OllamaRunCreate,
+    ReplaySuiteCreate,
     RunCreate,
     RunUpdate,
+    StepBatchCreate,
     StepCreate,
 )
-from app.ollama import ollama_chat
-from app.hf_ort import hf_ort_generate
-from app.model_apis import anthropic_messages, gemini_generate, openai_chat
-from app.tracing import setup_tracing
-from app.worker import celery_app
-from app.ws import stream_run_steps
+from app.metrics import (
+    STEP_INGEST_API,
+    STEP_INGEST_API_BATCH,
+    STEP_INGEST_OTLP,
+    HttpMetricsMiddleware,
+    mark_process_dead,
+    registry as metrics_registry,
+    render as render_metrics,
+)
+from app.profiling import (
+    ProfileFormat,
+    ProfileMode,
+    ProfilerBusy,
+    ProfilingMiddleware,
+    admin_authorized,
+    collect_worker_profiles,
+    profile_for,
+    render as render_profile,
+)
+from app.otlp import (
+    OtlpBodyTooLarge,
+    OtlpDecodeError,
+    decode_json,
+    decode_protobuf,
+    gunzip,
+    ingest_spans,
+)
+from app.similarity import similar_runs
+from app.tracing import instrument, setup_tracing
+from app.worker import celery_app, send_task
+from app.ws import hub, stream_events, stream_run_steps
 
 setup_tracing()
 tracer = trace.get_tracer(__name__)
 
 app = FastAPI(title="OrchestrAI Agent Control Room API")
+instrument(app)
 
 app.add_middleware(
     CORSMiddleware,
@@ -50,18 +89,29 @@ app.add_middleware(
     allow_methods=["*"] ,
     allow_headers=["*"],
 )
+app.add_middleware(HttpMetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 
 @app.on_event("startup")
 def _startup() -> None:
-    # Apply Alembic migrations on startup.
-    # This keeps schema versioned and avoids relying on SQLAlchemy create_all.
-    # /app/app/main.py -> /app/alembic.ini
-    cfg = Config(os.path.join(os.path.dirname(__file__), "..", "alembic.ini"))
-    # Ensure Alembic sees DATABASE_URL from container env.
-    if os.environ.get("DATABASE_URL"):
-        cfg.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"])
-    command.upgrade(cfg, "head")
+    if settings.embedded:
+        # Embedded mode: a fresh SQLite file gets the current schema directly; no migrations.
+        Base.metadata.create_all(engine)
+        if settings.auto_eval_enabled or settings.similarity_index_enabled:
+            start_local_consumer()
+        return
+
+    if settings.migrate_on_startup:
+        migrate(engine)
+    else:
+        require_current(engine)
+
+
+@app.on_event("shutdown")
+async def _shutdown() -> None:
+    await hub.close()
+    mark_process_dead()
 
 
 @app.get("/health")
@@ -69,47 +119,126 @@ def health() -> dict:
     return {"ok": True, "time": datetime.utcnow().isoformat()}
 
 
+_metrics_registry = metrics_registry(with_queue_depth=not settings.embedded)
+
+
+@app.get("/metrics")
+def metrics() -> Response:
+    """Prometheus exposition of this API (all its processes in multi-process mode)."""
+    body, content_type = render_metrics(_metrics_registry)
+    return Response(content=body, media_type=content_type)
+
+
+def _require_admin(x_admin_token: str | None = Header(default=None)) -> None:
+    if not admin_authorized(x_admin_token):
+        raise HTTPException(status_code=403, detail="admin token required")
+
+
+@app.post("/admin/profile", dependencies=[Depends(_require_admin)])
+def profile_api(
+    seconds: float = 10.0,
+    mode: ProfileMode = "wall",
+    format: ProfileFormat = "speedscope",
+    interval_ms: float = 5.0,
+) -> Response:
+    """Sample this API process for `seconds` and return the profile."""
+    try:
+        sampler = profile_for(seconds, mode, interval_ms)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    body, media_type = render_profile(sampler, format, f"api pid {os.getpid()}")
+    return Response(content=body, media_type=media_type)
+
+
+@app.post("/admin/profile/workers", dependencies=[Depends(_require_admin)])
+def profile_workers(seconds: float = 10.0, mode: ProfileMode = "wall", interval_ms: float = 5.0):
+    """Sample every Celery worker for `seconds`; speedscope JSON per worker."""
+    if settings.embedded:
+        raise HTTPException(status_code=409, detail="no workers in embedded mode; use /admin/profile")
+    return collect_worker_profiles(celery_app, seconds, mode, interval_ms)
+
+
 @app.websocket("/ws/runs/{run_id}")
-async def ws_run_steps(websocket: WebSocket, run_id: int):
-    await stream_run_steps(websocket, run_id)
+async def ws_run_steps(websocket: WebSocket, run_id: int, last_event_id: str | None = None):
+    await stream_run_steps(websocket, run_id, last_event_id)
+
+
+@app.websocket("/ws/replay-suites/{suite_id}")
+async def ws_replay_suite(websocket: WebSocket, suite_id: int, last_event_id: str | None = None):
+    await stream_events(websocket, suite_channel(suite_id), suite_stream(suite_id), last_event_id)
+
+
+@app.websocket("/ws/firehose")
+async def ws_firehose(websocket: WebSocket):
+    await stream_firehose(websocket)
+
+
+@app.get("/firehose/stats")
+def firehose_stream_stats() -> dict:
+    return {"hub": hub.stats(), "firehose": firehose_stats.snapshot()}
+
+
+@app.post("/v1/traces")
+async def otlp_traces(request: Request, db: Session = Depends(get_db)):
+    """OTLP/HTTP trace export (protobuf or JSON): external agents' spans as runs and steps."""
+    body = await request.body()
+    if len(body) > settings.otlp_max_body_bytes:
+        raise HTTPException(status_code=413, detail="export too large")
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        if request.headers.get("content-encoding") == "gzip":
+            # Bounded inflate: a small gzip body must not expand to gigabytes in memory.
+            body = gunzip(body, settings.otlp_max_body_bytes)
+        if content_type == "application/x-protobuf":
+            spans = decode_protobuf(body)
+        elif content_type == "application/json":
+            spans = decode_json(body)
+        else:
+            raise HTTPException(status_code=415, detail="expected application/x-protobuf or application/json")
+    except OtlpBodyTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except OtlpDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    with STEP_INGEST_OTLP.time():
+        await run_in_threadpool(ingest_spans, db, spans)
+    # An empty ExportTraceServiceResponse means every span was accepted.
+    if content_type == "application/x-protobuf":
+        return Response(content=b"", media_type="application/x-protobuf")
+    return {}
 
 
 @app.post("/runs", response_model=AgentRunOut)
-def create_run(payload: RunCreate, db: Session = Depends(get_db)):
-    run = AgentRun(agent_name=payload.agent_name, input_prompt=payload.input_prompt)
-    db.add(run)
-    db.commit()
-    db.refresh(run)
+def create_run(
+    payload: RunCreate,
+    db: Session = Depends(get_db),
+    idempotency_key: str | None = Header(default=None, max_length=64),
+):
+    """Create a run. A retry with the same idempotency key (body or Idempotency-Key header)
+    returns the run the first attempt created and publishes nothing."""
+    now = datetime.utcnow()
+    values = payload.model_dump()
+    values["idempotency_key"] = payload.idempotency_key or idempotency_key
+    # The run is inserted with its user_input step already counted in its totals.
+    values.update(step_count=1, first_step_at=now, last_step_at=now)
+    run, created = insert_run(db, values)
+    if not created:
+        return run
 
     step = AgentStep(
         run_id=run.id,
         step_type=StepType.user_input,
         name="user_input",
         input={"prompt": payload.input_prompt},
+        created_at=now,
     )
     db.add(step)
+    db.expire_on_commit = False
     db.commit()
 
-    publish_step(
-        run.id,
-        {
-            "event": "step",
-            "run_id": run.id,
-            "step": {
-                "id": step.id,
-                "run_id": step.run_id,
-                "step_type": step.step_type,
-                "name": step.name,
-                "input": step.input,
-                "output": step.output,
-                "latency_ms": step.latency_ms,
-                "cost_usd": step.cost_usd,
-                "tokens": step.tokens,
-                "error_message": step.error_message,
-                "created_at": step.created_at,
-            },
-        },
-    )
+    publish_run_event("run_created", run)
+    publish_run_step(run, step)
     return run
 
 
@@ -129,12 +258,38 @@ def get_run(run_id: int, db: Session = Depends(get_db)):
     return run
 
 
+@app.get("/runs/{run_id}/similar")
+def get_similar_runs(
+    run_id: int, db: Session = Depends(get_db), limit: int = 10, min_similarity: float = 0.5
+):
+    """Near-duplicate runs by estimated Jaccard similarity of prompt + output shingles."""
+    run = db.get(AgentRun, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="run not found")
+    return similar_runs(db, run, limit=max(1, min(limit, 100)), min_similarity=min_similarity)
+
+
+@app.post("/similarity/rebuild")
+def rebuild_similarity():
+    """Enqueue a full (re)build of the similar-runs index, e.g. for runs that predate it."""
+    job = send_task("orchestrai.rebuild_similarity_index")
+    return {"ok": True, "task_id": job.id}
+
+
+@app.post("/runs/totals/backfill")
+def backfill_run_totals():
+    """Enqueue a recompute of every run's step aggregates, e.g. for runs that predate them."""
+    job = send_task("orchestrai.backfill_run_totals")
+    return {"ok": True, "task_id": job.id}
+
+
 @app.delete("/runs/{run_id}")
 def delete_run(run_id: int, db: Session = Depends(get_db)):
     run = db.get(AgentRun, run_id)
     if not run:
         raise HTTPException(status_code=404, detail="run not found")
 
+    publish_run_event("run_deleted", run)
     db.delete(run)
     db.commit()
     return JSONResponse({"ok": True, "run_id": run_id})
@@ -153,76 +308,150 @@ def update_run(run_id: int, payload: RunUpdate, db: Session = Depends(get_db)):
     db.add(run)
     db.commit()
     db.refresh(run)
+    publish_run_event("status", run)
     return run
 
 
 @app.post("/runs/{run_id}/steps")
-def add_step(run_id: int, payload: StepCreate, db: Session = Depends(get_db)):
+def add_step(
+    run_id: int,
+    payload: StepCreate,
+    db: Session = Depends(get_db),
+    idempotency_key: str | None = Header(default=None, max_length=64),
+):
+    started = time.perf_counter()
     run = db.get(AgentRun, run_id)
     if not run:
         raise HTTPException(status_code=404, detail="run not found")
 
-    step = AgentStep(
-        run_id=run_id,
-        step_type=payload.step_type,  # type: ignore[arg-type]
-        name=payload.name,
-        input=payload.input,
-        output=payload.output,
-        latency_ms=payload.latency_ms,
-        cost_usd=payload.cost_usd,
-        tokens=payload.tokens,
-        error_message=payload.error_message,
-    )
+    values = payload.model_dump()
+    values["idempotency_key"] = payload.idempotency_key or idempotency_key
+    (step_id,), new = insert_steps(db, run_id, [values])
+    # Defaults are client-side, so the flushed step is complete: publish it without reloading.
+    db.expire_on_commit = False
+    db.commit()
 
-    db.add(step)
+    for step in new:
+        publish_run_step(run, step)
+    STEP_INGEST_API.observe(time.perf_counter() - started)
+    return {"ok": True, "step_id": step_id, "duplicate": not new}
+
+
+@app.post("/runs/{run_id}/steps/batch")
+def add_steps(run_id: int, payload: StepBatchCreate, db: Session = Depends(get_db)):
+    """Append several steps in one transaction; they are published in the order given.
+
+    Steps whose idempotency key is already stored for the run are skipped (and not published);
+    `step_ids` has the stored id for them.
+    """
+    started = time.perf_counter()
+    run = db.get(AgentRun, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="run not found")
+
+    step_ids, new = insert_steps(db, run_id, [step.model_dump() for step in payload.steps])
+    db.expire_on_commit = False
     db.commit()
-    db.refresh(step)
-
-    publish_step(
-        run_id,
-        {
-            "event": "step",
-            "run_id": run_id,
-            "step": {
-                "id": step.id,
-                "run_id": step.run_id,
-                "step_type": step.step_type,
-                "name": step.name,
-                "input": step.input,
-                "output": step.output,
-                "latency_ms": step.latency_ms,
-                "cost_usd": step.cost_usd,
-                "tokens": step.tokens,
-                "error_message": step.error_message,
-                "created_at": step.created_at,
-            },
-        },
-    )
-    return {"ok": True, "step_id": step.id}
+
+    for step in new:
+        publish_run_step(run, step)
+    STEP_INGEST_API_BATCH.observe(time.perf_counter() - started)
+    return {"ok": True, "step_ids": step_ids, "duplicates": len(step_ids) - len(new)}
 
 
 @app.post("/runs/{run_id}/replay")
-def replay_run(run_id: int, db: Session = Depends(get_db)):
+def replay_run(
+    run_id: int,
+    db: Session = Depends(get_db),
+    model: str | None = None,
+    cassette: Literal["replay", "auto"] | None = None,
+):
     run = db.get(AgentRun, run_id)
     if not run:
         raise HTTPException(status_code=404, detail="run not found")
 
-    # Replay engine: uses a pluggable executor registry.
+    # Replay engine: uses a pluggable executor registry. The replay runs on the replay worker
+    # queue; its steps stream over /ws/runs/{replay_run_id} as they are written.
     with tracer.start_as_current_span("replay_run") as span:
         span.set_attribute("run_id", run_id)
 
-        replay = replay_with_executor(db, run)
+        replay = start_replay(db, run)
+        job = send_task(
+            "orchestrai.replay_run", args=[run_id, replay.id], kwargs={"model": model, "cassette": cassette}
+        )
+        span.set_attribute("replay_run_id", replay.id)
+
+    return {"ok": True, "replay_run_id": replay.id, "task_id": job.id}
+
+
+@app.post("/replay-suites")
+def create_replay_suite(payload: ReplaySuiteCreate, db: Session = Depends(get_db)):
+    """Replay a set of runs, optionally against another model, and diff each against its original.
+
+    Progress streams over /ws/replay-suites/{suite_id}; GET /replay-suites/{suite_id} has the
+    items and the (partial) summary.
+    """
+    suite = create_suite(db, payload)
+    if not suite.total:
+        raise HTTPException(status_code=400, detail="no runs matched")
+    job = send_task("orchestrai.run_replay_suite", args=[suite.id])
+    return {"ok": True, "suite_id": suite.id, "total": suite.total, "task_id": job.id}
+
 
-    return {"ok": True, "replay_run_id": replay.id}
+@app.get("/replay-suites/{suite_id}")
+def get_replay_suite(suite_id: int, db: Session = Depends(get_db)):
+    suite = db.get(ReplaySuite, suite_id)
+    if not suite:
+        raise HTTPException(status_code=404, detail="suite not found")
+    return describe_suite(suite)
+
+
+@app.post("/runs/{run_id}/cancel")
+def cancel_replay(run_id: int, db: Session = Depends(get_db)):
+    """Ask a running (or still queued) replay to stop after its current step."""
+    run = db.get(AgentRun, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="run not found")
+    if not is_replay(run):
+        # Only replays check the cancel flag; other runs would never see it.
+        raise HTTPException(status_code=409, detail="run is not a replay; only replays can be cancelled")
+    if run.status != RunStatus.running:
+        raise HTTPException(status_code=409, detail=f"run is not running (status: {run.status.value})")
+
+    request_replay_cancel(run_id)
+    return {"ok": True, "run_id": run_id}
 
 
 @app.post("/runs/{run_id}/evaluate")
 def evaluate(run_id: int):
     # async evaluation stub
-    job = celery_app.send_task("orchestrai.evaluate_run", args=[run_id])
+    job = send_task("orchestrai.evaluate_run", args=[run_id])
     return {"ok": True, "task_id": job.id}
 
 
+@app.post("/runs/evaluate")
+def evaluate_bulk(payload: BulkEvaluateRequest):
+    """Enqueue one bulk evaluation over every run matching the filter."""
+    criteria = payload.model_dump(mode="json", exclude={"chunk_size"}, exclude_none=True)
+    job = send_task(
+        "orchestrai.evaluate_runs_bulk", args=[criteria], kwargs={"chunk_size": payload.chunk_size}
+    )
+    return {"ok": True, "task_id": job.id}
+
+
+@app.get("/evals/auto/stats")
+def auto_eval_stats():
+    """Auto-eval consumer progress, including completion -> eval snapshot lag."""
+    return {"enabled": settings.auto_eval_enabled, "consumers": auto_eval_consumer_stats()}
+
+
+@app.get("/tasks/{task_id}")
+def task_status(task_id: str):
+    res = celery_app.AsyncResult(task_id)
+    info = res.info if isinstance(res.info, dict) else ({"error": str(res.info)} if res.info else None)
+    return {"task_id": task_id, "state": res.state, "info": info}
+
+
 @app.post("/ollama/run")
 async def ollama_run(payload: OllamaRunCreate, db: Session = Depends(get_db)):
     """Run an agent using a real local model served by Ollama.
@@ -231,6 +460,7 @@ async def ollama_run(payload: OllamaRunCreate, db: Session = Depends(get_db)):
     - OLLAMA_BASE_URL (default: http://host.docker.internal:11434)
     - OLLAMA_MODEL (default: llama3.1:8b)
     """
+    from app.ollama import ollama_chat
 
     base_url = payload.base_url or os.environ.get("OLLAMA_BASE_URL", "http://host.docker.internal:11434")
     model = payload.model or os.environ.get("OLLAMA_MODEL", "llama3.1:8b")
@@ -239,6 +469,7 @@ async def ollama_run(payload: OllamaRunCreate, db: Session = Depends(get_db)):
     db.add(run)
     db.commit()
     db.refresh(run)
+    publish_run_event("run_created", run)
 
     def log(
         step_type: StepType,
@@ -246,6 +477,7 @@ async def ollama_run(payload: OllamaRunCreate, db: Session = Depends(get_db)):
         input: dict | None = None,
         output: dict | None = None,
         latency_ms: float | None = None,
+        tokens: int = 0,
         error_message: str | None = None,
     ):
         step = AgentStep(
@@ -256,68 +488,54 @@ async def ollama_run(payload: OllamaRunCreate, db: Session = Depends(get_db)):
             output=output,
             latency_ms=latency_ms,
             cost_usd=0.0,
-            tokens=0,
+            tokens=tokens,
             error_message=error_message,
         )
         db.add(step)
+        db.flush()
+        record_steps(db, [step])
         db.commit()
         db.refresh(step)
-
-        publish_step(
-            run.id,
-            {
-                "event": "step",
-                "run_id": run.id,
-                "step": {
-                    "id": step.id,
-                    "run_id": step.run_id,
-                    "step_type": step.step_type,
-                    "name": step.name,
-                    "input": step.input,
-                    "output": step.output,
-                    "latency_ms": step.latency_ms,
-                    "cost_usd": step.cost_usd,
-                    "tokens": step.tokens,
-                    "error_message": step.error_message,
-                    "created_at": step.created_at,
-                },
-            },
-        )
+        publish_run_step(run, step)
 
     log(StepType.user_input, "user_input", input={"prompt": payload.input_prompt})
 
-    start = time.perf_counter()
-    try:
-        result = await ollama_chat(base_url=base_url, model=model, prompt=payload.input_prompt)
-        latency_ms = (time.perf_counter() - start) * 1000
-        log(
-            StepType.llm_call,
-            "ollama_chat",
-            input={"base_url": base_url, "model": model, "prompt": payload.input_prompt},
-            output={"text": result.content, "raw": result.raw},
-            latency_ms=latency_ms,
-        )
-        run.final_output = result.content
-        run.status = RunStatus.success
-        run.updated_at = datetime.utcnow()
-        db.add(run)
-        db.commit()
-        return {"ok": True, "run_id": run.id}
-    except Exception as e:
-        latency_ms = (time.perf_counter() - start) * 1000
-        log(
-            StepType.error,
-            "ollama_error",
-            input={"base_url": base_url, "model": model},
-            latency_ms=latency_ms,
-            error_message=str(e),
-        )
-        run.status = RunStatus.failed
-        run.error_message = str(e)
-        run.updated_at = datetime.utcnow()
-        db.add(run)
-        db.commit()
-        raise
+    with tracer.start_as_current_span("ollama_chat", attributes={"run.id": run.id, "model": model}):
+        start = time.perf_counter()
+        try:
+            result = await ollama_chat(base_url=base_url, model=model, prompt=payload.input_prompt)
+            latency_ms = (time.perf_counter() - start) * 1000
+            log(
+                StepType.llm_call,
+                "ollama_chat",
+                input={"base_url": base_url, "model": model, "prompt": payload.input_prompt},
+                output={"text": result.content, "raw": result.raw},
+                latency_ms=latency_ms,
+                tokens=usage_totals(model, result.usage)[0] or 0,
+            )
+            run.final_output = result.content
+            run.status = RunStatus.success
+            run.updated_at = datetime.utcnow()
+            db.add(run)
+            db.commit()
+            publish_run_event("status", run)
+            return {"ok": True, "run_id": run.id}
+        except Exception as e:
+            latency_ms = (time.perf_counter() - start) * 1000
+            log(
+                StepType.error,
+                "ollama_error",
+                input={"base_url": base_url, "model": model},
+                latency_ms=latency_ms,
+                error_message=str(e),
+            )
+            run.status = RunStatus.failed
+            run.error_message = str(e)
+            run.updated_at = datetime.utcnow()
+            db.add(run)
+            db.commit()
+            publish_run_event("status", run)
+            raise
 
 
 @app.post("/hf/run")
@@ -327,6 +545,7 @@ async def huggingface_run(payload: HuggingFaceRunCreate, db: Session = Depends(g
     Default is a local hf-ort container, accessible from Docker via:
     - HF_ORT_BASE_URL (default: http://hf-ort:8080)
     """
+    from app.hf_ort import hf_ort_generate
 
     base_url = payload.base_url or os.environ.get("HF_ORT_BASE_URL", "http://hf-ort:8080")
     model_id = payload.model_id or os.environ.get("HF_ORT_MODEL_ID", "distilbert/distilgpt2")
@@ -335,6 +554,7 @@ async def huggingface_run(payload: HuggingFaceRunCreate, db: Session = Depends(g
     db.add(run)
     db.commit()
     db.refresh(run)
+    publish_run_event("run_created", run)
 
     def log(
         step_type: StepType,
@@ -342,6 +562,8 @@ async def huggingface_run(payload: HuggingFaceRunCreate, db: Session = Depends(g
         input: dict | None = None,
         output: dict | None = None,
         latency_ms: float | None = None,
+        tokens: int | None = 0,
+        cost_usd: float | None = 0.0,
         error_message: str | None = None,
     ):
         step = AgentStep(
@@ -351,89 +573,80 @@ async def huggingface_run(payload: HuggingFaceRunCreate, db: Session = Depends(g
             input=input,
             output=output,
             latency_ms=latency_ms,
-            cost_usd=0.0,
-            tokens=0,
+            cost_usd=cost_usd,
+            tokens=tokens,
             error_message=error_message,
         )
         db.add(step)
+        db.flush()
+        record_steps(db, [step])
         db.commit()
         db.refresh(step)
-
-        publish_step(
-            run.id,
-            {
-                "event": "step",
-                "run_id": run.id,
-                "step": {
-                    "id": step.id,
-                    "run_id": step.run_id,
-                    "step_type": step.step_type,
-                    "name": step.name,
-                    "input": step.input,
-                    "output": step.output,
-                    "latency_ms": step.latency_ms,
-                    "cost_usd": step.cost_usd,
-                    "tokens": step.tokens,
-                    "error_message": step.error_message,
-                    "created_at": step.created_at,
-                },
-            },
-        )
+        publish_run_step(run, step)
 
     log(StepType.user_input, "user_input", input={"prompt": payload.input_prompt})
 
-    start = time.perf_counter()
-    try:
-        result = await hf_ort_generate(
-            base_url=base_url,
-            model_id=model_id,
-            prompt=payload.input_prompt,
-            max_new_tokens=payload.max_new_tokens,
-        )
-        latency_ms = (time.perf_counter() - start) * 1000
-        log(
-            StepType.llm_call,
-            "hf_ort_generate",
-            input={
-                "base_url": base_url,
-                "model_id": model_id,
-                "prompt": payload.input_prompt,
-                "max_new_tokens": payload.max_new_tokens,
-            },
-            output={"text": result.text, "raw": result.raw},
-            latency_ms=latency_ms,
-        )
-        run.final_output = result.text
-        run.status = RunStatus.success
-        run.updated_at = datetime.utcnow()
-        db.add(run)
-        db.commit()
-        return {"ok": True, "run_id": run.id}
-    except Exception as e:
-        latency_ms = (time.perf_counter() - start) * 1000
-        log(
-            StepType.error,
-            "hf_ort_error",
-            input={"base_url": base_url, "model_id": model_id},
-            latency_ms=latency_ms,
-            error_message=str(e),
-        )
-        run.status = RunStatus.failed
-        run.error_message = str(e)
-        run.updated_at = datetime.utcnow()
-        db.add(run)
-        db.commit()
-        raise
+    span_attrs = {"run.id": run.id, "model": model_id}
+    with tracer.start_as_current_span("hf_ort_generate", attributes=span_attrs):
+        start = time.perf_counter()
+        try:
+            result = await hf_ort_generate(
+                base_url=base_url,
+                model_id=model_id,
+                prompt=payload.input_prompt,
+                max_new_tokens=payload.max_new_tokens,
+            )
+            latency_ms = (time.perf_counter() - start) * 1000
+            tokens, cost_usd = usage_totals(model_id, result.usage)
+            log(
+                StepType.llm_call,
+                "hf_ort_generate",
+                input={
+                    "base_url": base_url,
+                    "model_id": model_id,
+                    "prompt": payload.input_prompt,
+                    "max_new_tokens": payload.max_new_tokens,
+                },
+                output={"text": result.text, "raw": result.raw},
+                latency_ms=latency_ms,
+                tokens=tokens,
+                cost_usd=cost_usd,
+            )
+            run.final_output = result.text
+            run.status = RunStatus.success
+            run.updated_at = datetime.utcnow()
+            db.add(run)
+            db.commit()
+            publish_run_event("status", run)
+            return {"ok": True, "run_id": run.id}
+        except Exception as e:
+            latency_ms = (time.perf_counter() - start) * 1000
+            log(
+                StepType.error,
+                "hf_ort_error",
+                input={"base_url": base_url, "model_id": model_id},
+                latency_ms=latency_ms,
+                error_message=str(e),
+            )
+            run.status = RunStatus.failed
+            run.error_message = str(e)
+            run.updated_at = datetime.utcnow()
+            db.add(run)
+            db.commit()
+            publish_run_event("status", run)
+            raise
 
 
 @app.post("/api/run")
 async def api_run(payload: ApiRunCreate, db: Session = Depends(get_db)):
     """Run an agent using a hosted model API (OpenAI, Anthropic/Claude, Gemini)."""
+    from app.model_apis import anthropic_messages, gemini_generate, openai_chat
 
     run = AgentRun(agent_name=f"api:{payload.provider}", input_prompt=payload.input_prompt)
     db.add(run)
     db.commit()
     db.refresh(run)
+    publish_run_event("run_created", run)
 
     def log(
         step_type: StepType,
@@ -441,6 +654,8 @@ async def api_run(payload: ApiRunCreate, db: Session = Depends(get_db)):
         input: dict | None = None,
         output: dict | None = None,
         latency_ms: float | None = None,
+        tokens: int | None = 0,
+        cost_usd: float | None = 0.0,
         error_message: str | None = None,
     ):
         step = AgentStep(
@@ -450,101 +665,90 @@ async def api_run(payload: ApiRunCreate, db: Session = Depends(get_db)):
             input=input,
             output=output,
             latency_ms=latency_ms,
-            cost_usd=0.0,
-            tokens=0,
+            cost_usd=cost_usd,
+            tokens=tokens,
             error_message=error_message,
         )
         db.add(step)
+        db.flush()
+        record_steps(db, [step])
         db.commit()
         db.refresh(step)
-
-        publish_step(
-            run.id,
-            {
-                "event": "step",
-                "run_id": run.id,
-                "step": {
-                    "id": step.id,
-                    "run_id": step.run_id,
-                    "step_type": step.step_type,
-                    "name": step.name,
-                    "input": step.input,
-                    "output": step.output,
-                    "latency_ms": step.latency_ms,
-                    "cost_usd": step.cost_usd,
-                    "tokens": step.tokens,
-                    "error_message": step.error_message,
-                    "created_at": step.created_at,
-                },
-            },
-        )
+        publish_run_step(run, step)
 
     log(StepType.user_input, "user_input", input={"prompt": payload.input_prompt})
 
-    start = time.perf_counter()
-    try:
-        if payload.provider == "openai":
-            result = await openai_chat(
-                api_key=payload.api_key,
-                model=payload.model,
-                prompt=payload.input_prompt,
-                temperature=payload.temperature,
-                max_tokens=payload.max_tokens,
-            )
-        elif payload.provider == "anthropic":
-            result = await anthropic_messages(
-                api_key=payload.api_key,
-                model=payload.model,
-                prompt=payload.input_prompt,
-                temperature=payload.temperature,
-                max_tokens=payload.max_tokens,
-            )
-        elif payload.provider == "gemini":
-            result = await gemini_generate(
-                api_key=payload.api_key,
-                model=payload.model,
-                prompt=payload.input_prompt,
-                temperature=payload.temperature,
-                max_tokens=payload.max_tokens,
+    span_attrs = {"run.id": run.id, "provider": payload.provider, "model": payload.model}
+    with tracer.start_as_current_span("api_model_call", attributes=span_attrs):
+        start = time.perf_counter()
+        try:
+            if payload.provider == "openai":
+                result = await openai_chat(
+                    api_key=payload.api_key,
+                    model=payload.model,
+                    prompt=payload.input_prompt,
+                    temperature=payload.temperature,
+                    max_tokens=payload.max_tokens,
+                )
+            elif payload.provider == "anthropic":
+                result = await anthropic_messages(
+                    api_key=payload.api_key,
+                    model=payload.model,
+                    prompt=payload.input_prompt,
+                    temperature=payload.temperature,
+                    max_tokens=payload.max_tokens,
+                )
+            elif payload.provider == "gemini":
+                result = await gemini_generate(
+                    api_key=payload.api_key,
+                    model=payload.model,
+                    prompt=payload.input_prompt,
+                    temperature=payload.temperature,
+                    max_tokens=payload.max_tokens,
+                )
+            else:
+                raise HTTPException(status_code=400, detail="unsupported provider")
+
+            latency_ms = (time.perf_counter() - start) * 1000
+            tokens, cost_usd = usage_totals(payload.model, result.usage)
+            log(
+                StepType.llm_call,
+                "api_model_call",
+                input={
+                    "provider": payload.provider,
+                    "model": payload.model,
+                    "temperature": payload.temperature,
+                    "max_tokens": payload.max_tokens,
+                },
+                output={"text": result.text, "usage": result.usage, "raw": result.raw},
+                latency_ms=latency_ms,
+                tokens=tokens,
+                cost_usd=cost_usd,
             )
-        else:
-            raise HTTPException(status_code=400, detail="unsupported provider")
-
-        latency_ms = (time.perf_counter() - start) * 1000
-        log(
-            StepType.llm_call,
-            "api_model_call",
-            input={
-                "provider": payload.provider,
-                "model": payload.model,
-                "temperature": payload.temperature,
-                "max_tokens": payload.max_tokens,
-            },
-            output={"text": result.text, "usage": result.usage, "raw": result.raw},
-            latency_ms=latency_ms,
-        )
 
-        run.final_output = result.text
-        run.status = RunStatus.success
-        run.updated_at = datetime.utcnow()
-        db.add(run)
-        db.commit()
-        return {"ok": True, "run_id": run.id}
-    except Exception as e:
-        latency_ms = (time.perf_counter() - start) * 1000
-        log(
-            StepType.error,
-            "api_model_error",
-            input={"provider": payload.provider, "model": payload.model},
-            latency_ms=latency_ms,
-            error_message=str(e),
-        )
-        run.status = RunStatus.failed
-        run.error_message = str(e)
-        run.updated_at = datetime.utcnow()
-        db.add(run)
-        db.commit()
-        raise
+            run.final_output = result.text
+            run.status = RunStatus.success
+            run.updated_at = datetime.utcnow()
+            db.add(run)
+            db.commit()
+            publish_run_event("status", run)
+            return {"ok": True, "run_id": run.id}
+        except Exception as e:
+            latency_ms = (time.perf_counter() - start) * 1000
+            log(
+                StepType.error,
+                "api_model_error",
+                input={"provider": payload.provider, "model": payload.model},
+                latency_ms=latency_ms,
+                error_message=str(e),
+            )
+            run.status = RunStatus.failed
+            run.error_message = str(e)
+            run.updated_at = datetime.utcnow()
+            db.add(run)
+            db.commit()
+            publish_run_event("status", run)
+            raise
 
 
 @app.post("/demo/run")
@@ -555,6 +759,7 @@ def demo_run(db: Session = Depends(get_db)) -> dict[str, Any]:
     db.add(run)
     db.commit()
     db.refresh(run)
+    publish_run_event("run_created", run)
 
     def log(step_type: StepType, name: str, input: dict | None = None, output: dict | None = None):
         start = time.perf_counter()
@@ -571,6 +776,8 @@ def demo_run(db: Session = Depends(get_db)) -> dict[str, Any]:
             tokens=0,
         )
         db.add(step)
+        db.flush()
+        record_steps(db, [step])
         db.commit()
 
     with tracer.start_as_current_span("demo_agent_run") as span:
@@ -588,5 +795,6 @@ def demo_run(db: Session = Depends(get_db)) -> dict[str, Any]:
         run.updated_at = datetime.utcnow()
         db.add(run)
         db.commit()
+        publish_run_event("status", run)
 
     return {"ok": True, "run_id": run.id}
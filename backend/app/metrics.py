@@ -0,0 +1,297 @@
+"""Prometheus metrics for the API and workers (exposed at GET /metrics).
+
+Multi-process deployments (uvicorn --workers, several Celery processes) set
+PROMETHEUS_MULTIPROC_DIR to a directory shared by the processes of one container and empty at
+start; each process then writes its samples to mmap'd files there and /metrics aggregates them.
+Gauges are summed over live processes.
+
+Hot-path updates are one dict lookup plus an observe/inc on a pre-bound child; no I/O.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, AsyncIterator
+
+import httpx
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if _MULTIPROC_DIR:
+    # Each metric opens its mmap file there as it is created below.
+    os.makedirs(_MULTIPROC_DIR, exist_ok=True)
+
+# Celery queues served by the workers (see app/worker.py task_routes).
+CELERY_QUEUES = ("celery", "replay")
+
+# Seconds; covers sub-millisecond Redis publishes up to multi-minute model calls.
+_FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+_SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "orchestrai_http_request_seconds",
+    "API request latency by route template and status code.",
+    ["method", "route", "status"],
+    buckets=_FAST_BUCKETS + _SLOW_BUCKETS[5:],
+)
+STEP_INGEST_SECONDS = Histogram(
+    "orchestrai_step_ingest_seconds",
+    "Time to persist and publish ingested steps (per step or per batch via the API, per export "
+    "via OTLP).",
+    ["source"],
+    buckets=_FAST_BUCKETS,
+)
+DB_COMMIT_SECONDS = Histogram(
+    "orchestrai_db_commit_seconds",
+    "Session commit time, including the flush.",
+    buckets=_FAST_BUCKETS,
+)
+REDIS_PUBLISH_SECONDS = Histogram(
+    "orchestrai_redis_publish_seconds",
+    "Time to append an event to its stream and publish it.",
+    buckets=_FAST_BUCKETS,
+)
+MODEL_CALL_SECONDS = Histogram(
+    "orchestrai_model_call_seconds",
+    "Provider call latency, request sent to response body read.",
+    ["provider"],
+    buckets=_SLOW_BUCKETS,
+)
+MODEL_TTFT_SECONDS = Histogram(
+    "orchestrai_model_ttft_seconds",
+    "Time to the first byte of the provider response (the first token when streaming).",
+    ["provider"],
+    buckets=_SLOW_BUCKETS,
+)
+MODEL_CALL_ERRORS = Counter(
+    "orchestrai_model_call_errors_total",
+    "Failed provider calls by HTTP status code (or exception type when there was no response).",
+    ["provider", "status"],
+)
+MODEL_CALLS_IN_FLIGHT = Gauge(
+    "orchestrai_model_calls_in_flight",
+    "Provider calls (i.e. runs waiting on a model) currently in flight.",
+    ["provider"],
+    multiprocess_mode="livesum",
+)
+TASK_SECONDS = Histogram(
+    "orchestrai_task_seconds",
+    "Celery task duration (evaluation, indexing, replay tasks) by task name and final state.",
+    ["task", "state"],
+    buckets=_SLOW_BUCKETS,
+)
+ACTIVE_WEBSOCKETS = Gauge(
+    "orchestrai_active_websockets",
+    "Open WebSocket connections.",
+    ["kind"],
+    multiprocess_mode="livesum",
+)
+REDIS_SUBSCRIPTIONS = Gauge(
+    "orchestrai_redis_subscriptions",
+    "Redis Pub/Sub channels subscribed by the WebSocket hub.",
+    multiprocess_mode="livesum",
+)
+
+STEP_INGEST_API = STEP_INGEST_SECONDS.labels("api")
+STEP_INGEST_API_BATCH = STEP_INGEST_SECONDS.labels("api_batch")
+STEP_INGEST_OTLP = STEP_INGEST_SECONDS.labels("otlp")
+
+_provider_metrics: dict[str, tuple[Any, Any, Any]] = {}
+
+
+def _for_provider(provider: str) -> tuple[Any, Any, Any]:
+    bound = _provider_metrics.get(provider)
+    if bound is None:
+        bound = _provider_metrics[provider] = (
+            MODEL_CALL_SECONDS.labels(provider),
+            MODEL_TTFT_SECONDS.labels(provider),
+            MODEL_CALLS_IN_FLIGHT.labels(provider),
+        )
+    return bound
+
+
+class _TimedStream(httpx.AsyncByteStream):
+    def __init__(self, inner: httpx.AsyncByteStream, on_close: Any) -> None:
+        self.inner = inner
+        self.on_close = on_close
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.inner:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.inner.aclose()
+        finally:
+            self.on_close()
+
+
+class ProviderMetricsTransport(httpx.AsyncBaseTransport):
+    """Times provider HTTP calls: TTFT when headers arrive, latency when the body is closed."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, provider: str) -> None:
+        self.inner = inner
+        self.provider = provider
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        latency, ttft, in_flight = _for_provider(self.provider)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            response = await self.inner.handle_async_request(request)
+        except Exception as e:
+            in_flight.dec()
+            MODEL_CALL_ERRORS.labels(self.provider, type(e).__name__).inc()
+            raise
+        ttft.observe(time.perf_counter() - start)
+        if response.status_code >= 400:
+            MODEL_CALL_ERRORS.labels(self.provider, str(response.status_code)).inc()
+
+        closed = False
+
+        def on_close() -> None:
+            nonlocal closed
+            if not closed:
+                closed = True
+                in_flight.dec()
+                latency.observe(time.perf_counter() - start)
+
+        if response.is_closed:
+            # Already read (e.g. served from memory): nothing left to stream.
+            on_close()
+        else:
+            response.stream = _TimedStream(response.stream, on_close)
+        return response
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class HttpMetricsMiddleware:
+    """ASGI middleware timing HTTP requests by route template (not raw path, to bound labels)."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - start)
+
+
+def _session_before_commit(session: Any) -> None:
+    session.info["commit_started"] = time.perf_counter()
+
+
+def _session_after_commit(session: Any) -> None:
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+
+
+def _session_after_rollback(session: Any) -> None:
+    session.info.pop("commit_started", None)
+
+
+def instrument_sessions(sessionmaker: Any) -> None:
+    from sqlalchemy import event
+
+    event.listen(sessionmaker, "before_commit", _session_before_commit)
+    event.listen(sessionmaker, "after_commit", _session_after_commit)
+    event.listen(sessionmaker, "after_soft_rollback", _session_after_rollback)
+
+
+_task_started: dict[str, float] = {}
+
+
+def _task_prerun(task_id: str | None = None, **_: Any) -> None:
+    if task_id:
+        _task_started[task_id] = time.perf_counter()
+
+
+def _task_postrun(task_id: str | None = None, task: Any = None, state: str | None = None, **_: Any) -> None:
+    started = _task_started.pop(task_id, None) if task_id else None
+    if started is not None and task is not None:
+        TASK_SECONDS.labels(task.name, state or "UNKNOWN").observe(time.perf_counter() - started)
+
+
+def instrument_celery() -> None:
+    from celery.signals import task_postrun, task_prerun
+
+    task_prerun.connect(_task_prerun, weak=False)
+    task_postrun.connect(_task_postrun, weak=False)
+
+
+class CeleryQueueCollector:
+    """Celery queue depth, read from the Redis broker at scrape time."""
+
+    def collect(self):
+        from app.events import _redis_client
+
+        depth = GaugeMetricFamily(
+            "orchestrai_celery_queue_depth", "Tasks waiting in each Celery queue.", labels=["queue"]
+        )
+        try:
+            pipe = _redis_client().pipeline(transaction=False)
+            for queue in CELERY_QUEUES:
+                pipe.llen(queue)
+            for queue, n in zip(CELERY_QUEUES, pipe.execute()):
+                depth.add_metric([queue], n)
+        except Exception:
+            return
+        yield depth
+
+
+def registry(with_queue_depth: bool = False) -> CollectorRegistry:
+    """Registry to expose: this process's metrics, or every process's in multi-process mode."""
+    reg = CollectorRegistry()
+    if _MULTIPROC_DIR:
+        multiprocess.MultiProcessCollector(reg)
+    else:
+        reg.register(REGISTRY)
+    if with_queue_depth:
+        reg.register(CeleryQueueCollector())
+    return reg
+
+
+def render(reg: CollectorRegistry) -> tuple[bytes, str]:
+    return generate_latest(reg), CONTENT_TYPE_LATEST
+
+
+def serve(port: int) -> None:
+    """Expose this process's (or, in multi-process mode, the container's) metrics on `port`."""
+    start_http_server(port, registry=registry())
+
+
+def mark_process_dead(pid: int | None = None) -> None:
+    if _MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid or os.getpid())
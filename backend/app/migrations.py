@@ -0,0 +1,141 @@
+"""Schema migrations, applied once per deploy instead of once per worker boot.
+
+    python -m app.migrations           # upgrade to head (deploy step / init container)
+    python -m app.migrations --check   # exit 1 if the database is not at head
+
+API startup uses the same path unless MIGRATE_ON_STARTUP=false: the database's revision is
+compared with the migration scripts' head first, which costs one query and no Alembic import.
+Only a database that is behind is upgraded, under a Postgres advisory lock so replicas booting
+together wait for one migrator instead of racing it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import logging
+import re
+import sys
+import time
+from functools import cache
+from pathlib import Path
+
+from sqlalchemy import Connection, Engine, inspect, text
+
+log = logging.getLogger("orchestrai.migrations")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+VERSIONS_DIR = BACKEND_DIR / "alembic" / "versions"
+
+# pg_advisory_lock key shared by every process that migrates this database.
+MIGRATION_LOCK_ID = 0x4F524348  # "ORCH"
+
+_ASSIGNMENT = re.compile(r"^(revision|down_revision)\s*(?::[^=]+)?=\s*(.+)$", re.MULTILINE)
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+@cache
+def head_revisions() -> frozenset[str]:
+    """Heads of the migration scripts, read from the files without importing Alembic."""
+    revisions: set[str] = set()
+    parents: set[str] = set()
+    for path in VERSIONS_DIR.glob("*.py"):
+        fields = {k: ast.literal_eval(v.strip()) for k, v in _ASSIGNMENT.findall(path.read_text())}
+        if "revision" not in fields:
+            continue
+        revisions.add(fields["revision"])
+        down = fields.get("down_revision")
+        parents.update((down,) if isinstance(down, str) else down or ())
+    return frozenset(revisions - parents)
+
+
+def current_revisions(conn: Connection) -> set[str]:
+    if not inspect(conn).has_table("alembic_version"):
+        return set()
+    return set(conn.scalars(text("SELECT version_num FROM alembic_version")))
+
+
+def is_current(conn: Connection) -> bool:
+    return current_revisions(conn) == head_revisions()
+
+
+def _upgrade(conn: Connection) -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    cfg = Config(str(BACKEND_DIR / "alembic.ini"))
+    cfg.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    # env.py migrates on this connection, the one holding the lock.
+    cfg.attributes["connection"] = conn
+    command.upgrade(cfg, "head")
+    conn.commit()
+
+
+def migrate(engine: Engine) -> bool:
+    """Upgrade the database to head if it is behind. Returns True if migrations ran."""
+    with engine.connect() as conn:
+        if is_current(conn):
+            return False
+
+        locked = conn.dialect.name == "postgresql"
+        if locked:
+            started = time.perf_counter()
+            # Session-level lock: held across the migration's transactions, released on
+            # disconnect if this process dies mid-migration.
+            conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            log.info("migration lock acquired after %.2fs", time.perf_counter() - started)
+        conn.commit()
+        try:
+            before = current_revisions(conn)
+            if before == head_revisions():
+                # Another replica migrated while we waited for the lock.
+                return False
+            conn.commit()
+            _upgrade(conn)
+            log.info("migrated %s -> %s", sorted(before) or "empty database", sorted(head_revisions()))
+            return True
+        finally:
+            if locked:
+                conn.rollback()
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+                conn.commit()
+
+
+def require_current(engine: Engine) -> None:
+    """Raise SchemaOutOfDate unless the database is at head (for MIGRATE_ON_STARTUP=false)."""
+    with engine.connect() as conn:
+        current = current_revisions(conn)
+    heads = head_revisions()
+    if current != heads:
+        raise SchemaOutOfDate(
+            f"database is at {sorted(current) or 'no revision'}, code expects {sorted(heads)}; "
+            "run `python -m app.migrations`"
+        )
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    p.add_argument("--check", action="store_true", help="only check; exit 1 if not at head")
+    args = p.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)-5.5s [%(name)s] %(message)s")
+
+    from app.db import engine
+
+    started = time.perf_counter()
+    if args.check:
+        try:
+            require_current(engine)
+        except SchemaOutOfDate as e:
+            log.error("%s", e)
+            sys.exit(1)
+        log.info("database is at head (%s)", ",".join(sorted(head_revisions())))
+        return
+    ran = migrate(engine)
+    log.info("%s in %.2fs", "migrated" if ran else "already at head", time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ from dataclasses import dataclass
 
 import httpx
 
+from app.cassettes import provider_transport
+
 
 @dataclass
 class ApiTextResult:
@@ -40,7 +42,7 @@ async def openai_chat(*, api_key: str | None, model: str, prompt: str, temperatu
         "Content-Type": "application/json",
     }
 
-    async with httpx.AsyncClient(timeout=60) as client:
+    async with httpx.AsyncClient(timeout=60, transport=provider_transport("openai")) as client:
         res = await client.post(url, json=payload, headers=headers)
         res.raise_for_status()
         data = res.json()
@@ -73,7 +75,7 @@ async def anthropic_messages(*, api_key: str | None, model: str, prompt: str, te
         "content-type": "application/json",
     }
 
-    async with httpx.AsyncClient(timeout=60) as client:
+    async with httpx.AsyncClient(timeout=60, transport=provider_transport("anthropic")) as client:
         res = await client.post(url, json=payload, headers=headers)
         res.raise_for_status()
         data = res.json()
@@ -114,7 +116,7 @@ async def gemini_generate(*, api_key: str | None, model: str, prompt: str, tempe
     if generation_config:
         payload["generationConfig"] = generation_config
 
-    async with httpx.AsyncClient(timeout=60) as client:
+    async with httpx.AsyncClient(timeout=60, transport=provider_transport("gemini")) as client:
         res = await client.post(url, params={"key": key}, json=payload)
         res.raise_for_status()
         data = res.json()
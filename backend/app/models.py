@@ -3,11 +3,23 @@ from __future__ import annotations
 import enum
 from datetime import datetime
 
-from sqlalchemy import DateTime, Enum, Float, ForeignKey, Index, Integer, String, Text
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    SmallInteger,
+    String,
+    Text,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from app.db import Base
+from app.db import Base, JSONDoc
+from app.tracing import current_span_id, current_trace_id
 
 
 class RunStatus(str, enum.Enum):
@@ -35,8 +47,14 @@ class AgentRun(Base):
 
     final_output: Mapped[str | None] = mapped_column(Text, nullable=True)
 
+    # Aggregates over the run's steps, incremented as steps are written (app/run_totals.py).
     total_tokens: Mapped[int] = mapped_column(Integer, default=0)
     total_cost_usd: Mapped[float] = mapped_column(Float, default=0.0)
+    step_count: Mapped[int] = mapped_column(Integer, default=0)
+    error_count: Mapped[int] = mapped_column(Integer, default=0)
+    total_latency_ms: Mapped[float] = mapped_column(Float, default=0.0)
+    first_step_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_step_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
     status: Mapped[RunStatus] = mapped_column(Enum(RunStatus), default=RunStatus.running, index=True)
 
@@ -44,9 +62,15 @@ class AgentRun(Base):
 
     # Latest evaluation snapshot for quick rendering
     eval_provider: Mapped[str | None] = mapped_column(String(100), nullable=True)
-    eval_scores: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    eval_scores: Mapped[dict | None] = mapped_column(JSONDoc, nullable=True)
     eval_status: Mapped[str | None] = mapped_column(String(50), nullable=True)
 
+    # Runs ingested over OTLP (app/otlp.py) are one per trace.
+    otlp_trace_id: Mapped[str | None] = mapped_column(String(32), nullable=True)
+
+    # Client-supplied key; a retried POST /runs returns the run the first attempt created.
+    idempotency_key: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
 
@@ -65,6 +89,10 @@ class AgentRun(Base):
     )
 
 
+Index("ux_agent_runs_otlp_trace_id", AgentRun.otlp_trace_id, unique=True)
+Index("ux_agent_runs_idempotency_key", AgentRun.idempotency_key, unique=True)
+
+
 class AgentStep(Base):
     __tablename__ = "agent_steps"
 
@@ -74,8 +102,8 @@ class AgentStep(Base):
     step_type: Mapped[StepType] = mapped_column(Enum(StepType), index=True)
 
     name: Mapped[str | None] = mapped_column(String(200), nullable=True)
-    input: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
-    output: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    input: Mapped[dict | None] = mapped_column(JSONDoc, nullable=True)
+    output: Mapped[dict | None] = mapped_column(JSONDoc, nullable=True)
 
     latency_ms: Mapped[float | None] = mapped_column(Float, nullable=True)
     cost_usd: Mapped[float | None] = mapped_column(Float, nullable=True)
@@ -83,12 +111,23 @@ class AgentStep(Base):
 
     error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
 
+    # Span active when the step was written (e.g. the model call span), so a step opens as
+    # its trace. Cloned replay steps keep the source step's ids.
+    trace_id: Mapped[str | None] = mapped_column(String(32), nullable=True, default=current_trace_id)
+    span_id: Mapped[str | None] = mapped_column(String(16), nullable=True, default=current_span_id)
+
+    # Client-supplied key, unique per run (see app/ingest.py), and the client's step number.
+    idempotency_key: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    seq: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, index=True)
 
     run: Mapped[AgentRun] = relationship("AgentRun", back_populates="steps")
 
 
 Index("ix_agent_steps_run_created", AgentStep.run_id, AgentStep.created_at)
+Index("ix_agent_steps_trace_id", AgentStep.trace_id)
+Index("ux_agent_steps_run_idempotency_key", AgentStep.run_id, AgentStep.idempotency_key, unique=True)
 
 
 class RunEval(Base):
@@ -99,12 +138,102 @@ class RunEval(Base):
 
     provider: Mapped[str] = mapped_column(String(100))
     status: Mapped[str] = mapped_column(String(50), default="success")
-    scores: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    scores: Mapped[dict | None] = mapped_column(JSONDoc, nullable=True)
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
 
+    # Set by automatic evaluation so redelivered completions are written once.
+    idempotency_key: Mapped[str | None] = mapped_column(String(200), nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, index=True)
 
     run: Mapped[AgentRun] = relationship("AgentRun", back_populates="evals")
 
 
 Index("ix_run_evals_run_created", RunEval.run_id, RunEval.created_at)
+Index("ix_run_evals_idempotency_key", RunEval.idempotency_key, unique=True)
+
+
+class EvalMemo(Base):
+    """Evaluator output keyed by hash(evaluator, version, input_prompt, final_output)."""
+
+    __tablename__ = "eval_memo"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    evaluator: Mapped[str] = mapped_column(String(100))
+    version: Mapped[str] = mapped_column(String(32))
+    scores: Mapped[dict | None] = mapped_column(JSONDoc, nullable=True)
+    notes: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class RunMinHash(Base):
+    """MinHash signature of a run's prompt and output (see app/similarity.py)."""
+
+    __tablename__ = "run_minhash"
+
+    run_id: Mapped[int] = mapped_column(ForeignKey("agent_runs.id", ondelete="CASCADE"), primary_key=True)
+    signature: Mapped[bytes] = mapped_column(LargeBinary)
+    indexed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class RunLshBucket(Base):
+    """LSH band index: runs whose signatures agree on a whole band share a bucket."""
+
+    __tablename__ = "run_lsh_buckets"
+
+    band: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    bucket: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    run_id: Mapped[int] = mapped_column(
+        ForeignKey("agent_runs.id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+
+
+class ReplaySuite(Base):
+    """A set of runs replayed together (optionally against another model) and diffed."""
+
+    __tablename__ = "replay_suites"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    model: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    # Serve model calls from recorded provider traffic ("replay" / "auto"); None calls providers.
+    cassette: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    concurrency: Mapped[int] = mapped_column(Integer, default=4)
+
+    # queued -> running -> finished
+    status: Mapped[str] = mapped_column(String(50), default="queued")
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    completed: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    summary: Mapped[dict | None] = mapped_column(JSONDoc, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    items: Mapped[list[ReplaySuiteItem]] = relationship(
+        "ReplaySuiteItem",
+        back_populates="suite",
+        cascade="all, delete-orphan",
+        order_by="ReplaySuiteItem.id",
+    )
+
+
+class ReplaySuiteItem(Base):
+    """One (original run, replay run) pair of a suite, with its diff once replayed."""
+
+    __tablename__ = "replay_suite_items"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    suite_id: Mapped[int] = mapped_column(ForeignKey("replay_suites.id", ondelete="CASCADE"), index=True)
+    run_id: Mapped[int | None] = mapped_column(ForeignKey("agent_runs.id", ondelete="SET NULL"), nullable=True)
+    replay_run_id: Mapped[int | None] = mapped_column(
+        ForeignKey("agent_runs.id", ondelete="SET NULL"), nullable=True
+    )
+
+    # pending -> replayed | failed
+    status: Mapped[str] = mapped_column(String(50), default="pending")
+    diff: Mapped[dict | None] = mapped_column(JSONDoc, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    suite: Mapped[ReplaySuite] = relationship("ReplaySuite", back_populates="items")
@@ -5,11 +5,14 @@ from typing import Any
 
 import httpx
 
+from app.cassettes import provider_transport
+
 
 @dataclass
 class OllamaChatResult:
     content: str
     raw: dict[str, Any]
+    usage: dict[str, Any] | None = None
 
 
 async def ollama_chat(
@@ -34,7 +37,7 @@ async def ollama_chat(
         ],
     }
 
-    async with httpx.AsyncClient(timeout=timeout_s) as client:
+    async with httpx.AsyncClient(timeout=timeout_s, transport=provider_transport("ollama")) as client:
         r = await client.post(url, json=payload)
         r.raise_for_status()
         data = r.json()
@@ -45,4 +48,8 @@ async def ollama_chat(
         or ""
     )
 
-    return OllamaChatResult(content=content, raw=data)
+    usage = None
+    if data.get("prompt_eval_count") is not None or data.get("eval_count") is not None:
+        usage = {"input_tokens": data.get("prompt_eval_count"), "output_tokens": data.get("eval_count")}
+
+    return OllamaChatResult(content=content, raw=data, usage=usage)
@@ -0,0 +1,440 @@
+"""OTLP/HTTP trace receiver: external agents' spans become runs and steps.
+
+Each trace is one AgentRun (keyed by `AgentRun.otlp_trace_id`); spans that carry GenAI attributes
+(or errors) become its AgentSteps. Attributes are read through `attribute_map()`: the GenAI
+semantic-convention names below, overridable per field with OTLP_ATTRIBUTE_MAP.
+
+Spans of one trace can arrive in any order and across exports. The first batch that mentions a
+trace creates its run ("running"); the root span, whenever it arrives, fills in the prompt,
+output and final status. Steps carry their span's start time as created_at, so the run reads
+in execution order regardless of arrival order.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import dialect_insert
+from app.events import publish_run_event
+from app.models import AgentRun, AgentStep, RunStatus, StepType
+from app.run_totals import price_usd, record_steps
+
+log = logging.getLogger(__name__)
+
+# Field -> attribute names, first present wins. Span attributes are searched before span event
+# attributes (older GenAI conventions put prompts/completions on events), then resource ones.
+DEFAULT_ATTRIBUTE_MAP: dict[str, list[str]] = {
+    "agent_name": ["gen_ai.agent.name", "service.name"],
+    "operation": ["gen_ai.operation.name"],
+    "model": ["gen_ai.request.model", "gen_ai.response.model"],
+    "input": ["gen_ai.input.messages", "gen_ai.prompt", "input.value"],
+    "output": ["gen_ai.output.messages", "gen_ai.completion", "output.value"],
+    "input_tokens": ["gen_ai.usage.input_tokens", "gen_ai.usage.prompt_tokens"],
+    "output_tokens": ["gen_ai.usage.output_tokens", "gen_ai.usage.completion_tokens"],
+    "cost_usd": ["gen_ai.usage.cost"],
+    "tool_name": ["gen_ai.tool.name"],
+}
+
+_STEP_TYPES = {
+    "chat": StepType.llm_call,
+    "text_completion": StepType.llm_call,
+    "generate_content": StepType.llm_call,
+    "execute_tool": StepType.tool_call,
+    "embeddings": StepType.retrieval,
+    "retrieval": StepType.retrieval,
+    "invoke_agent": StepType.agent_log,
+    "create_agent": StepType.agent_log,
+}
+
+_STATUS_ERROR = 2
+
+
+class OtlpDecodeError(ValueError):
+    pass
+
+
+class OtlpBodyTooLarge(ValueError):
+    pass
+
+
+def gunzip(body: bytes, max_bytes: int) -> bytes:
+    """Inflate a gzip'd export, stopping as soon as it exceeds `max_bytes`."""
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        out = inflater.decompress(body, max_bytes + 1)
+    except (zlib.error, EOFError, gzip.BadGzipFile) as e:
+        raise OtlpDecodeError(f"invalid gzip body: {e}") from e
+    if len(out) > max_bytes:
+        raise OtlpBodyTooLarge(f"export inflates to more than {max_bytes} bytes")
+    if not inflater.eof:
+        raise OtlpDecodeError("invalid gzip body: truncated")
+    return out
+
+
+@dataclass
+class ReceivedSpan:
+    trace_id: str
+    span_id: str
+    parent_span_id: str | None
+    name: str
+    start_ns: int
+    end_ns: int
+    attributes: dict[str, Any]
+    resource: dict[str, Any]
+    event_attributes: dict[str, Any] = field(default_factory=dict)
+    error: bool = False
+    status_message: str | None = None
+
+
+def attribute_map() -> dict[str, list[str]]:
+    return {**DEFAULT_ATTRIBUTE_MAP, **settings.otlp_attribute_map}
+
+
+# --- decoding -------------------------------------------------------------------------------
+
+
+def _pb_value(v: Any) -> Any:
+    kind = v.WhichOneof("value")
+    if kind == "array_value":
+        return [_pb_value(x) for x in v.array_value.values]
+    if kind == "kvlist_value":
+        return {kv.key: _pb_value(kv.value) for kv in v.kvlist_value.values}
+    if kind == "bytes_value":
+        return v.bytes_value.hex()
+    return getattr(v, kind) if kind else None
+
+
+def _pb_attrs(attrs: Iterable[Any]) -> dict[str, Any]:
+    return {kv.key: _pb_value(kv.value) for kv in attrs}
+
+
+def decode_protobuf(body: bytes) -> list[ReceivedSpan]:
+    # Loading the generated protobuf classes is slow; only OTLP/protobuf senders pay for it.
+    from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import ExportTraceServiceRequest
+
+    try:
+        request = ExportTraceServiceRequest.FromString(body)
+    except Exception as e:
+        raise OtlpDecodeError(f"invalid OTLP protobuf: {e}") from e
+
+    spans = []
+    for rs in request.resource_spans:
+        resource = _pb_attrs(rs.resource.attributes)
+        for ss in rs.scope_spans:
+            for s in ss.spans:
+                event_attrs: dict[str, Any] = {}
+                for ev in s.events:
+                    event_attrs.update(_pb_attrs(ev.attributes))
+                spans.append(
+                    ReceivedSpan(
+                        trace_id=s.trace_id.hex(),
+                        span_id=s.span_id.hex(),
+                        parent_span_id=s.parent_span_id.hex() or None,
+                        name=s.name,
+                        start_ns=s.start_time_unix_nano,
+                        end_ns=s.end_time_unix_nano,
+                        attributes=_pb_attrs(s.attributes),
+                        resource=resource,
+                        event_attributes=event_attrs,
+                        error=s.status.code == _STATUS_ERROR,
+                        status_message=s.status.message or None,
+                    )
+                )
+    return spans
+
+
+def _json_value(v: dict[str, Any]) -> Any:
+    # OTLP/JSON AnyValue: exactly one of stringValue, intValue (a string), doubleValue, ...
+    if "arrayValue" in v:
+        return [_json_value(x) for x in v["arrayValue"].get("values", [])]
+    if "kvlistValue" in v:
+        return _json_attrs(v["kvlistValue"].get("values", []))
+    if "intValue" in v:
+        return int(v["intValue"])
+    for key in ("stringValue", "doubleValue", "boolValue", "bytesValue"):
+        if key in v:
+            return v[key]
+    return None
+
+
+def _json_attrs(attrs: Iterable[dict[str, Any]]) -> dict[str, Any]:
+    return {kv["key"]: _json_value(kv.get("value") or {}) for kv in attrs}
+
+
+def _json_status_error(status: dict[str, Any]) -> bool:
+    code = status.get("code", 0)
+    return code == _STATUS_ERROR or code == "STATUS_CODE_ERROR"
+
+
+def decode_json(body: bytes) -> list[ReceivedSpan]:
+    # OTLP/JSON uses lowerCamelCase keys and hex-encoded trace/span ids.
+    try:
+        request = json.loads(body)
+        spans = []
+        for rs in request.get("resourceSpans", []):
+            resource = _json_attrs((rs.get("resource") or {}).get("attributes", []))
+            for ss in rs.get("scopeSpans", []):
+                for s in ss.get("spans", []):
+                    event_attrs: dict[str, Any] = {}
+                    for ev in s.get("events", []):
+                        event_attrs.update(_json_attrs(ev.get("attributes", [])))
+                    status = s.get("status") or {}
+                    spans.append(
+                        ReceivedSpan(
+                            trace_id=s["traceId"].lower(),
+                            span_id=s["spanId"].lower(),
+                            parent_span_id=(s.get("parentSpanId") or "").lower() or None,
+                            name=s.get("name", ""),
+                            start_ns=int(s.get("startTimeUnixNano", 0)),
+                            end_ns=int(s.get("endTimeUnixNano", 0)),
+                            attributes=_json_attrs(s.get("attributes", [])),
+                            resource=resource,
+                            event_attributes=event_attrs,
+                            error=_json_status_error(status),
+                            status_message=status.get("message") or None,
+                        )
+                    )
+        return spans
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise OtlpDecodeError(f"invalid OTLP JSON: {e}") from e
+
+
+# --- mapping --------------------------------------------------------------------------------
+
+
+def _lookup(span: ReceivedSpan, names: list[str]) -> Any:
+    for source in (span.attributes, span.event_attributes, span.resource):
+        for name in names:
+            value = source.get(name)
+            if value is not None:
+                return value
+    return None
+
+
+def _payload(value: Any) -> Any:
+    # Message lists often arrive as JSON strings.
+    if isinstance(value, str) and value[:1] in ("[", "{"):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _text(value: Any) -> str | None:
+    if value is None:
+        return None
+    return value if isinstance(value, str) else json.dumps(value, default=str)
+
+
+def _ts(ns: int) -> datetime:
+    return datetime.fromtimestamp(ns / 1e9, tz=timezone.utc)
+
+
+@dataclass
+class MappedSpan:
+    span: ReceivedSpan
+    fields: dict[str, Any]
+
+    @property
+    def is_root(self) -> bool:
+        return self.span.parent_span_id is None
+
+    @property
+    def is_step(self) -> bool:
+        f = self.fields
+        return self.span.error or any(f.get(k) is not None for k in ("operation", "model", "tool_name"))
+
+
+def map_span(span: ReceivedSpan, mapping: dict[str, list[str]]) -> MappedSpan:
+    return MappedSpan(span, {name: _lookup(span, attrs) for name, attrs in mapping.items()})
+
+
+def _step_type(m: MappedSpan) -> StepType:
+    if m.span.error:
+        return StepType.error
+    op = m.fields.get("operation")
+    if op in _STEP_TYPES:
+        return _STEP_TYPES[op]
+    return StepType.tool_call if m.fields.get("tool_name") else StepType.agent_log
+
+
+def _tokens(m: MappedSpan) -> int | None:
+    values = [m.fields.get("input_tokens"), m.fields.get("output_tokens")]
+    if all(v is None for v in values):
+        return None
+    return sum(int(v) for v in values if v is not None)
+
+
+def _cost(m: MappedSpan) -> float | None:
+    cost = m.fields.get("cost_usd")
+    if cost is not None:
+        return float(cost)
+    # Most instrumentations report usage but no cost; price it by model.
+    inp, out = m.fields.get("input_tokens"), m.fields.get("output_tokens")
+    return price_usd(
+        m.fields.get("model"), int(inp) if inp is not None else None, int(out) if out is not None else None
+    )
+
+
+def step_row(m: MappedSpan, run_id: int, mapped_keys: set[str]) -> dict[str, Any]:
+    s = m.span
+    step_input: dict[str, Any] = {}
+    if m.fields.get("model") is not None:
+        step_input["model"] = m.fields["model"]
+    if m.fields.get("input") is not None:
+        step_input["prompt"] = _payload(m.fields["input"])
+    extra = {k: v for k, v in s.attributes.items() if k not in mapped_keys}
+    if extra:
+        step_input["attributes"] = extra
+    output = m.fields.get("output")
+    return {
+        "run_id": run_id,
+        "step_type": _step_type(m),
+        "name": (m.fields.get("tool_name") or s.name)[:200],
+        "input": step_input or None,
+        "output": {"text": _payload(output)} if output is not None else None,
+        "latency_ms": max(s.end_ns - s.start_ns, 0) / 1e6,
+        "cost_usd": _cost(m),
+        "tokens": _tokens(m),
+        "error_message": s.status_message if s.error else None,
+        "trace_id": s.trace_id,
+        "span_id": s.span_id,
+        # Exporters retry failed exports; a span already stored for the run is skipped.
+        "idempotency_key": f"otlp:{s.span_id}",
+        "created_at": _ts(s.start_ns),
+    }
+
+
+# --- ingest ---------------------------------------------------------------------------------
+
+
+# What record_steps needs of each inserted step.
+_TOTALS_COLUMNS = (
+    AgentStep.run_id,
+    AgentStep.step_type,
+    AgentStep.tokens,
+    AgentStep.cost_usd,
+    AgentStep.latency_ms,
+    AgentStep.error_message,
+    AgentStep.created_at,
+)
+
+
+def ingest_spans(db: Session, spans: list[ReceivedSpan]) -> dict[str, int]:
+    """Upsert one run per trace, bulk-insert the step spans, commit once, publish events."""
+    if not spans:
+        return {"spans": 0, "runs": 0, "steps": 0}
+
+    mapping = attribute_map()
+    mapped_keys = {name for names in mapping.values() for name in names}
+    by_trace: dict[str, list[MappedSpan]] = {}
+    for span in spans:
+        by_trace.setdefault(span.trace_id, []).append(map_span(span, mapping))
+
+    now = datetime.utcnow()
+    new_runs = [
+        {
+            "otlp_trace_id": trace_id,
+            "agent_name": str(_first(ms, "agent_name") or "otlp-agent")[:200],
+            "input_prompt": "",
+            "status": RunStatus.running,
+            "total_tokens": 0,
+            "total_cost_usd": 0.0,
+            "created_at": _ts(min(m.span.start_ns for m in ms)),
+            "updated_at": now,
+        }
+        for trace_id, ms in by_trace.items()
+    ]
+    created = dict(
+        db.execute(
+            dialect_insert(AgentRun)
+            .values(new_runs)
+            .on_conflict_do_nothing(index_elements=[AgentRun.otlp_trace_id])
+            .returning(AgentRun.otlp_trace_id, AgentRun.id)
+        ).all()
+    )
+    run_ids = dict(
+        db.execute(
+            select(AgentRun.otlp_trace_id, AgentRun.id).where(AgentRun.otlp_trace_id.in_(list(by_trace)))
+        ).all()
+    )
+
+    finished = []
+    for trace_id, ms in by_trace.items():
+        root = next((m for m in ms if m.is_root), None)
+        if root is not None:
+            finished.append(_root_update(run_ids[trace_id], root, now))
+    if finished:
+        db.execute(update(AgentRun), finished)
+
+    rows = [
+        step_row(m, run_ids[trace_id], mapped_keys)
+        for trace_id, ms in by_trace.items()
+        for m in ms
+        if m.is_step
+    ]
+    inserted = []
+    if rows:
+        inserted = db.execute(
+            dialect_insert(AgentStep)
+            .on_conflict_do_nothing(index_elements=[AgentStep.run_id, AgentStep.idempotency_key])
+            .returning(*_TOTALS_COLUMNS),
+            rows,
+        ).all()
+        record_steps(db, inserted)
+    db.commit()
+
+    step_run_ids = [step.run_id for step in inserted]
+    _publish(db, set(created.values()), {r["id"] for r in finished}, step_run_ids)
+    return {"spans": len(spans), "runs": len(by_trace), "steps": len(step_run_ids)}
+
+
+def _first(ms: list[MappedSpan], name: str) -> Any:
+    # Prefer the root's value (e.g. gen_ai.agent.name on the invoke_agent span).
+    ordered = sorted(ms, key=lambda m: not m.is_root)
+    return next((m.fields[name] for m in ordered if m.fields.get(name) is not None), None)
+
+
+def _root_update(run_id: int, root: MappedSpan, now: datetime) -> dict[str, Any]:
+    s = root.span
+    return {
+        "id": run_id,
+        "agent_name": str(root.fields.get("agent_name") or "otlp-agent")[:200],
+        "input_prompt": _text(root.fields.get("input")) or s.name,
+        "final_output": _text(root.fields.get("output")),
+        "status": RunStatus.failed if s.error else RunStatus.success,
+        "error_message": s.status_message if s.error else None,
+        "created_at": _ts(s.start_ns),
+        "updated_at": now,
+    }
+
+
+def _publish(db: Session, created: set[int], finished: set[int], step_run_ids: list[int]) -> None:
+    steps_per_run: dict[int, int] = {}
+    for run_id in step_run_ids:
+        steps_per_run[run_id] = steps_per_run.get(run_id, 0) + 1
+
+    run_ids = created | finished | set(steps_per_run)
+    runs = db.scalars(select(AgentRun).where(AgentRun.id.in_(run_ids))).all()
+    for run in runs:
+        try:
+            if run.id in created:
+                publish_run_event("run_created", run)
+            if run.id in steps_per_run:
+                # One event per run and export, not per span; clients reload the steps.
+                publish_run_event("steps_ingested", run, steps=steps_per_run[run.id])
+            if run.id in finished:
+                publish_run_event("status", run)
+        except Exception:
+            log.exception("otlp: publishing events for run %s failed", run.id)
@@ -0,0 +1,466 @@
+"""On-demand sampling profiler and slow-request stack log (API and Celery workers).
+
+The sampler is a background thread reading every thread's Python stack with
+`sys._current_frames()` at a fixed interval. In "wall" mode each sample weighs the interval;
+in "cpu" mode a thread's sample weighs the CPU time it used since the previous sample, so
+threads blocked on I/O or locks drop out. Nothing runs unless a profile is requested or a
+request/task is over the slow threshold, so the idle cost is one dict insert/pop per request.
+
+Profiles are returned as speedscope JSON (https://www.speedscope.app) or collapsed stacks
+("frame;frame;frame weight" lines, the input of flamegraph.pl).
+"""
+
+from __future__ import annotations
+
+import hmac
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Literal
+
+from app.config import settings
+
+log = logging.getLogger(__name__)
+
+ProfileMode = Literal["wall", "cpu"]
+ProfileFormat = Literal["speedscope", "collapsed"]
+
+# A frame: (function, file, first line of the function).
+Frame = tuple[str, str, int]
+
+# Leaf functions of threads parked waiting for work; not useful in a slow-request log.
+_IDLE_LEAVES = {"wait", "select", "poll", "epoll", "get", "_wait_for_tstate_lock", "accept", "sleep"}
+SLOW_LOG_TOP_STACKS = 5
+SLOW_LOG_FRAMES = 8
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def admin_authorized(token: str | None) -> bool:
+    """Admin surfaces (profiling) are off unless ADMIN_TOKEN is set and matched."""
+    if not settings.admin_token or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), settings.admin_token.encode())
+
+
+def _stack(frame: Any) -> tuple[Frame, ...]:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    frames.reverse()
+    return tuple(frames)
+
+
+def _thread_cpu_s(ident: int) -> float | None:
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError, ProcessLookupError):
+        return None
+
+
+class Sampler:
+    """Samples every other thread's stack; `samples` maps (thread, *frames) to total weight."""
+
+    def __init__(self, mode: ProfileMode = "wall", interval_s: float = 0.005) -> None:
+        self.mode = mode
+        self.interval_s = interval_s
+        self.samples: Counter[tuple] = Counter()
+        self.sample_count = 0
+        self._cpu: dict[int, float] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.started = 0.0
+        self._last = 0.0
+        self.duration_s = 0.0
+
+    def sample_once(self) -> None:
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        # Wall samples weigh the time actually elapsed (the sampler itself waits for the GIL).
+        now_wall = time.perf_counter()
+        elapsed, self._last = now_wall - self._last, now_wall
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            weight = elapsed
+            if self.mode == "cpu":
+                now = _thread_cpu_s(ident)
+                if now is None:
+                    continue
+                weight = now - self._cpu.get(ident, now)
+                self._cpu[ident] = now
+                if weight <= 0:
+                    continue
+            self.samples[(names.get(ident, str(ident)),) + _stack(frame)] += weight
+        self.sample_count += 1
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.sample_once()
+            self._stop.wait(self.interval_s)
+
+    def start(self) -> Sampler:
+        self.started = self._last = time.perf_counter()
+        if self.mode == "cpu":
+            for ident in sys._current_frames():
+                cpu = _thread_cpu_s(ident)
+                if cpu is not None:
+                    self._cpu[ident] = cpu
+        self._thread = threading.Thread(target=self._run, name="orchestrai-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Sampler:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration_s = time.perf_counter() - self.started
+        return self
+
+
+_profile_lock = threading.Lock()
+
+
+def profile_for(seconds: float, mode: ProfileMode = "wall", interval_ms: float = 5.0) -> Sampler:
+    """Sample the whole process for `seconds` (one profile at a time per process)."""
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running in this process")
+    try:
+        sampler = Sampler(mode, interval_ms / 1000).start()
+        time.sleep(min(seconds, settings.profiling_max_seconds))
+        return sampler.stop()
+    finally:
+        _profile_lock.release()
+
+
+def to_speedscope(sampler: Sampler, name: str) -> dict[str, Any]:
+    index: dict[tuple, int] = {}
+    frames: list[dict[str, Any]] = []
+
+    def frame_id(key: tuple) -> int:
+        i = index.get(key)
+        if i is None:
+            i = index[key] = len(frames)
+            fn, file, line = key if len(key) == 3 else (key[0], None, None)
+            frames.append({"name": fn, "file": file, "line": line} if file else {"name": fn})
+        return i
+
+    samples, weights = [], []
+    for stack, weight in sampler.samples.items():
+        thread, *rest = stack
+        samples.append([frame_id((f"thread {thread}",))] + [frame_id(f) for f in rest])
+        weights.append(round(weight, 6))
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "orchestrai",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": f"{name} ({sampler.mode}, pid {os.getpid()})",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 6),
+                "samples": samples,
+                "weights": weights,
+            }
+        ],
+    }
+
+
+def to_collapsed(sampler: Sampler) -> str:
+    lines = []
+    for stack, weight in sampler.samples.items():
+        thread, *rest = stack
+        names = [f"thread {thread}"]
+        names += [f"{fn} ({os.path.basename(file)}:{line})" for fn, file, line in rest]
+        lines.append(f"{';'.join(names)} {max(1, round(weight * 1_000_000))}")
+    return "\n".join(lines) + "\n"
+
+
+def render(sampler: Sampler, fmt: ProfileFormat, name: str) -> tuple[str, str]:
+    """(body, media type) of a finished profile."""
+    if fmt == "collapsed":
+        return to_collapsed(sampler), "text/plain"
+    return json.dumps(to_speedscope(sampler, name)), "application/json"
+
+
+# --- slow request / task log ------------------------------------------------------------
+
+
+@dataclass
+class _Op:
+    kind: str
+    name: str
+    started: float
+    stacks: Counter = field(default_factory=Counter)
+
+
+class SlowOpWatchdog:
+    """Logs the hottest stacks of requests/tasks that run longer than `threshold_ms`.
+
+    Stacks are sampled only while some operation is over the threshold, from every busy
+    thread: with several slow operations at once their samples are shared.
+    """
+
+    def __init__(self, threshold_ms: float, interval_ms: float) -> None:
+        self.threshold_s = threshold_ms / 1000
+        self.interval_s = interval_ms / 1000
+        self._ops: dict[int, _Op] = {}
+        self._ids = itertools.count()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def begin(self, kind: str, name: str) -> int:
+        op_id = next(self._ids)
+        self._ops[op_id] = _Op(kind, name, time.perf_counter())
+        if self._thread is None:
+            self._start()
+        self._wake.set()
+        return op_id
+
+    def end(self, op_id: int) -> None:
+        op = self._ops.pop(op_id, None)
+        if op is None:
+            return
+        elapsed = time.perf_counter() - op.started
+        if elapsed >= self.threshold_s:
+            log.warning(
+                "slow %s %s took %.0f ms; hottest stacks:%s",
+                op.kind,
+                op.name,
+                elapsed * 1000,
+                _format_stacks(op.stacks) or " (finished before a sample was taken)",
+            )
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="orchestrai-slow-ops", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            if not self._ops:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            now = time.perf_counter()
+            ops = list(self._ops.values())
+            slow = [op for op in ops if now - op.started >= self.threshold_s]
+            if not slow:
+                oldest = min(op.started for op in ops)
+                self._wake.wait(max(self.threshold_s - (now - oldest), self.interval_s))
+                self._wake.clear()
+                continue
+
+            stacks = [
+                _stack(frame)[-SLOW_LOG_FRAMES:]
+                for ident, frame in sys._current_frames().items()
+                if ident != own
+            ]
+            stacks = [s for s in stacks if s and s[-1][0].rpartition(".")[2] not in _IDLE_LEAVES]
+            for op in slow:
+                op.stacks.update(stacks)
+            time.sleep(self.interval_s)
+
+
+def _format_stacks(stacks: Counter) -> str:
+    out = []
+    for stack, n in stacks.most_common(SLOW_LOG_TOP_STACKS):
+        frames = " <- ".join(
+            f"{fn} ({os.path.basename(file)}:{line})" for fn, file, line in reversed(stack)
+        )
+        out.append(f"\n  [{n} samples] {frames}")
+    return "".join(out)
+
+
+watchdog = (
+    SlowOpWatchdog(settings.slow_request_ms, settings.slow_request_sample_ms)
+    if settings.slow_request_ms > 0
+    else None
+)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: slow-request log, and per-request profiles on demand.
+
+    A request with `X-Profile: wall|cpu` (plus a valid `X-Admin-Token`) is sampled while it
+    runs and answered with its profile instead of its normal response; `X-Profile-Format:
+    collapsed` selects collapsed stacks.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or ())
+        mode = headers.get(b"x-profile")
+        if mode is not None and admin_authorized(headers.get(b"x-admin-token", b"").decode()):
+            await self._profiled(scope, receive, send, mode.decode(), headers)
+            return
+
+        if watchdog is None:
+            await self.app(scope, receive, send)
+            return
+        op_id = watchdog.begin("request", f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            watchdog.end(op_id)
+
+    async def _profiled(self, scope: dict, receive: Any, send: Any, mode: str, headers: dict) -> None:
+        # One profile at a time per process, like /admin/profile: samplers see every thread.
+        if not _profile_lock.acquire(blocking=False):
+            body = json.dumps({"detail": "a profile is already running in this process"}).encode()
+            await send(
+                {"type": "http.response.start", "status": 409, "headers": [(b"content-type", b"application/json")]}
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+        try:
+            await self._sample_request(scope, receive, send, mode, headers)
+        finally:
+            _profile_lock.release()
+
+    async def _sample_request(self, scope: dict, receive: Any, send: Any, mode: str, headers: dict) -> None:
+        status = 500
+
+        async def discard(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        sampler = Sampler("cpu" if mode == "cpu" else "wall", settings.profiling_interval_ms / 1000)
+        sampler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            sampler.stop()
+
+        fmt = "collapsed" if headers.get(b"x-profile-format") == b"collapsed" else "speedscope"
+        body, media_type = render(sampler, fmt, f"{scope['method']} {scope['path']}")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", media_type.encode()),
+                    (b"x-profiled-status", str(status).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body.encode()})
+
+
+# --- Celery workers ----------------------------------------------------------------------
+
+WORKER_PROFILE_TTL_S = 600
+
+
+def worker_profile_key(profile_id: str, hostname: str) -> str:
+    return f"orchestrai:profile:{profile_id}:{hostname}"
+
+
+def install_worker_hooks() -> None:
+    """Register the `orchestrai_profile` control command and slow-task logging on a worker."""
+    from celery.concurrency.prefork import TaskPool as PreforkPool
+    from celery.signals import task_postrun, task_prerun
+    from celery.worker.control import control_command
+
+    @control_command(
+        args=[("profile_id", str), ("seconds", float), ("mode", str), ("interval_ms", float)],
+        signature="<profile_id> [seconds] [mode] [interval_ms]",
+    )
+    def orchestrai_profile(state, profile_id, seconds=10.0, mode="wall", interval_ms=5.0):
+        # Replies at once; the profile runs on a thread (so the consumer keeps serving the
+        # broker) and lands in Redis for the API to collect. Control commands run in the main
+        # process, so only the threads and solo pools run tasks where they can be sampled.
+        hostname = state.consumer.hostname
+        prefork = isinstance(state.consumer.pool, PreforkPool)
+
+        def run() -> None:
+            from app.events import _redis_client
+
+            if prefork:
+                result = {"error": "prefork pool: tasks run in child processes; use --pool threads or solo"}
+            else:
+                try:
+                    sampler = profile_for(seconds, "cpu" if mode == "cpu" else "wall", interval_ms)
+                    result = to_speedscope(sampler, f"worker {hostname}")
+                except ProfilerBusy as e:
+                    result = {"error": str(e)}
+            _redis_client().set(
+                worker_profile_key(profile_id, hostname), json.dumps(result), ex=WORKER_PROFILE_TTL_S
+            )
+
+        threading.Thread(target=run, name="orchestrai-profile", daemon=True).start()
+        return {"ok": True}
+
+    if watchdog is None:
+        return
+    running: dict[str, int] = {}
+
+    def prerun(task_id=None, task=None, **_: Any) -> None:
+        if task_id and task is not None:
+            running[task_id] = watchdog.begin("task", task.name)
+
+    def postrun(task_id=None, **_: Any) -> None:
+        op_id = running.pop(task_id, None) if task_id else None
+        if op_id is not None:
+            watchdog.end(op_id)
+
+    task_prerun.connect(prerun, weak=False)
+    task_postrun.connect(postrun, weak=False)
+
+
+def collect_worker_profiles(
+    celery_app: Any, seconds: float, mode: ProfileMode, interval_ms: float
+) -> dict[str, Any]:
+    """Profile every live worker for `seconds`; returns speedscope JSON per worker hostname."""
+    from uuid import uuid4
+
+    from app.events import _redis_client
+
+    seconds = min(seconds, settings.profiling_max_seconds)
+    profile_id = uuid4().hex
+    replies = celery_app.control.broadcast(
+        "orchestrai_profile",
+        arguments={"profile_id": profile_id, "seconds": seconds, "mode": mode, "interval_ms": interval_ms},
+        reply=True,
+        timeout=2.0,
+    )
+    hosts = sorted({host for reply in replies for host in reply})
+    results: dict[str, Any] = {host: None for host in hosts}
+
+    time.sleep(seconds)
+    deadline = time.monotonic() + 15
+    while hosts and time.monotonic() < deadline:
+        values = _redis_client().mget([worker_profile_key(profile_id, h) for h in hosts])
+        for host, value in zip(hosts, values):
+            if value is not None:
+                results[host] = json.loads(value)
+        hosts = [h for h in hosts if results[h] is None]
+        if hosts:
+            time.sleep(0.25)
+    return {"profile_id": profile_id, "workers": results}
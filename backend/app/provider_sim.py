@@ -0,0 +1,513 @@
+"""Model provider simulator for offline load tests (no GPU, no network, no API keys).
+
+Serves the request/response shapes the adapters use, streaming and non-streaming:
+
+- Ollama     POST /api/chat                                    (NDJSON when "stream" is not false)
+- TGI        POST /v1/completions                              (SSE with "stream": true)
+- hf-ort     POST /generate                                    (JSON only, like the real service)
+- OpenAI     POST /v1/chat/completions                         (SSE with "stream": true)
+- Anthropic  POST /v1/messages                                 (SSE with "stream": true)
+- Gemini     POST /v1beta/models/{model}:generateContent       (JSON)
+             POST /v1beta/models/{model}:streamGenerateContent (?alt=sse for SSE, else a JSON array)
+
+Time to first token is lognormal around SIM_TTFT_MS; tokens then arrive at SIM_TOKENS_PER_S.
+SIM_RATE_LIMIT_RATE / SIM_SERVER_ERROR_RATE inject 429s (with Retry-After) and 5xx in the
+provider's error shape. GET/PUT /sim/config reads or patches the settings of a running simulator.
+
+    uvicorn app.provider_sim:app --port 9000
+    OLLAMA_BASE_URL=http://localhost:9000 HF_ORT_BASE_URL=http://localhost:9000 \
+    OPENAI_BASE_URL=http://localhost:9000/v1 ANTHROPIC_BASE_URL=http://localhost:9000/v1 \
+    GEMINI_BASE_URL=http://localhost:9000/v1beta ...
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable
+
+from fastapi import Body, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+WORDS = (
+    "the agent calls a tool then reads the result and answers with a short summary of what it "
+    "found while the model keeps track of tokens latency and cost for every step in the run"
+).split()
+
+
+class SimSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="SIM_", extra="ignore")
+
+    # Time to first token: lognormal with this median and shape (0 makes it constant).
+    ttft_ms: float = 200.0
+    ttft_sigma: float = 0.5
+    # Generation speed after the first token (0 streams everything at once).
+    tokens_per_s: float = 50.0
+    # Completion length: mean and relative jitter, capped by the request's max tokens.
+    output_tokens: int = 128
+    output_tokens_jitter: float = 0.25
+    # Tokens per streamed chunk/event.
+    tokens_per_chunk: int = 1
+    # Share of requests answered with 429 (Retry-After: retry_after_s) or a 5xx.
+    rate_limit_rate: float = 0.0
+    server_error_rate: float = 0.0
+    retry_after_s: int = 1
+    # Fixed seed for reproducible latencies, lengths and errors.
+    seed: int | None = None
+
+
+@dataclass
+class Completion:
+    tokens: list[str]
+    prompt_tokens: int
+    ttft_s: float
+    token_interval_s: float
+    truncated: bool
+
+    @property
+    def text(self) -> str:
+        return "".join(self.tokens)
+
+    @property
+    def duration_s(self) -> float:
+        return self.ttft_s + self.token_interval_s * max(len(self.tokens) - 1, 0)
+
+    async def chunks(self, chunk_tokens: int) -> AsyncIterator[str]:
+        await asyncio.sleep(self.ttft_s)
+        for i in range(0, len(self.tokens), chunk_tokens):
+            if i:
+                await asyncio.sleep(self.token_interval_s * chunk_tokens)
+            yield "".join(self.tokens[i : i + chunk_tokens])
+
+
+class _InjectedError(Exception):
+    def __init__(self, status: int) -> None:
+        self.status = status
+
+
+settings = SimSettings()
+_rng = random.Random(settings.seed)
+stats: Counter[str] = Counter()
+
+app = FastAPI(title="orchestrai-provider-sim")
+
+
+def _count_tokens(text: str) -> int:
+    return len(text.split())
+
+
+def _complete(prompt: str, max_tokens: int | None) -> Completion:
+    """Draw an injected error or a completion (length, timing) from the current settings."""
+    roll = _rng.random()
+    if roll < settings.rate_limit_rate:
+        raise _InjectedError(429)
+    if roll < settings.rate_limit_rate + settings.server_error_rate:
+        raise _InjectedError(_rng.choice((500, 502, 503)))
+
+    jitter = settings.output_tokens * settings.output_tokens_jitter
+    n = max(1, round(_rng.gauss(settings.output_tokens, jitter)))
+    truncated = max_tokens is not None and n >= max_tokens
+    if max_tokens is not None:
+        n = max(1, min(n, max_tokens))
+    tokens = [("" if i == 0 else " ") + _rng.choice(WORDS) for i in range(n)]
+
+    ttft_s = settings.ttft_ms / 1000
+    if settings.ttft_sigma > 0 and ttft_s > 0:
+        ttft_s = _rng.lognormvariate(math.log(ttft_s), settings.ttft_sigma)
+    interval = 1 / settings.tokens_per_s if settings.tokens_per_s > 0 else 0.0
+    return Completion(tokens, _count_tokens(prompt), ttft_s, interval, truncated)
+
+
+def _error_response(status: int, body: dict[str, Any]) -> JSONResponse:
+    headers = {"Retry-After": str(settings.retry_after_s)} if status == 429 else None
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+def _simulate(
+    provider: str,
+    prompt: str,
+    max_tokens: int | None,
+    error_body: Callable[[int], dict[str, Any]],
+) -> Completion | JSONResponse:
+    stats[f"{provider}.requests"] += 1
+    try:
+        return _complete(prompt, max_tokens)
+    except _InjectedError as e:
+        stats[f"{provider}.errors.{e.status}"] += 1
+        return _error_response(e.status, error_body(e.status))
+
+
+def _sse(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream")
+
+
+def _data(payload: Any, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+
+def _last_user_text(messages: list[dict[str, Any]]) -> str:
+    for message in reversed(messages or []):
+        content = message.get("content")
+        if isinstance(content, str):
+            return content
+        if isinstance(content, list):
+            return " ".join(b.get("text", "") for b in content if isinstance(b, dict))
+    return ""
+
+
+def _openai_error(status: int) -> dict[str, Any]:
+    kind = "rate_limit_exceeded" if status == 429 else "server_error"
+    return {"error": {"message": f"simulated {status}", "type": kind, "code": kind}}
+
+
+# Ollama
+
+
+@app.post("/api/chat")
+async def ollama_chat(payload: dict = Body(...)):
+    model = payload.get("model", "sim")
+    options = payload.get("options") or {}
+    result = _simulate(
+        "ollama",
+        _last_user_text(payload.get("messages") or []),
+        options.get("num_predict"),
+        lambda status: {"error": f"simulated {status}"},
+    )
+    if isinstance(result, JSONResponse):
+        return result
+
+    def message(content: str, done: bool) -> dict[str, Any]:
+        body: dict[str, Any] = {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+        }
+        if done:
+            body.update(
+                done_reason="length" if result.truncated else "stop",
+                total_duration=int(result.duration_s * 1e9),
+                prompt_eval_count=result.prompt_tokens,
+                eval_count=len(result.tokens),
+                eval_duration=int((result.duration_s - result.ttft_s) * 1e9),
+            )
+        return body
+
+    if payload.get("stream", True) is False:
+        await asyncio.sleep(result.duration_s)
+        return message(result.text, True)
+
+    async def lines() -> AsyncIterator[str]:
+        async for chunk in result.chunks(settings.tokens_per_chunk):
+            yield json.dumps(message(chunk, False)) + "\n"
+        yield json.dumps(message("", True)) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+# hf-ort (same request/response as hf-ort/app/main.py)
+
+
+@app.post("/generate")
+async def hf_ort_generate(payload: dict = Body(...)):
+    prompt = payload.get("prompt") or ""
+    if not prompt.strip():
+        raise HTTPException(status_code=400, detail="prompt is required")
+    result = _simulate(
+        "hf-ort",
+        prompt,
+        payload.get("max_new_tokens", 128),
+        lambda status: {"detail": f"simulated {status}"},
+    )
+    if isinstance(result, JSONResponse):
+        return result
+    await asyncio.sleep(result.duration_s)
+    return {
+        "text": result.text,
+        "latency_ms": result.duration_s * 1000,
+        "engine": "sim",
+        "model_id": payload.get("model_id", "sim"),
+        "raw": {"sim": True, "generated_tokens": len(result.tokens)},
+    }
+
+
+# TGI / OpenAI
+
+
+def _usage(result: Completion) -> dict[str, int]:
+    return {
+        "prompt_tokens": result.prompt_tokens,
+        "completion_tokens": len(result.tokens),
+        "total_tokens": result.prompt_tokens + len(result.tokens),
+    }
+
+
+@app.post("/v1/completions")
+async def tgi_completions(payload: dict = Body(...)):
+    prompt = payload.get("prompt") or ""
+    if isinstance(prompt, list):
+        prompt = " ".join(prompt)
+    result = _simulate("hf-tgi", prompt, payload.get("max_tokens"), _openai_error)
+    if isinstance(result, JSONResponse):
+        return result
+
+    completion_id = f"cmpl-{uuid.uuid4().hex[:24]}"
+    model = payload.get("model", "sim")
+    finish = "length" if result.truncated else "stop"
+
+    def body(text: str, finish_reason: str | None) -> dict[str, Any]:
+        return {
+            "id": completion_id,
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {"index": 0, "text": text, "logprobs": None, "finish_reason": finish_reason}
+            ],
+        }
+
+    if not payload.get("stream"):
+        await asyncio.sleep(result.duration_s)
+        return {**body(result.text, finish), "usage": _usage(result)}
+
+    async def events() -> AsyncIterator[str]:
+        async for chunk in result.chunks(settings.tokens_per_chunk):
+            yield _data(body(chunk, None))
+        yield _data({**body("", finish), "usage": _usage(result)})
+        yield "data: [DONE]\n\n"
+
+    return _sse(events())
+
+
+@app.post("/v1/chat/completions")
+async def openai_chat(payload: dict = Body(...)):
+    max_tokens = payload.get("max_completion_tokens") or payload.get("max_tokens")
+    result = _simulate(
+        "openai", _last_user_text(payload.get("messages") or []), max_tokens, _openai_error
+    )
+    if isinstance(result, JSONResponse):
+        return result
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    model = payload.get("model", "sim")
+    finish = "length" if result.truncated else "stop"
+    created = int(time.time())
+
+    if not payload.get("stream"):
+        await asyncio.sleep(result.duration_s)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": result.text},
+                    "finish_reason": finish,
+                }
+            ],
+            "usage": _usage(result),
+        }
+
+    def chunk(delta: dict[str, Any], finish_reason: str | None) -> dict[str, Any]:
+        return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    include_usage = (payload.get("stream_options") or {}).get("include_usage")
+
+    async def events() -> AsyncIterator[str]:
+        first = True
+        async for text in result.chunks(settings.tokens_per_chunk):
+            delta = {"role": "assistant", "content": text} if first else {"content": text}
+            first = False
+            yield _data(chunk(delta, None))
+        yield _data(chunk({}, finish))
+        if include_usage:
+            yield _data({**chunk({}, None), "choices": [], "usage": _usage(result)})
+        yield "data: [DONE]\n\n"
+
+    return _sse(events())
+
+
+# Anthropic
+
+
+def _anthropic_error(status: int) -> dict[str, Any]:
+    kind = {429: "rate_limit_error", 529: "overloaded_error"}.get(status, "api_error")
+    return {"type": "error", "error": {"type": kind, "message": f"simulated {status}"}}
+
+
+@app.post("/v1/messages")
+async def anthropic_messages(payload: dict = Body(...)):
+    result = _simulate(
+        "anthropic",
+        _last_user_text(payload.get("messages") or []),
+        payload.get("max_tokens"),
+        _anthropic_error,
+    )
+    if isinstance(result, JSONResponse):
+        return result
+
+    message = {
+        "id": f"msg_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": payload.get("model", "sim"),
+        "content": [],
+        "stop_reason": None,
+        "stop_sequence": None,
+        "usage": {"input_tokens": result.prompt_tokens, "output_tokens": 0},
+    }
+    stop_reason = "max_tokens" if result.truncated else "end_turn"
+
+    if not payload.get("stream"):
+        await asyncio.sleep(result.duration_s)
+        return {
+            **message,
+            "content": [{"type": "text", "text": result.text}],
+            "stop_reason": stop_reason,
+            "usage": {"input_tokens": result.prompt_tokens, "output_tokens": len(result.tokens)},
+        }
+
+    async def events() -> AsyncIterator[str]:
+        yield _data({"type": "message_start", "message": message}, "message_start")
+        block = {"type": "text", "text": ""}
+        yield _data(
+            {"type": "content_block_start", "index": 0, "content_block": block},
+            "content_block_start",
+        )
+        yield _data({"type": "ping"}, "ping")
+        async for text in result.chunks(settings.tokens_per_chunk):
+            delta = {"type": "text_delta", "text": text}
+            yield _data(
+                {"type": "content_block_delta", "index": 0, "delta": delta}, "content_block_delta"
+            )
+        yield _data({"type": "content_block_stop", "index": 0}, "content_block_stop")
+        yield _data(
+            {
+                "type": "message_delta",
+                "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                "usage": {"output_tokens": len(result.tokens)},
+            },
+            "message_delta",
+        )
+        yield _data({"type": "message_stop"}, "message_stop")
+
+    return _sse(events())
+
+
+# Gemini
+
+
+def _gemini_error(status: int) -> dict[str, Any]:
+    kind = "RESOURCE_EXHAUSTED" if status == 429 else "UNAVAILABLE" if status == 503 else "INTERNAL"
+    return {"error": {"code": status, "message": f"simulated {status}", "status": kind}}
+
+
+@app.post("/v1beta/models/{target}")
+async def gemini(target: str, request: Request, payload: dict = Body(...)):
+    model, _, method = target.partition(":")
+    if method not in ("generateContent", "streamGenerateContent"):
+        raise HTTPException(status_code=404, detail=f"unknown method {method!r}")
+
+    contents = payload.get("contents") or []
+    prompt = " ".join(
+        part.get("text", "")
+        for content in contents[-1:]
+        for part in content.get("parts") or []
+        if isinstance(part, dict)
+    )
+    max_tokens = (payload.get("generationConfig") or {}).get("maxOutputTokens")
+    result = _simulate("gemini", prompt, max_tokens, _gemini_error)
+    if isinstance(result, JSONResponse):
+        return result
+
+    finish = "MAX_TOKENS" if result.truncated else "STOP"
+
+    def response(text: str, finish_reason: str | None, completion_tokens: int) -> dict[str, Any]:
+        content = {"role": "model", "parts": [{"text": text}]}
+        candidate: dict[str, Any] = {"content": content, "index": 0}
+        if finish_reason:
+            candidate["finishReason"] = finish_reason
+        return {
+            "candidates": [candidate],
+            "usageMetadata": {
+                "promptTokenCount": result.prompt_tokens,
+                "candidatesTokenCount": completion_tokens,
+                "totalTokenCount": result.prompt_tokens + completion_tokens,
+            },
+            "modelVersion": model,
+        }
+
+    if method == "generateContent":
+        await asyncio.sleep(result.duration_s)
+        return response(result.text, finish, len(result.tokens))
+
+    async def chunks() -> AsyncIterator[tuple[str, str | None, int]]:
+        sent = 0
+        async for text in result.chunks(settings.tokens_per_chunk):
+            sent += len(text.split())
+            yield text, finish if sent == len(result.tokens) else None, sent
+
+    if request.query_params.get("alt") == "sse":
+
+        async def events() -> AsyncIterator[str]:
+            async for text, finish_reason, n in chunks():
+                yield _data(response(text, finish_reason, n))
+
+        return _sse(events())
+
+    async def array() -> AsyncIterator[str]:
+        sep = "["
+        async for text, finish_reason, n in chunks():
+            yield sep + json.dumps(response(text, finish_reason, n))
+            sep = ",\r\n"
+        yield "]"
+
+    return StreamingResponse(array(), media_type="application/json")
+
+
+# Control
+
+
+@app.get("/health")
+def health() -> dict[str, Any]:
+    return {"ok": True, "engine": "sim"}
+
+
+@app.get("/sim/config")
+def get_config() -> dict[str, Any]:
+    return settings.model_dump()
+
+
+@app.put("/sim/config")
+def update_config(patch: dict = Body(...)) -> dict[str, Any]:
+    """Change latency, lengths or error rates of a running simulator (unknown keys are 400)."""
+    global settings, _rng
+    unknown = set(patch) - set(SimSettings.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown settings: {sorted(unknown)}")
+    settings = SimSettings.model_validate({**settings.model_dump(), **patch})
+    if "seed" in patch:
+        _rng = random.Random(settings.seed)
+    return settings.model_dump()
+
+
+@app.get("/sim/stats")
+def get_stats() -> dict[str, int]:
+    return dict(stats)
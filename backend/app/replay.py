@@ -1,39 +1,86 @@
 from __future__ import annotations
 
+import asyncio
+import importlib
+import os
+from contextlib import nullcontext
 from dataclasses import dataclass
 from datetime import datetime
 import time
+from typing import Any, Awaitable, Callable
 
+from opentelemetry import trace
+from sqlalchemy import DateTime, func, insert, literal, select
 from sqlalchemy.orm import Session
 
+from app.cassettes import CassetteMode, use_cassette
+from app.config import settings
+from app.events import publish_run_event, publish_run_step, replay_cancel_requested
 from app.models import AgentRun, AgentStep, RunStatus, StepType
+from app.run_totals import record_steps, recompute_totals, usage_totals
+
+tracer = trace.get_tracer(__name__)
 
 
 @dataclass
 class ReplayContext:
     run: AgentRun
     replay: AgentRun
+    # Replace the model recorded on the source run (e.g. to check a new model version).
+    model: str | None = None
+
+
+class ReplayCancelled(Exception):
+    pass
+
+
+def check_cancelled(replay: AgentRun) -> None:
+    """Executors call this between steps so POST /runs/{id}/cancel can stop a replay."""
+    if replay_cancel_requested(replay.id):
+        raise ReplayCancelled(replay.id)
 
 
-def demo_agent_executor(db: Session, replay: AgentRun) -> None:
+def _log_step(
+    db: Session,
+    replay: AgentRun,
+    step_type: StepType,
+    name: str,
+    input: dict | None = None,
+    output: dict | None = None,
+    latency_ms: float | None = None,
+    tokens: int = 0,
+    cost_usd: float | None = 0.0,
+    error_message: str | None = None,
+) -> AgentStep:
+    check_cancelled(replay)
+    step = AgentStep(
+        run_id=replay.id,
+        step_type=step_type,
+        name=name,
+        input=input,
+        output=output,
+        latency_ms=latency_ms,
+        cost_usd=cost_usd,
+        tokens=tokens,
+        error_message=error_message,
+    )
+    db.add(step)
+    db.flush()
+    record_steps(db, [step])
+    db.commit()
+    publish_run_step(replay, step)
+    return step
+
+
+def demo_agent_executor(db: Session, ctx: ReplayContext) -> None:
     """Deterministic executor used for demo-agent and demo replays."""
+    replay = ctx.replay
 
     def log(step_type: StepType, name: str, input: dict | None = None, output: dict | None = None):
         start = time.perf_counter()
         time.sleep(0.02)
         latency_ms = (time.perf_counter() - start) * 1000
-        step = AgentStep(
-            run_id=replay.id,
-            step_type=step_type,
-            name=name,
-            input=input,
-            output=output,
-            latency_ms=latency_ms,
-            cost_usd=0.0,
-            tokens=0,
-        )
-        db.add(step)
-        db.commit()
+        _log_step(db, replay, step_type, name, input=input, output=output, latency_ms=latency_ms)
 
     log(StepType.user_input, "user_input", input={"prompt": replay.input_prompt})
     now = datetime.utcnow().isoformat()
@@ -47,44 +94,260 @@ def demo_agent_executor(db: Session, replay: AgentRun) -> None:
     db.commit()
 
 
+def _recorded_call(run: AgentRun, name: str) -> dict:
+    """Input of the source run's model call, so the replay uses the same endpoint and options."""
+    for step in run.steps:
+        if step.step_type == StepType.llm_call and step.name == name and isinstance(step.input, dict):
+            return step.input
+    return {}
+
+
+def _replay_model_call(
+    db: Session,
+    ctx: ReplayContext,
+    name: str,
+    error_name: str,
+    call_input: dict[str, Any],
+    call: Callable[[], Awaitable[Any]],
+) -> None:
+    # Same step layout as the /ollama/run, /hf/run and /api/run endpoints.
+    replay = ctx.replay
+    _log_step(db, replay, StepType.user_input, "user_input", input={"prompt": replay.input_prompt})
+
+    # Model call steps are written inside the call's span (its children: HTTP, DB commits).
+    attrs = {"run.id": replay.id, "source_run.id": ctx.run.id}
+    with tracer.start_as_current_span(name, attributes=attrs):
+        start = time.perf_counter()
+        try:
+            result = asyncio.run(call())
+        except Exception as e:
+            latency_ms = (time.perf_counter() - start) * 1000
+            _log_step(
+                db, replay, StepType.error, error_name, input=call_input, latency_ms=latency_ms, error_message=str(e)
+            )
+            raise
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        text = getattr(result, "text", None)
+        if text is None:
+            text = result.content
+        usage = getattr(result, "usage", None)
+        tokens, cost_usd = usage_totals(call_input.get("model") or call_input.get("model_id"), usage)
+        output: dict[str, Any] = {"text": text, "raw": result.raw}
+        if usage is not None:
+            output["usage"] = usage
+        _log_step(
+            db,
+            replay,
+            StepType.llm_call,
+            name,
+            input=call_input,
+            output=output,
+            latency_ms=latency_ms,
+            tokens=tokens or 0,
+            cost_usd=cost_usd,
+        )
+
+    replay.final_output = text
+    replay.status = RunStatus.replayed
+    replay.updated_at = datetime.utcnow()
+    db.add(replay)
+    db.commit()
+
+
+def _provider_call(module: str, name: str) -> Callable[..., Awaitable[Any]]:
+    """A provider client function, imported on first call rather than with this module."""
+
+    def call(**kwargs: Any) -> Awaitable[Any]:
+        return getattr(importlib.import_module(module), name)(**kwargs)
+
+    return call
+
+
+ollama_chat = _provider_call("app.ollama", "ollama_chat")
+hf_ort_generate = _provider_call("app.hf_ort", "hf_ort_generate")
+
+
+def ollama_executor(db: Session, ctx: ReplayContext) -> None:
+    recorded = _recorded_call(ctx.run, "ollama_chat")
+    base_url = recorded.get("base_url") or os.environ.get(
+        "OLLAMA_BASE_URL", "http://host.docker.internal:11434"
+    )
+    model = ctx.model or recorded.get("model") or os.environ.get("OLLAMA_MODEL", "llama3.1:8b")
+    prompt = ctx.replay.input_prompt
+    _replay_model_call(
+        db,
+        ctx,
+        "ollama_chat",
+        "ollama_error",
+        {"base_url": base_url, "model": model, "prompt": prompt},
+        lambda: ollama_chat(base_url=base_url, model=model, prompt=prompt),
+    )
+
+
+def hf_ort_executor(db: Session, ctx: ReplayContext) -> None:
+    recorded = _recorded_call(ctx.run, "hf_ort_generate")
+    base_url = recorded.get("base_url") or os.environ.get("HF_ORT_BASE_URL", "http://hf-ort:8080")
+    model_id = (
+        ctx.model or recorded.get("model_id") or os.environ.get("HF_ORT_MODEL_ID", "distilbert/distilgpt2")
+    )
+    max_new_tokens = recorded.get("max_new_tokens") or 128
+    prompt = ctx.replay.input_prompt
+    _replay_model_call(
+        db,
+        ctx,
+        "hf_ort_generate",
+        "hf_ort_error",
+        {"base_url": base_url, "model_id": model_id, "prompt": prompt, "max_new_tokens": max_new_tokens},
+        lambda: hf_ort_generate(
+            base_url=base_url, model_id=model_id, prompt=prompt, max_new_tokens=max_new_tokens
+        ),
+    )
+
+
+_API_CALLS = {
+    "openai": _provider_call("app.model_apis", "openai_chat"),
+    "anthropic": _provider_call("app.model_apis", "anthropic_messages"),
+    "gemini": _provider_call("app.model_apis", "gemini_generate"),
+}
+
+
+def api_executor(db: Session, ctx: ReplayContext) -> None:
+    """Replays api:<provider> runs. Keys come from the backend env (request keys are never stored)."""
+    provider = ctx.run.agent_name.split(":", 1)[1]
+    recorded = _recorded_call(ctx.run, "api_model_call")
+    model = ctx.model or recorded.get("model")
+    if not model:
+        raise ValueError(f"no model recorded on run {ctx.run.id}; pass a model override")
+    temperature = recorded.get("temperature")
+    max_tokens = recorded.get("max_tokens")
+    prompt = ctx.replay.input_prompt
+    _replay_model_call(
+        db,
+        ctx,
+        "api_model_call",
+        "api_model_error",
+        {"provider": provider, "model": model, "temperature": temperature, "max_tokens": max_tokens},
+        lambda: _API_CALLS[provider](
+            api_key=None, model=model, prompt=prompt, temperature=temperature, max_tokens=max_tokens
+        ),
+    )
+
+
 # Simple agent registry so replay becomes pluggable.
 AGENT_EXECUTORS = {
     "demo-agent": demo_agent_executor,
+    "ollama-agent": ollama_executor,
+    "hf-tgi-agent": hf_ort_executor,
+    **{f"api:{provider}": api_executor for provider in _API_CALLS},
 }
 
 
-def replay_with_executor(db: Session, run: AgentRun) -> AgentRun:
-    replay = AgentRun(agent_name=f"{run.agent_name} (replay)", input_prompt=run.input_prompt)
+# Replay runs are named after their source run's agent plus this suffix.
+REPLAY_SUFFIX = " (replay)"
+
+
+def is_replay(run: AgentRun) -> bool:
+    return run.agent_name.endswith(REPLAY_SUFFIX)
+
+
+def start_replay(db: Session, run: AgentRun) -> AgentRun:
+    """Create the (running) replay run; `run_replay` fills it in, usually on the replay worker."""
+    replay = AgentRun(agent_name=f"{run.agent_name}{REPLAY_SUFFIX}", input_prompt=run.input_prompt)
     db.add(replay)
     db.commit()
     db.refresh(replay)
+    publish_run_event("run_created", replay)
+    return replay
+
+
+def _shifted_created_at(start: datetime) -> Any:
+    """`start` + the step's offset from the run's first step, as a SQL expression."""
+    first = func.min(AgentStep.created_at).over()
+    if settings.embedded:
+        # Embedded mode: timestamps are text; shift in julian days, keep millisecond precision.
+        offset = func.julianday(AgentStep.created_at) - func.julianday(first)
+        return func.strftime("%Y-%m-%d %H:%M:%f", func.julianday(start.isoformat(sep=" ")) + offset)
+    return literal(start, DateTime(timezone=True)) + (AgentStep.created_at - first)
+
+
+def _clone_steps(db: Session, run: AgentRun, replay: AgentRun) -> int:
+    """Fallback: clone the source run's steps so you still get a useful artifact.
+
+    Copies server-side with one INSERT ... SELECT, so step payloads never leave Postgres, then
+    recomputes the replay's totals from the copies; commits once together with its final
+    state. Cloned steps keep their relative timing from now on (created_at = now + offset from
+    the first source step), so ordering by created_at matches the source run. Returns the
+    number of cloned steps.
+    """
+    src = select(
+        literal(replay.id).label("run_id"),
+        AgentStep.step_type,
+        AgentStep.name,
+        AgentStep.input,
+        AgentStep.output,
+        AgentStep.latency_ms,
+        AgentStep.cost_usd,
+        AgentStep.tokens,
+        AgentStep.error_message,
+        AgentStep.trace_id,
+        AgentStep.span_id,
+        _shifted_created_at(datetime.utcnow()).label("created_at"),
+    ).where(AgentStep.run_id == run.id).order_by(AgentStep.created_at, AgentStep.id)
 
+    cloned = db.execute(insert(AgentStep).from_select([c.name for c in src.selected_columns], src)).rowcount
+
+    replay.status = RunStatus.replayed
+    recompute_totals(db, [replay.id])
+    replay.final_output = run.final_output
+    replay.updated_at = datetime.utcnow()
+    db.add(replay)
+    db.commit()
+    return cloned
+
+
+def run_replay(
+    db: Session,
+    run: AgentRun,
+    replay: AgentRun,
+    model: str | None = None,
+    cassette: CassetteMode | None = None,
+) -> AgentRun:
+    """Execute a replay started with `start_replay`; cancellation and errors fail the replay run.
+
+    `cassette` ("replay" or "auto") serves the model calls from the recorded provider traffic.
+    """
     executor = AGENT_EXECUTORS.get(run.agent_name)
-    if executor is None:
-        # Fallback: clone steps so you still get a useful artifact.
-        for s in run.steps:
-            clone = AgentStep(
-                run_id=replay.id,
-                step_type=s.step_type,
-                name=s.name,
-                input=s.input,
-                output=s.output,
-                latency_ms=s.latency_ms,
-                cost_usd=s.cost_usd,
-                tokens=s.tokens,
-                error_message=s.error_message,
-            )
-            db.add(clone)
-            db.commit()
-
-        replay.status = RunStatus.replayed
-        replay.final_output = run.final_output
-        replay.total_tokens = run.total_tokens
-        replay.total_cost_usd = run.total_cost_usd
-        replay.updated_at = datetime.utcnow()
-        db.add(replay)
-        db.commit()
-        return replay
-
-    executor(db, replay)
+    try:
+        check_cancelled(replay)
+        if executor is None:
+            cloned = _clone_steps(db, run, replay)
+            # One batched event instead of a frame per step; clients reload the steps.
+            publish_run_event("replay_ready", replay, source_run_id=run.id, cloned_steps=cloned)
+        else:
+            recording = use_cassette(settings.cassette_name, cassette) if cassette else nullcontext()
+            with recording:
+                executor(db, ReplayContext(run=run, replay=replay, model=model))
+    except ReplayCancelled:
+        _fail(db, replay, "replay cancelled")
+    except Exception as e:
+        _fail(db, replay, f"replay failed: {e}")
+        publish_run_event("status", replay)
+        raise
+
+    publish_run_event("status", replay)
     return replay
+
+
+def _fail(db: Session, replay: AgentRun, message: str) -> None:
+    db.rollback()
+    replay.status = RunStatus.failed
+    replay.error_message = message
+    replay.updated_at = datetime.utcnow()
+    db.add(replay)
+    db.commit()
+
+
+def replay_with_executor(db: Session, run: AgentRun) -> AgentRun:
+    """Synchronous replay (start + run in the caller's process)."""
+    return run_replay(db, run, start_replay(db, run))
@@ -0,0 +1,234 @@
+"""Regression replay suites: replay a set of runs (optionally on another model) and diff them.
+
+A suite's items are replayed by `run_suite` on the replay worker, `concurrency` at a time. Each
+finished item is diffed against its original run (latency, tokens, evaluator scores, output
+similarity) and published on the suite's stream, so results arrive as replays finish.
+"""
+
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from statistics import fmean
+from typing import Any
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.evals import tokens
+from app.evaluators import run_evaluators
+from app.events import publish_suite_event
+from app.models import AgentRun, AgentStep, ReplaySuite, ReplaySuiteItem, RunStatus
+from app.replay import run_replay, start_replay
+from app.schemas import ReplaySuiteCreate
+
+log = logging.getLogger(__name__)
+
+
+def _suite_runs(db: Session, payload: ReplaySuiteCreate) -> list[int]:
+    if payload.run_ids:
+        found = set(db.scalars(select(AgentRun.id).where(AgentRun.id.in_(payload.run_ids))))
+        return [run_id for run_id in dict.fromkeys(payload.run_ids) if run_id in found]
+
+    conditions = []
+    if payload.agent_name:
+        conditions.append(AgentRun.agent_name == payload.agent_name)
+    if payload.status:
+        conditions.append(AgentRun.status == payload.status)
+    if payload.created_after:
+        conditions.append(AgentRun.created_at >= payload.created_after)
+    if payload.created_before:
+        conditions.append(AgentRun.created_at < payload.created_before)
+    return list(
+        db.scalars(
+            select(AgentRun.id).where(*conditions).order_by(AgentRun.created_at.desc()).limit(payload.limit)
+        )
+    )
+
+
+def create_suite(db: Session, payload: ReplaySuiteCreate) -> ReplaySuite:
+    run_ids = _suite_runs(db, payload)
+    suite = ReplaySuite(
+        name=payload.name,
+        model=payload.model,
+        cassette=payload.cassette,
+        concurrency=payload.concurrency,
+        status="queued",
+        total=len(run_ids),
+        completed=0,
+        failed=0,
+    )
+    suite.items = [ReplaySuiteItem(run_id=run_id, status="pending") for run_id in run_ids]
+    db.add(suite)
+    db.commit()
+    db.refresh(suite)
+    return suite
+
+
+def _words(text: str | None) -> set[str]:
+    return set(tokens(text or ""))
+
+
+def output_similarity(a: str | None, b: str | None) -> float:
+    """Token-set Jaccard similarity of two outputs (1.0 when both are empty)."""
+    wa, wb = _words(a), _words(b)
+    if not wa and not wb:
+        return 1.0
+    return round(len(wa & wb) / len(wa | wb), 4)
+
+
+def _pair(original: float | None, replay: float | None) -> dict[str, Any]:
+    delta = None if original is None or replay is None else round(replay - original, 4)
+    return {"original": original, "replay": replay, "delta": delta}
+
+
+def _latency_ms(db: Session, run_id: int) -> float:
+    total = db.scalar(select(func.sum(AgentStep.latency_ms)).where(AgentStep.run_id == run_id))
+    return float(total or 0.0)
+
+
+def item_diff(db: Session, run: AgentRun, replay: AgentRun) -> dict[str, Any]:
+    (original_eval, replay_eval), _ = run_evaluators(
+        db, [(run.input_prompt, run.final_output), (replay.input_prompt, replay.final_output)]
+    )
+    db.commit()  # memoized evaluator results
+
+    scores = {
+        key: _pair(value, replay_eval.scores[key])
+        for key, value in original_eval.scores.items()
+        if isinstance(value, (int, float))
+        and not isinstance(value, bool)
+        and isinstance(replay_eval.scores.get(key), (int, float))
+    }
+    return {
+        "status": replay.status.value,
+        "latency_ms": _pair(round(_latency_ms(db, run.id), 2), round(_latency_ms(db, replay.id), 2)),
+        "tokens": _pair(run.total_tokens, replay.total_tokens),
+        "scores": scores,
+        "output_similarity": output_similarity(run.final_output, replay.final_output),
+    }
+
+
+def summarize(diffs: list[dict[str, Any]]) -> dict[str, Any]:
+    """Aggregate item diffs: mean deltas and mean output similarity over the replayed items."""
+    done = [d for d in diffs if d.get("status") == RunStatus.replayed.value]
+
+    def mean_delta(values: list[float | None]) -> float | None:
+        values = [v for v in values if v is not None]
+        return round(fmean(values), 4) if values else None
+
+    score_keys = sorted({key for d in done for key in d["scores"]})
+    return {
+        "items": len(diffs),
+        "replayed": len(done),
+        "failed": len(diffs) - len(done),
+        "mean_latency_ms_delta": mean_delta([d["latency_ms"]["delta"] for d in done]),
+        "mean_tokens_delta": mean_delta([d["tokens"]["delta"] for d in done]),
+        "mean_output_similarity": mean_delta([d["output_similarity"] for d in done]),
+        "mean_score_deltas": {
+            key: mean_delta([d["scores"][key]["delta"] for d in done if key in d["scores"]])
+            for key in score_keys
+        },
+    }
+
+
+def _replay_item(item_id: int, model: str | None, cassette: str | None) -> dict[str, Any]:
+    # Runs on a pool thread with its own session.
+    db = SessionLocal()
+    try:
+        item = db.get(ReplaySuiteItem, item_id)
+        run = db.get(AgentRun, item.run_id) if item.run_id is not None else None
+        if run is None:
+            item.status = "failed"
+            item.diff = {"status": "failed", "error": "original run not found"}
+        else:
+            replay = start_replay(db, run)
+            item.replay_run_id = replay.id
+            db.commit()
+            try:
+                run_replay(db, run, replay, model=model, cassette=cassette)
+            except Exception:
+                # run_replay already marked the replay failed; the diff records it.
+                log.exception("replay of run %s failed", run.id)
+                db.rollback()
+            item.diff = item_diff(db, run, replay)
+            item.diff["error"] = replay.error_message
+            item.status = "replayed" if replay.status == RunStatus.replayed else "failed"
+
+        item.finished_at = datetime.utcnow()
+        db.commit()
+        return {
+            "item_id": item.id,
+            "run_id": item.run_id,
+            "replay_run_id": item.replay_run_id,
+            "status": item.status,
+            "diff": item.diff,
+        }
+    finally:
+        db.close()
+
+
+def run_suite(db: Session, suite: ReplaySuite) -> dict[str, Any]:
+    """Replay every pending item, `suite.concurrency` at a time, publishing each as it finishes."""
+    suite.status = "running"
+    db.commit()
+    publish_suite_event(suite.id, {"event": "suite_started", "total": suite.total})
+
+    pending = [item.id for item in suite.items if item.status == "pending"]
+    with ThreadPoolExecutor(max_workers=suite.concurrency, thread_name_prefix=f"suite-{suite.id}") as pool:
+        futures = {
+            pool.submit(_replay_item, item_id, suite.model, suite.cassette): item_id for item_id in pending
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                log.exception("replay suite %s item %s failed", suite.id, futures[future])
+                result = {"item_id": futures[future], "status": "failed", "diff": None, "error": str(e)}
+            suite.completed += 1
+            if result["status"] != "replayed":
+                suite.failed += 1
+            db.commit()
+            publish_suite_event(
+                suite.id,
+                {"event": "suite_item", "completed": suite.completed, "total": suite.total, "item": result},
+            )
+
+    db.expire(suite, ["items"])
+    suite.summary = summarize([item.diff for item in suite.items if item.diff is not None])
+    suite.status = "finished"
+    suite.finished_at = datetime.utcnow()
+    db.commit()
+    publish_suite_event(suite.id, {"event": "suite_finished", "summary": suite.summary})
+    return suite.summary
+
+
+def describe_suite(suite: ReplaySuite) -> dict[str, Any]:
+    diffs = [item.diff for item in suite.items if item.diff is not None]
+    return {
+        "id": suite.id,
+        "name": suite.name,
+        "model": suite.model,
+        "cassette": suite.cassette,
+        "concurrency": suite.concurrency,
+        "status": suite.status,
+        "total": suite.total,
+        "completed": suite.completed,
+        "failed": suite.failed,
+        # Partial summary while the suite is still running.
+        "summary": suite.summary if suite.status == "finished" else summarize(diffs),
+        "created_at": suite.created_at,
+        "finished_at": suite.finished_at,
+        "items": [
+            {
+                "item_id": item.id,
+                "run_id": item.run_id,
+                "replay_run_id": item.replay_run_id,
+                "status": item.status,
+                "diff": item.diff,
+            }
+            for item in suite.items
+        ],
+    }
@@ -0,0 +1,198 @@
+"""Per-run aggregates, maintained as steps are written.
+
+Every code path that inserts steps calls `record_steps` in the same transaction. It adds the
+steps to their runs' totals with one `UPDATE agent_runs SET x = x + :delta` per run, so
+concurrent writers to one run never lose an increment and reading a run's totals never
+aggregates over agent_steps. Model-call steps get their tokens from the provider's usage and
+their cost from `MODEL_PRICES` (see `usage_totals`).
+
+`recompute_totals` rebuilds the aggregates from the steps. The orchestrai.backfill_run_totals
+task runs it over existing runs, e.g. ones written before the aggregates existed.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Iterable
+
+from sqlalchemy import DateTime, Float, Integer, bindparam, case, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import AgentRun, AgentStep, StepType
+
+# List prices in USD per million (input, output) tokens. Model names match exactly or by the
+# longest prefix, so dated versions (gpt-4o-mini-2024-07-18) use their family's price. Add or
+# override entries with MODEL_PRICES='{"my-model": [1.0, 2.0]}'; unknown models cost None.
+MODEL_PRICES: dict[str, tuple[float, float]] = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-7-sonnet": (3.00, 15.00),
+    "claude-sonnet-4": (3.00, 15.00),
+    "claude-opus-4": (15.00, 75.00),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+
+def _rates(model: str | None) -> tuple[float, float] | None:
+    if not model:
+        return None
+    prices = {**MODEL_PRICES, **settings.model_prices}
+    # Provider-qualified names: "models/gemini-1.5-flash", "openai/gpt-4o".
+    model = model.rsplit("/", 1)[-1]
+    matches = [name for name in prices if model == name or model.startswith(name + "-")]
+    return prices[max(matches, key=len)] if matches else None
+
+
+def usage_tokens(usage: dict | None) -> tuple[int | None, int | None, int | None]:
+    """(input, output, total) tokens of a provider usage dict; None where not reported."""
+    if not usage:
+        return None, None, None
+
+    def first(*keys: str) -> int | None:
+        value = next((usage[k] for k in keys if usage.get(k) is not None), None)
+        return int(value) if value is not None else None
+
+    inp = first("input_tokens", "prompt_tokens")
+    out = first("output_tokens", "completion_tokens")
+    total = first("total_tokens")
+    if total is None and (inp is not None or out is not None):
+        total = (inp or 0) + (out or 0)
+    return inp, out, total
+
+
+def price_usd(model: str | None, input_tokens: int | None, output_tokens: int | None) -> float | None:
+    rates = _rates(model)
+    if rates is None or (input_tokens is None and output_tokens is None):
+        return None
+    return ((input_tokens or 0) * rates[0] + (output_tokens or 0) * rates[1]) / 1_000_000
+
+
+def usage_totals(model: str | None, usage: dict | None) -> tuple[int | None, float | None]:
+    """Tokens and cost of one model call from the provider's usage; None where unknown."""
+    inp, out, total = usage_tokens(usage)
+    return total, price_usd(model, inp, out)
+
+
+def _is_error(step: Any) -> bool:
+    return step.step_type == StepType.error or step.error_message is not None
+
+
+_runs = AgentRun.__table__
+_first = bindparam("first", type_=DateTime(timezone=True))
+_last = bindparam("last", type_=DateTime(timezone=True))
+_ADD_TO_TOTALS = (
+    update(_runs)
+    .where(_runs.c.id == bindparam("run"))
+    .values(
+        step_count=_runs.c.step_count + bindparam("steps", type_=Integer),
+        error_count=_runs.c.error_count + bindparam("errors", type_=Integer),
+        total_tokens=_runs.c.total_tokens + bindparam("tokens", type_=Integer),
+        total_cost_usd=_runs.c.total_cost_usd + bindparam("cost", type_=Float),
+        total_latency_ms=_runs.c.total_latency_ms + bindparam("latency", type_=Float),
+        # NULL compares false, so the first recorded step sets both bounds.
+        first_step_at=case((_runs.c.first_step_at <= _first, _runs.c.first_step_at), else_=_first),
+        last_step_at=case((_runs.c.last_step_at >= _last, _runs.c.last_step_at), else_=_last),
+    )
+)
+
+
+def record_steps(db: Session, steps: Iterable[Any]) -> None:
+    """Add newly inserted steps to their runs' totals. Does not commit.
+
+    `steps` are flushed AgentSteps, or rows with their run_id, step_type, tokens, cost_usd,
+    latency_ms, error_message and created_at.
+    """
+    deltas: dict[int, dict[str, Any]] = {}
+    for step in steps:
+        d = deltas.get(step.run_id)
+        if d is None:
+            d = deltas[step.run_id] = {
+                "run": step.run_id,
+                "steps": 0,
+                "errors": 0,
+                "tokens": 0,
+                "cost": 0.0,
+                "latency": 0.0,
+                "first": step.created_at,
+                "last": step.created_at,
+            }
+        d["steps"] += 1
+        d["errors"] += _is_error(step)
+        d["tokens"] += step.tokens or 0
+        d["cost"] += step.cost_usd or 0.0
+        d["latency"] += step.latency_ms or 0.0
+        if step.created_at is not None:
+            d["first"] = min(d["first"] or step.created_at, step.created_at)
+            d["last"] = max(d["last"] or step.created_at, step.created_at)
+    if deltas:
+        # In run id order, so writers touching several runs (OTLP exports) lock them in one order.
+        db.execute(_ADD_TO_TOTALS, [deltas[run_id] for run_id in sorted(deltas)])
+
+
+def recompute_totals(db: Session, run_ids: list[int]) -> None:
+    """Rebuild the aggregates of the given runs from their steps. Does not commit.
+
+    Token and cost totals are only replaced when some step reports them, so totals a client
+    set with PATCH /runs/{id} survive for runs whose steps carry none.
+    """
+    error = case((or_(AgentStep.step_type == StepType.error, AgentStep.error_message.is_not(None)), 1), else_=0)
+    sums = (
+        select(
+            AgentStep.run_id,
+            func.count().label("steps"),
+            func.sum(error).label("errors"),
+            func.sum(AgentStep.tokens).label("tokens"),
+            func.sum(AgentStep.cost_usd).label("cost"),
+            func.coalesce(func.sum(AgentStep.latency_ms), 0.0).label("latency"),
+            func.min(AgentStep.created_at).label("first"),
+            func.max(AgentStep.created_at).label("last"),
+        )
+        .where(AgentStep.run_id.in_(run_ids))
+        .group_by(AgentStep.run_id)
+        .subquery()
+    )
+    db.execute(
+        update(_runs)
+        .where(_runs.c.id == sums.c.run_id)
+        .values(
+            step_count=sums.c.steps,
+            error_count=sums.c.errors,
+            total_tokens=func.coalesce(sums.c.tokens, _runs.c.total_tokens),
+            total_cost_usd=func.coalesce(sums.c.cost, _runs.c.total_cost_usd),
+            total_latency_ms=sums.c.latency,
+            first_step_at=sums.c.first,
+            last_step_at=sums.c.last,
+        )
+    )
+
+
+def backfill(
+    db: Session, chunk_size: int = 1000, progress: Callable[[int, int], None] | None = None
+) -> dict[str, int]:
+    """Recompute every run's aggregates, committing per chunk of runs (keyset paging)."""
+    total = db.scalar(select(func.count(AgentRun.id))) or 0
+    processed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            db.scalars(select(AgentRun.id).where(AgentRun.id > last_id).order_by(AgentRun.id).limit(chunk_size))
+        )
+        if not ids:
+            break
+        recompute_totals(db, ids)
+        db.commit()
+        processed += len(ids)
+        last_id = ids[-1]
+        if progress is not None:
+            progress(processed, total)
+    return {"processed": processed, "total": total}
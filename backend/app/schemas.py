@@ -20,6 +20,8 @@ StepType = Literal[
 class RunCreate(BaseModel):
     agent_name: str = Field(..., max_length=200)
     input_prompt: str
+    # Retries with the same key return the run created by the first attempt.
+    idempotency_key: str | None = Field(None, max_length=64)
 
 
 class OllamaRunCreate(BaseModel):
@@ -72,6 +74,17 @@ class RunUpdate(BaseModel):
     error_message: str | None = None
 
 
+class BulkEvaluateRequest(BaseModel):
+    """Select runs to (re)evaluate in bulk. All filters are optional and combined with AND."""
+
+    agent_name: str | None = None
+    status: RunStatus | None = None
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+    missing_eval: bool = False
+    chunk_size: int = Field(500, ge=1, le=5000)
+
+
 class StepCreate(BaseModel):
     step_type: StepType
     name: str | None = None
@@ -81,6 +94,16 @@ class StepCreate(BaseModel):
     cost_usd: float | None = None
     tokens: int | None = None
     error_message: str | None = None
+    # Unique per run: a retried step is not stored (or published) twice.
+    idempotency_key: str | None = Field(None, max_length=64)
+    # The client's own step counter, kept for ordering steps that arrive out of order.
+    seq: int | None = None
+
+
+class StepBatchCreate(BaseModel):
+    """Several steps of one run, persisted in one transaction (used by the client SDK)."""
+
+    steps: list[StepCreate] = Field(..., min_length=1, max_length=1000)
 
 
 class AgentStepOut(BaseModel):
@@ -94,6 +117,9 @@ class AgentStepOut(BaseModel):
     cost_usd: float | None
     tokens: int | None
     error_message: str | None
+    trace_id: str | None = None
+    span_id: str | None = None
+    seq: int | None = None
     created_at: datetime
 
     class Config:
@@ -107,6 +133,11 @@ class AgentRunOut(BaseModel):
     final_output: str | None
     total_tokens: int
     total_cost_usd: float
+    step_count: int = 0
+    error_count: int = 0
+    total_latency_ms: float = 0.0
+    first_step_at: datetime | None = None
+    last_step_at: datetime | None = None
     status: RunStatus
     error_message: str | None
 
@@ -122,3 +153,21 @@ class AgentRunOut(BaseModel):
 
 class AgentRunDetailOut(AgentRunOut):
     steps: list[AgentStepOut]
+
+
+class ReplaySuiteCreate(BaseModel):
+    """Replay a saved set of runs: explicit run_ids, or the newest runs matching the filter."""
+
+    name: str | None = Field(None, max_length=200)
+    run_ids: list[int] | None = Field(None, max_length=1000)
+    agent_name: str | None = None
+    status: RunStatus | None = None
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+    limit: int = Field(100, ge=1, le=1000)
+
+    # Model override for every replay (e.g. a new model version); None keeps each run's model.
+    model: str | None = Field(None, max_length=200)
+    concurrency: int = Field(4, ge=1, le=16)
+    # Serve model calls from recorded provider traffic (see app/cassettes.py).
+    cassette: Literal["replay", "auto"] | None = None
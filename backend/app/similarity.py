@@ -0,0 +1,164 @@
+"""Near-duplicate run detection: MinHash signatures with an LSH band index in Postgres.
+
+Each run's prompt and output are shingled into word 3-grams and summarized by a MinHash
+signature. The signature is cut into bands; runs that share any band bucket are candidates,
+and candidates are ranked by the estimated Jaccard similarity of their signatures.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import Any, Sequence
+
+import numpy as np
+from sqlalchemy import delete, select, union_all
+from sqlalchemy.orm import Session
+
+from app.db import dialect_insert
+from app.evals import tokens
+from app.models import AgentRun, RunLshBucket, RunMinHash
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS  # 32 x 4: pairs above ~0.42 Jaccard are likely to share a bucket.
+SHINGLE = 3
+
+# Bucket rows read per band and candidates scored per query; keeps huge buckets (templated
+# prompts shared by thousands of runs) from making a lookup scan them all.
+CANDIDATES_PER_BAND = 100
+MAX_CANDIDATES = 300
+
+_PRIME = np.uint64((1 << 61) - 1)
+_MASK32 = np.uint64(0xFFFFFFFF)
+_rng = np.random.default_rng(20261019)
+# a, b < 2**32 and shingle hashes < 2**32, so a * h + b fits in uint64.
+_A = _rng.integers(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+# Distinct tags so a prompt shingle never equals the same words in the output.
+_FIELD_TAGS = (np.uint64(0x9E3779B9), np.uint64(0x85EBCA6B))
+
+
+def _token_hashes(text: str) -> np.ndarray:
+    hashes = (zlib.crc32(t.encode("utf-8", errors="surrogatepass")) for t in tokens(text))
+    return np.fromiter(hashes, dtype=np.uint64)
+
+
+def _shingles(text: str, tag: np.uint64) -> np.ndarray:
+    h = _token_hashes(text)
+    if len(h) >= SHINGLE:
+        # Polynomial combination of adjacent token hashes (wraps mod 2**64), folded to 32 bits.
+        combined = h[: len(h) - SHINGLE + 1].copy()
+        for k in range(1, SHINGLE):
+            combined = combined * np.uint64(1_000_003) + h[k : len(h) - SHINGLE + 1 + k]
+        h = combined
+    h = h ^ tag
+    return (h ^ (h >> np.uint64(32))) & _MASK32
+
+
+def signature(input_prompt: str, final_output: str | None) -> np.ndarray | None:
+    """MinHash signature (uint32[NUM_PERM]) of a run, or None when it has no tokens."""
+    shingles = np.concatenate(
+        [_shingles(input_prompt, _FIELD_TAGS[0]), _shingles(final_output or "", _FIELD_TAGS[1])]
+    )
+    if len(shingles) == 0:
+        return None
+    shingles = np.unique(shingles)
+    hashed = (_A[:, None] * shingles[None, :] + _B[:, None]) % _PRIME
+    return (hashed.min(axis=1) & _MASK32).astype(np.uint32)
+
+
+def band_buckets(sig: np.ndarray) -> list[int]:
+    """One signed 64-bit bucket id per band."""
+    return [
+        int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), "big", signed=True)
+        for band in sig.reshape(BANDS, ROWS)
+    ]
+
+
+def estimate_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def index_runs(db: Session, rows: Sequence[Any]) -> int:
+    """(Re)index runs given as rows with id, input_prompt and final_output. Commits.
+
+    Returns the number of runs written; runs without any tokens are removed from the index.
+    """
+    now = datetime.utcnow()
+    signatures: list[dict] = []
+    buckets: list[dict] = []
+    for row in rows:
+        sig = signature(row.input_prompt, row.final_output)
+        if sig is None:
+            continue
+        signatures.append({"run_id": row.id, "signature": sig.tobytes(), "indexed_at": now})
+        buckets.extend(
+            {"band": band, "bucket": bucket, "run_id": row.id} for band, bucket in enumerate(band_buckets(sig))
+        )
+
+    ids = [row.id for row in rows]
+    db.execute(delete(RunLshBucket).where(RunLshBucket.run_id.in_(ids)))
+    db.execute(delete(RunMinHash).where(RunMinHash.run_id.in_(ids)))
+    if signatures:
+        db.execute(dialect_insert(RunMinHash).values(signatures).on_conflict_do_nothing())
+        db.execute(dialect_insert(RunLshBucket).values(buckets).on_conflict_do_nothing())
+    db.commit()
+    return len(signatures)
+
+
+def _load_signature(db: Session, run: AgentRun) -> tuple[np.ndarray | None, bool]:
+    stored = db.scalar(select(RunMinHash.signature).where(RunMinHash.run_id == run.id))
+    if stored is not None:
+        return np.frombuffer(stored, dtype=np.uint32), True
+    # Not indexed yet (still running, or the index is being rebuilt): compute on the fly.
+    return signature(run.input_prompt, run.final_output), False
+
+
+def similar_runs(db: Session, run: AgentRun, limit: int = 10, min_similarity: float = 0.5) -> dict[str, Any]:
+    sig, indexed = _load_signature(db, run)
+    if sig is None:
+        return {"run_id": run.id, "indexed": indexed, "similar": []}
+
+    per_band = [
+        select(RunLshBucket.run_id)
+        .where(RunLshBucket.band == band, RunLshBucket.bucket == bucket, RunLshBucket.run_id != run.id)
+        .limit(CANDIDATES_PER_BAND)
+        for band, bucket in enumerate(band_buckets(sig))
+    ]
+    # Runs sharing more bands are more likely to be similar; score the most promising ones.
+    shared = Counter(db.scalars(union_all(*per_band)))
+    candidates = [run_id for run_id, _ in shared.most_common(MAX_CANDIDATES)]
+    if not candidates:
+        return {"run_id": run.id, "indexed": indexed, "similar": []}
+
+    rows = db.execute(
+        select(
+            RunMinHash.run_id,
+            RunMinHash.signature,
+            AgentRun.agent_name,
+            AgentRun.status,
+            AgentRun.created_at,
+        )
+        .join(AgentRun, AgentRun.id == RunMinHash.run_id)
+        .where(RunMinHash.run_id.in_(candidates))
+    ).all()
+
+    similar = []
+    for row in rows:
+        score = estimate_similarity(sig, np.frombuffer(row.signature, dtype=np.uint32))
+        if score >= min_similarity:
+            similar.append(
+                {
+                    "run_id": row.run_id,
+                    "agent_name": row.agent_name,
+                    "status": row.status,
+                    "created_at": row.created_at,
+                    "similarity": round(score, 4),
+                }
+            )
+    similar.sort(key=lambda s: (-s["similarity"], -s["run_id"]))
+    return {"run_id": run.id, "indexed": indexed, "similar": similar[:limit]}
@@ -1,25 +1,210 @@
 from __future__ import annotations
 
+import importlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from opentelemetry import context as otel_context
 from opentelemetry import trace
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
 from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter
+from opentelemetry.sdk.trace.sampling import ALWAYS_ON, ParentBased, TraceIdRatioBased
+from opentelemetry.trace import StatusCode
 
 from app.config import settings
 
+log = logging.getLogger(__name__)
 
-def setup_tracing() -> None:
-    resource = Resource.create({"service.name": settings.otel_service_name})
-    provider = TracerProvider(resource=resource)
+# Traces with spans still open are buffered for the tail decision; past this many the oldest
+# trace is dropped (never blocks the request thread).
+TAIL_MAX_PENDING_TRACES = 2048
+# Decisions remembered for spans that end after their local root (e.g. background work).
+TAIL_DECIDED_TRACES = 4096
+
+_configured = False
+_instrumented: set[str] = set()
+
+
+class TailSamplingProcessor(SpanProcessor):
+    """Decide per trace, once its local root span ends, whether to export it.
+
+    Error traces and traces whose root took at least `slow_ms` are always kept; the rest are
+    kept at `ratio` (by trace id, so every service makes the same choice for a trace).
+    """
+
+    def __init__(self, next_processor: SpanProcessor, ratio: float, slow_ms: float) -> None:
+        self.next = next_processor
+        self.slow_ns = slow_ms * 1_000_000
+        self.ratio_bound = TraceIdRatioBased.get_bound_for_rate(ratio)
+        self._lock = threading.Lock()
+        self._pending: OrderedDict[int, list[ReadableSpan]] = OrderedDict()
+        self._decided: OrderedDict[int, bool] = OrderedDict()
+        self.kept = 0
+        self.dropped = 0
+
+    def on_start(self, span: Span, parent_context: otel_context.Context | None = None) -> None:
+        self.next.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        is_local_root = span.parent is None or span.parent.is_remote
+
+        with self._lock:
+            decided = self._decided.get(trace_id)
+            if decided is not None:
+                spans = [span] if decided else []
+            else:
+                buffered = self._pending.setdefault(trace_id, [])
+                buffered.append(span)
+                if not is_local_root:
+                    if len(self._pending) > TAIL_MAX_PENDING_TRACES:
+                        self._pending.popitem(last=False)
+                        self.dropped += 1
+                    return
 
-    # Always export to console (free/local). This makes debugging easy in dev.
-    provider.add_span_processor(SimpleSpanProcessor(ConsoleSpanExporter()))
+                spans = self._pending.pop(trace_id)
+                keep = self._keep(span, spans)
+                self._decided[trace_id] = keep
+                if len(self._decided) > TAIL_DECIDED_TRACES:
+                    self._decided.popitem(last=False)
+                if keep:
+                    self.kept += 1
+                else:
+                    self.dropped += 1
+                    spans = []
 
-    # Optional OTLP exporter (e.g., Jaeger/Tempo via OTLP HTTP)
-    if settings.otel_exporter_otlp_endpoint:
+        for s in spans:
+            self.next.on_end(s)
+
+    def _keep(self, root: ReadableSpan, spans: list[ReadableSpan]) -> bool:
+        if any(s.status.status_code is StatusCode.ERROR for s in spans):
+            return True
+        if root.end_time is not None and root.start_time is not None:
+            if root.end_time - root.start_time >= self.slow_ns:
+                return True
+        return (root.context.trace_id & TraceIdRatioBased.TRACE_ID_LIMIT) < self.ratio_bound
+
+    def shutdown(self) -> None:
+        self.next.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.next.force_flush(timeout_millis)
+
+
+def _exporter(mode: str) -> SpanExporter:
+    if mode == "otlp":
+        # Imported here: the exporter pulls in protobuf and requests, which console mode never needs.
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter(endpoint=settings.otel_exporter_otlp_endpoint or None)
+    return ConsoleSpanExporter()
+
+
+def build_tracer_provider(mode: str, exporter: SpanExporter | None = None) -> TracerProvider | None:
+    """Tracer provider for a tracing mode ("off", "console", "otlp"); None when off.
+
+    Export always goes through a bounded BatchSpanProcessor, which drops spans when its queue
+    is full instead of blocking the caller.
+    """
+    if mode == "off":
+        return None
+
+    batch = BatchSpanProcessor(
+        exporter or _exporter(mode),
+        max_queue_size=settings.tracing_queue_size,
+        max_export_batch_size=settings.tracing_export_batch_size,
+        schedule_delay_millis=settings.tracing_schedule_delay_ms,
+    )
+    resource = Resource.create({"service.name": settings.otel_service_name})
+
+    if settings.tracing_tail_sampling:
+        # Record everything; the tail processor applies the ratio after seeing errors/latency.
+        provider = TracerProvider(resource=resource, sampler=ParentBased(ALWAYS_ON))
         provider.add_span_processor(
-            BatchSpanProcessor(OTLPSpanExporter(endpoint=settings.otel_exporter_otlp_endpoint))
+            TailSamplingProcessor(batch, settings.tracing_sample_ratio, settings.tracing_slow_ms)
+        )
+    else:
+        provider = TracerProvider(
+            resource=resource, sampler=ParentBased(TraceIdRatioBased(settings.tracing_sample_ratio))
         )
+        provider.add_span_processor(batch)
+    return provider
+
+
+def tracing_mode() -> str:
+    if settings.tracing_mode != "auto":
+        return settings.tracing_mode
+    return "otlp" if settings.otel_exporter_otlp_endpoint else "console"
+
+
+def setup_tracing() -> None:
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    provider = build_tracer_provider(tracing_mode())
+    if provider is not None:
+        trace.set_tracer_provider(provider)
+
+
+# (instrumentor module, class) per library; each ships as opentelemetry-instrumentation-<lib>.
+_INSTRUMENTORS = {
+    "sqlalchemy": ("opentelemetry.instrumentation.sqlalchemy", "SQLAlchemyInstrumentor"),
+    "httpx": ("opentelemetry.instrumentation.httpx", "HTTPXClientInstrumentor"),
+    "redis": ("opentelemetry.instrumentation.redis", "RedisInstrumentor"),
+    "celery": ("opentelemetry.instrumentation.celery", "CeleryInstrumentor"),
+}
+
+
+def _instrumentor(module: str, name: str) -> Any | None:
+    try:
+        return getattr(importlib.import_module(module), name)()
+    except ImportError:
+        log.warning("tracing: %s is not installed, skipping", module)
+        return None
+
+
+def instrument(app: Any | None = None) -> None:
+    """Auto-instrument DB, provider HTTP, Redis and Celery (and `app`, a FastAPI app, if given).
+
+    Celery instrumentation propagates the trace context through task headers, so worker task
+    spans join the trace of the request that enqueued them. A no-op when tracing is off.
+    """
+    if not settings.tracing_auto_instrument or tracing_mode() == "off":
+        return
+
+    for lib, (module, name) in _INSTRUMENTORS.items():
+        if lib in _instrumented:
+            continue
+        _instrumented.add(lib)
+        instrumentor = _instrumentor(module, name)
+        if instrumentor is None:
+            continue
+        if lib == "sqlalchemy":
+            from app.db import engine
+
+            instrumentor.instrument(engine=engine)
+        else:
+            instrumentor.instrument()
+
+    if app is not None and "fastapi" not in _instrumented:
+        _instrumented.add("fastapi")
+        instrumentor = _instrumentor("opentelemetry.instrumentation.fastapi", "FastAPIInstrumentor")
+        if instrumentor is not None:
+            # Websocket streams are long-lived, and tracing OTLP ingest would trace its own export.
+            instrumentor.instrument_app(app, excluded_urls="health,metrics,ws/.*,v1/traces")
+
+
+def current_trace_id() -> str | None:
+    """Hex trace id of the active span (None outside a recorded trace); AgentStep's default."""
+    ctx = trace.get_current_span().get_span_context()
+    return format(ctx.trace_id, "032x") if ctx.is_valid else None
+
 
-    trace.set_tracer_provider(provider)
+def current_span_id() -> str | None:
+    ctx = trace.get_current_span().get_span_context()
+    return format(ctx.span_id, "016x") if ctx.is_valid else None
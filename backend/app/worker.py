@@ -1,18 +1,86 @@
 from __future__ import annotations
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any
+
 from celery import Celery
+from celery.result import AsyncResult
+from celery.signals import worker_process_shutdown, worker_ready
+from celery.utils import uuid
+from sqlalchemy import Integer, column, func, select, update, values
 
-from app.db import SessionLocal
-from app.evals import offline_basic_eval
-from app.models import AgentRun, RunEval
+from app.db import SessionLocal, dialect_insert
+from app.evaluators import run_evaluators
+from app.events import publish_run_event
+from app.models import AgentRun, ReplaySuite, RunEval, RunStatus
+from app.replay import run_replay
+from app.replay_suites import run_suite
+from app.run_totals import backfill as backfill_totals
+from app.similarity import index_runs
+from app.metrics import instrument_celery, mark_process_dead, serve as serve_metrics
+from app.profiling import install_worker_hooks
+from app.tracing import instrument, setup_tracing
 
 from app.config import settings
 
-celery_app = Celery(
-    "orchestrai",
-    broker=settings.redis_url,
-    backend=settings.redis_url,
-)
+if settings.embedded:
+    # Embedded mode: tasks run on an in-process thread pool (see send_task), results in memory.
+    celery_app = Celery("orchestrai", broker="memory://", backend="cache+memory://")
+    celery_app.conf.task_store_eager_result = True
+else:
+    celery_app = Celery(
+        "orchestrai",
+        broker=settings.redis_url,
+        backend=settings.redis_url,
+    )
+# Worker spans (tasks, DB, Redis, provider HTTP) continue the enqueuing request's trace.
+setup_tracing()
+instrument()
+instrument_celery()
+install_worker_hooks()
+
+
+@worker_ready.connect
+def _serve_metrics(**_: Any) -> None:
+    if settings.worker_metrics_port:
+        serve_metrics(settings.worker_metrics_port)
+
+
+@worker_process_shutdown.connect
+def _mark_process_dead(pid: int | None = None, **_: Any) -> None:
+    # Prefork children: drop the exited process's live gauges from the multi-process totals.
+    mark_process_dead(pid)
+
+
+# Replays get their own queue, served by the bounded replay worker (see docker-compose.yml).
+celery_app.conf.task_routes = {
+    "orchestrai.replay_run": {"queue": "replay"},
+    "orchestrai.run_replay_suite": {"queue": "replay"},
+}
+
+
+_local_pool: ThreadPoolExecutor | None = None
+_local_pool_lock = threading.Lock()
+
+
+def send_task(name: str, args: list | None = None, kwargs: dict | None = None) -> AsyncResult:
+    """Enqueue a task by name; in embedded mode it runs on this process's task threads.
+
+    Either way the returned result works with GET /tasks/{id} and `.get()`.
+    """
+    if not settings.embedded:
+        return celery_app.send_task(name, args=args, kwargs=kwargs)
+
+    global _local_pool
+    with _local_pool_lock:
+        if _local_pool is None:
+            _local_pool = ThreadPoolExecutor(settings.embedded_task_threads, "orchestrai-task")
+    task_id = uuid()
+    _local_pool.submit(celery_app.tasks[name].apply, args=args, kwargs=kwargs, task_id=task_id)
+    return celery_app.AsyncResult(task_id)
 
 
 @celery_app.task(name="orchestrai.evaluate_run")
@@ -23,7 +91,19 @@ def evaluate_run(run_id: int) -> dict:
         if not run:
             return {"ok": False, "error": "run not found", "run_id": run_id}
 
-        result = offline_basic_eval(run.input_prompt, run.final_output)
+        (result,), (hit,) = run_evaluators(db, [(run.input_prompt, run.final_output)])
+        if result.status == "failed":
+            # Record the failure; the run keeps its last successful snapshot.
+            ev = RunEval(run_id=run_id, provider=result.provider, status="failed", notes=result.notes)
+            db.add(ev)
+            db.commit()
+            return {"ok": False, "run_id": run_id, "eval_id": ev.id, "error": result.notes}
+
+        current = (run.eval_status, run.eval_provider, run.eval_scores)
+        if hit and current == ("success", result.provider, result.scores):
+            # Repeat request for an unchanged run: the snapshot is already current.
+            db.commit()
+            return {"ok": True, "run_id": run_id, "memo_hit": True, "provider": result.provider, "scores": result.scores}
 
         ev = RunEval(run_id=run_id, provider=result.provider, status="success", scores=result.scores, notes=result.notes)
         db.add(ev)
@@ -36,7 +116,258 @@ def evaluate_run(run_id: int) -> dict:
         db.add(run)
         db.commit()
         db.refresh(ev)
+        publish_run_event("eval", run, eval_id=ev.id, provider=ev.provider)
+
+        return {
+            "ok": True,
+            "run_id": run_id,
+            "eval_id": ev.id,
+            "memo_hit": hit,
+            "provider": ev.provider,
+            "scores": ev.scores,
+        }
+    finally:
+        db.close()
+
+
+def _bulk_eval_conditions(criteria: dict[str, Any]) -> list:
+    conditions = []
+    if criteria.get("agent_name"):
+        conditions.append(AgentRun.agent_name == criteria["agent_name"])
+    if criteria.get("status"):
+        conditions.append(AgentRun.status == criteria["status"])
+    if criteria.get("created_after"):
+        conditions.append(AgentRun.created_at >= datetime.fromisoformat(str(criteria["created_after"])))
+    if criteria.get("created_before"):
+        conditions.append(AgentRun.created_at < datetime.fromisoformat(str(criteria["created_before"])))
+    if criteria.get("missing_eval"):
+        conditions.append(AgentRun.eval_status.is_(None))
+    return conditions
+
+
+def _write_eval_chunk(db, rows: list, now: datetime, idempotency_keys: list[str] | None = None) -> set[int]:
+    """Score one chunk and persist it with one INSERT and one UPDATE ... FROM (VALUES ...).
+
+    With idempotency keys, rows whose key was already written are skipped (and their snapshot
+    left as is), as are the snapshots of runs whose evaluation failed. Returns the ids of runs
+    that got a new RunEval.
+    """
+    pairs = [(row.input_prompt, row.final_output) for row in rows]
+    scored, _ = run_evaluators(db, pairs)
+    keys = idempotency_keys or [None] * len(rows)
+
+    written = set(
+        db.scalars(
+            dialect_insert(RunEval)
+            .values(
+                [
+                    {
+                        "run_id": row.id,
+                        "provider": r.provider,
+                        "status": r.status,
+                        "scores": r.scores,
+                        "notes": r.notes,
+                        "idempotency_key": key,
+                        "created_at": now,
+                    }
+                    for row, r, key in zip(rows, scored, keys)
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=[RunEval.idempotency_key])
+            .returning(RunEval.run_id)
+        )
+    )
+
+    # Failed evaluations are recorded above but leave the run's snapshot as it is.
+    results = [(row.id, r) for row, r in zip(rows, scored) if row.id in written and r.status != "failed"]
+    if results and settings.embedded:
+        # Embedded mode: SQLite has no column aliases on VALUES; bulk UPDATE by primary key.
+        db.execute(
+            update(AgentRun),
+            [
+                {"id": run_id, "eval_provider": r.provider, "eval_scores": r.scores, "eval_status": "success"}
+                for run_id, r in results
+            ],
+        )
+    elif results:
+        snapshot = values(
+            column("id", Integer),
+            column("provider", AgentRun.eval_provider.type),
+            column("scores", AgentRun.eval_scores.type),
+            name="snapshot",
+        ).data([(run_id, r.provider, r.scores) for run_id, r in results])
+        db.execute(
+            update(AgentRun)
+            .where(AgentRun.id == snapshot.c.id)
+            .values(eval_provider=snapshot.c.provider, eval_scores=snapshot.c.scores, eval_status="success")
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+    return written
+
+
+@celery_app.task(name="orchestrai.evaluate_runs_bulk", bind=True)
+def evaluate_runs_bulk(self, criteria: dict[str, Any], chunk_size: int = 500) -> dict:
+    """Evaluate every run matching `criteria`, chunk by chunk.
+
+    Runs are paged by id (keyset), loading only the columns the evaluator reads. Progress is
+    reported as task state PROGRESS with {"processed", "total"}.
+    """
+    db = SessionLocal()
+    try:
+        conditions = _bulk_eval_conditions(criteria)
+        total = db.scalar(select(func.count(AgentRun.id)).where(*conditions)) or 0
+
+        processed = 0
+        last_id = 0
+        while True:
+            rows = db.execute(
+                select(AgentRun.id, AgentRun.input_prompt, AgentRun.final_output)
+                .where(AgentRun.id > last_id, *conditions)
+                .order_by(AgentRun.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+
+            _write_eval_chunk(db, rows, datetime.utcnow())
+            processed += len(rows)
+            last_id = rows[-1].id
+            self.update_state(state="PROGRESS", meta={"processed": processed, "total": total})
+
+        return {"ok": True, "processed": processed, "total": total}
+    finally:
+        db.close()
+
+
+@celery_app.task(name="orchestrai.evaluate_runs_batch")
+def evaluate_runs_batch(items: list[dict[str, Any]]) -> dict:
+    """Evaluate a micro-batch of finished runs from the auto-eval consumer.
+
+    Each item is {"run_id", "key", "finished_at"}; `key` makes the RunEval write idempotent, so a
+    batch redelivered after a crash does not evaluate a completion twice.
+    """
+    db = SessionLocal()
+    try:
+        by_id = {item["run_id"]: item for item in items}
+        rows = db.execute(
+            select(AgentRun.id, AgentRun.input_prompt, AgentRun.final_output)
+            .where(AgentRun.id.in_(by_id))
+            .order_by(AgentRun.id)
+        ).all()
+        if not rows:
+            return {"ok": True, "evaluated": 0, "duplicates": 0, "missing": len(by_id), "lag_ms": []}
 
-        return {"ok": True, "run_id": run_id, "eval_id": ev.id, "provider": ev.provider, "scores": ev.scores}
+        written = _write_eval_chunk(db, rows, datetime.utcnow(), [by_id[row.id]["key"] for row in rows])
+        now = time.time()
+        lag_ms = [round((now - by_id[run_id]["finished_at"]) * 1000, 1) for run_id in written]
+
+        for run_id in written:
+            run = db.get(AgentRun, run_id)
+            if run is not None:
+                publish_run_event("eval", run, provider=run.eval_provider)
+
+        return {
+            "ok": True,
+            "evaluated": len(written),
+            "duplicates": len(rows) - len(written),
+            "missing": len(by_id) - len(rows),
+            "lag_ms": lag_ms,
+        }
+    finally:
+        db.close()
+
+
+@celery_app.task(name="orchestrai.index_runs_similarity")
+def index_runs_similarity(run_ids: list[int]) -> dict:
+    """(Re)index finished runs in the MinHash/LSH similar-runs index."""
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(AgentRun.id, AgentRun.input_prompt, AgentRun.final_output).where(AgentRun.id.in_(run_ids))
+        ).all()
+        indexed = index_runs(db, rows) if rows else 0
+        return {"ok": True, "indexed": indexed, "missing": len(set(run_ids)) - len(rows)}
+    finally:
+        db.close()
+
+
+@celery_app.task(name="orchestrai.rebuild_similarity_index", bind=True)
+def rebuild_similarity_index(self, chunk_size: int = 1000) -> dict:
+    """Index every existing run, chunk by chunk (keyset paging); reports PROGRESS like bulk eval."""
+    db = SessionLocal()
+    try:
+        total = db.scalar(select(func.count(AgentRun.id))) or 0
+        processed = indexed = 0
+        last_id = 0
+        while True:
+            rows = db.execute(
+                select(AgentRun.id, AgentRun.input_prompt, AgentRun.final_output)
+                .where(AgentRun.id > last_id)
+                .order_by(AgentRun.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+
+            indexed += index_runs(db, rows)
+            processed += len(rows)
+            last_id = rows[-1].id
+            self.update_state(state="PROGRESS", meta={"processed": processed, "total": total})
+
+        return {"ok": True, "processed": processed, "indexed": indexed, "total": total}
+    finally:
+        db.close()
+
+
+@celery_app.task(name="orchestrai.backfill_run_totals", bind=True)
+def backfill_run_totals(self, chunk_size: int = 1000) -> dict:
+    """Recompute every run's step aggregates from its steps; reports PROGRESS like bulk eval."""
+
+    def progress(processed: int, total: int) -> None:
+        self.update_state(state="PROGRESS", meta={"processed": processed, "total": total})
+
+    db = SessionLocal()
+    try:
+        return {"ok": True, **backfill_totals(db, chunk_size, progress)}
+    finally:
+        db.close()
+
+
+@celery_app.task(name="orchestrai.replay_run")
+def replay_run(run_id: int, replay_id: int, model: str | None = None, cassette: str | None = None) -> dict:
+    """Execute a replay created by POST /runs/{run_id}/replay."""
+    db = SessionLocal()
+    try:
+        run = db.get(AgentRun, run_id)
+        replay = db.get(AgentRun, replay_id)
+        if not run or not replay:
+            return {"ok": False, "error": "run not found", "run_id": run_id, "replay_run_id": replay_id}
+        if replay.status != RunStatus.running:
+            # Already finished, e.g. a redelivered task.
+            return {"ok": True, "replay_run_id": replay_id, "status": replay.status.value}
+
+        run_replay(db, run, replay, model=model, cassette=cassette)
+        return {
+            "ok": replay.status != RunStatus.failed,
+            "replay_run_id": replay_id,
+            "status": replay.status.value,
+            "error": replay.error_message,
+        }
+    finally:
+        db.close()
+
+
+@celery_app.task(name="orchestrai.run_replay_suite")
+def run_replay_suite(suite_id: int) -> dict:
+    """Replay a suite's runs with the suite's own bounded concurrency (threads in this task)."""
+    db = SessionLocal()
+    try:
+        suite = db.get(ReplaySuite, suite_id)
+        if not suite:
+            return {"ok": False, "error": "suite not found", "suite_id": suite_id}
+        if suite.status == "finished":
+            return {"ok": True, "suite_id": suite_id, "summary": suite.summary}
+        return {"ok": True, "suite_id": suite_id, "summary": run_suite(db, suite)}
     finally:
         db.close()
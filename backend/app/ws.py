@@ -2,72 +2,325 @@ from __future__ import annotations
 
 import asyncio
 import json
+import re
+from dataclasses import dataclass
 from typing import Any
 
 import redis.asyncio as redis
 from fastapi import WebSocket
 
 from app.config import settings
+from app.events import run_channel, run_stream
+from app.local_bus import LocalRedis, bus as local_bus
+from app.metrics import ACTIVE_WEBSOCKETS, REDIS_SUBSCRIPTIONS
 
+# Small keepalive so proxies don't drop the socket.
+KEEPALIVE_INTERVAL_S = 25.0
+
+# Per-socket buffer; when a client falls this far behind we drop its oldest frames.
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# Backfill page size when replaying a run stream.
+BACKFILL_PAGE_SIZE = 500
+
+_EVENT_ID = re.compile(r"\d+-\d+")
+
+
+@dataclass(frozen=True)
+class HubMessage:
+    channel: str
+    payload: dict[str, Any]
+    # Pre-serialized frame shared by every subscriber of the channel.
+    text: str
+
+
+PING = HubMessage(channel="", payload={"event": "ping"}, text=json.dumps({"event": "ping"}))
+
+
+@dataclass(eq=False)
+class Subscription:
+    channel: str
+    queue: asyncio.Queue[HubMessage]
+    # Frames discarded because the client fell behind; readers backfill from the stream.
+    dropped: int = 0
+
+    def offer(self, message: HubMessage) -> bool:
+        """Enqueue without blocking the shared reader. Returns True if a frame was dropped."""
+        try:
+            self.queue.put_nowait(message)
+            return False
+        except asyncio.QueueFull:
+            pass
+
+        # Drop this client's oldest frame.
+        try:
+            self.queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        self.queue.put_nowait(message)
+        self.dropped += 1
+        return True
+
+
+def _event_id_key(event_id: str) -> tuple[int, int]:
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _normalize_event_id(event_id: str | None) -> str | None:
+    if event_id is None:
+        return None
+    event_id = event_id.strip()
+    if event_id == "0":
+        return "0-0"
+    return event_id if _EVENT_ID.fullmatch(event_id) else None
 
-async def stream_run_steps(websocket: WebSocket, run_id: int) -> None:
-    """Bridge Redis Pub/Sub -> WebSocket for live step updates."""
-    await websocket.accept()
 
-    r = redis.Redis.from_url(settings.redis_url, decode_responses=True)
-    pubsub = r.pubsub()
-    channel = f"orchestrai:run:{run_id}"
+def _decode(channel: str, data: Any, event_id: str | None = None) -> HubMessage:
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode("utf-8", errors="replace")
 
-    await pubsub.subscribe(channel)
+    if event_id is None:
+        head, sep, rest = data.partition("|")
+        if sep and _EVENT_ID.fullmatch(head):
+            event_id, data = head, rest
 
     try:
-        # Small keepalive so proxies don't drop the socket.
-        keepalive = asyncio.create_task(_keepalive(websocket))
+        payload = json.loads(data)
+    except Exception:
+        payload = None
 
-        async for msg in pubsub.listen():
-            if msg is None:
-                continue
-            if msg.get("type") != "message":
-                continue
+    if not isinstance(payload, dict):
+        # Ensure JSON object goes out even if publisher sends string.
+        payload = {"event": "message", "data": data}
+    elif event_id is None:
+        return HubMessage(channel=channel, payload=payload, text=data)
+
+    if event_id is not None:
+        payload["event_id"] = event_id
+    return HubMessage(channel=channel, payload=payload, text=json.dumps(payload, default=str))
+
+
+class SubscriptionHub:
+    """Per-process Redis Pub/Sub multiplexer for WebSocket clients.
+
+    A single PubSub connection subscribes to each channel once, reference counted
+    by local subscribers. Every message is decoded once and the same frame is
+    pushed onto each subscriber's in-memory queue.
+    """
+
+    def __init__(self, redis_url: str, queue_size: int = SUBSCRIBER_QUEUE_SIZE) -> None:
+        self.redis_url = redis_url
+        self.queue_size = queue_size
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock: asyncio.Lock | None = None
+        self._redis: redis.Redis | None = None
+        self._pubsub: Any = None
+        self._reader: asyncio.Task | None = None
+        self._keepalive: asyncio.Task | None = None
+        self._subscribers: dict[str, set[Subscription]] = {}
+
+        self.messages_received = 0
+        self.frames_dropped = 0
 
-            data = msg.get("data")
-            if isinstance(data, (bytes, bytearray)):
-                data = data.decode("utf-8", errors="replace")
+    def stats(self) -> dict[str, int]:
+        return {
+            "channels": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "messages_received": self.messages_received,
+            "frames_dropped": self.frames_dropped,
+        }
 
-            # Ensure JSON object goes out even if publisher sends string.
-            payload: Any
+    async def subscribe(self, channel: str, sub: Subscription | None = None) -> Subscription:
+        lock = self._bind_loop()
+        if sub is None:
+            sub = Subscription(channel=channel, queue=asyncio.Queue(maxsize=self.queue_size))
+
+        async with lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is None:
+                pubsub = await self._ensure_pubsub()
+                await pubsub.subscribe(channel)
+                subscribers = self._subscribers[channel] = set()
+                REDIS_SUBSCRIPTIONS.set(len(self._subscribers))
+            subscribers.add(sub)
+
+        self._ensure_tasks()
+        return sub
+
+    async def unsubscribe(self, sub: Subscription) -> None:
+        lock = self._bind_loop()
+
+        async with lock:
+            subscribers = self._subscribers.get(sub.channel)
+            if subscribers is None:
+                return
+            subscribers.discard(sub)
+            if subscribers:
+                return
+
+            del self._subscribers[sub.channel]
+            REDIS_SUBSCRIPTIONS.set(len(self._subscribers))
+            if self._pubsub is not None:
+                try:
+                    await self._pubsub.unsubscribe(sub.channel)
+                except Exception:
+                    pass
+
+    async def history(self, stream: str, after: str, count: int = BACKFILL_PAGE_SIZE) -> list[HubMessage]:
+        """Read events recorded on a run stream strictly after the given id."""
+        self._bind_loop()
+        await self._ensure_pubsub()
+        entries = await self._redis.xrange(stream, min=f"({after}", max="+", count=count)
+        return [_decode(stream, fields.get("data", ""), event_id=event_id) for event_id, fields in entries]
+
+    async def close(self) -> None:
+        for task in (self._reader, self._keepalive):
+            if task is not None:
+                task.cancel()
+        self._reader = None
+        self._keepalive = None
+        self._subscribers.clear()
+        REDIS_SUBSCRIPTIONS.set(0)
+
+        if self._pubsub is not None:
             try:
-                payload = json.loads(data)
+                await self._pubsub.aclose()
             except Exception:
-                payload = {"event": "message", "data": data}
+                pass
+        if self._redis is not None:
+            try:
+                await self._redis.aclose()
+            except Exception:
+                pass
+        self._pubsub = None
+        self._redis = None
+
+    def dispatch(self, channel: str, data: Any) -> None:
+        subscribers = self._subscribers.get(channel)
+        if not subscribers:
+            return
+
+        self.messages_received += 1
+        message = _decode(channel, data)
+        for sub in subscribers:
+            if sub.offer(message):
+                self.frames_dropped += 1
+
+    def _bind_loop(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._lock is None:
+            # Connections and tasks are loop-bound; start fresh if the loop changed (e.g. tests).
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._redis = None
+            self._pubsub = None
+            self._reader = None
+            self._keepalive = None
+            self._subscribers = {}
+            REDIS_SUBSCRIPTIONS.set(0)
+        return self._lock
+
+    async def _ensure_pubsub(self) -> Any:
+        if self._pubsub is None:
+            if settings.embedded:
+                self._redis = LocalRedis(local_bus)
+            else:
+                self._redis = redis.Redis.from_url(self.redis_url, decode_responses=True)
+            self._pubsub = self._redis.pubsub()
+        return self._pubsub
+
+    def _ensure_tasks(self) -> None:
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read_loop())
+        if self._keepalive is None or self._keepalive.done():
+            self._keepalive = asyncio.create_task(self._keepalive_loop())
+
+    async def _read_loop(self) -> None:
+        while True:
+            pubsub = self._pubsub
+            if pubsub is None:
+                return
+            try:
+                msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # redis-py reconnects and resubscribes on the next read.
+                await asyncio.sleep(1.0)
+                continue
+
+            if msg is None or msg.get("type") != "message":
+                continue
+            self.dispatch(msg.get("channel"), msg.get("data"))
+
+    async def _keepalive_loop(self) -> None:
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL_S)
+            for subscribers in list(self._subscribers.values()):
+                for sub in subscribers:
+                    sub.offer(PING)
+
+
+hub = SubscriptionHub(settings.redis_url)
+
+
+async def stream_run_steps(websocket: WebSocket, run_id: int, last_event_id: str | None = None) -> None:
+    """Bridge Redis -> WebSocket for live step updates."""
+    await stream_events(websocket, run_channel(run_id), run_stream(run_id), last_event_id)
+
 
-            await websocket.send_json(payload)
+async def stream_events(
+    websocket: WebSocket, channel: str, stream: str, last_event_id: str | None = None
+) -> None:
+    """Send a channel's live events, resuming from its stream.
+
+    When the client passes the last event id it saw ("0" for everything retained), events
+    recorded on the stream after it are sent before the live tail, so reconnects are
+    gap-free. Live frames at or before the backfilled position are skipped.
+    """
+    await websocket.accept()
+
+    sub = await hub.subscribe(channel)
+    ACTIVE_WEBSOCKETS.labels("events").inc()
+
+    try:
+        # Subscribed first, so anything published during the backfill is queued, not lost.
+        cursor = _normalize_event_id(last_event_id)
+        if cursor is not None:
+            cursor = await _send_backfill(websocket, stream, cursor)
+
+        dropped = sub.dropped
+        while True:
+            message = await sub.queue.get()
+
+            if sub.dropped != dropped and cursor is not None:
+                # This client overflowed its queue; recover the missing frames from the stream.
+                dropped = sub.dropped
+                cursor = await _send_backfill(websocket, stream, cursor)
+
+            event_id = message.payload.get("event_id") if message is not PING else None
+            if event_id is not None and cursor is not None:
+                if _event_id_key(event_id) <= _event_id_key(cursor):
+                    continue
+
+            await websocket.send_text(message.text)
+            if event_id is not None:
+                cursor = event_id
     except Exception:
         # Client disconnected or server shutting down.
         pass
     finally:
-        try:
-            keepalive.cancel()
-        except Exception:
-            pass
-        try:
-            await pubsub.unsubscribe(channel)
-        except Exception:
-            pass
-        try:
-            await pubsub.close()
-        except Exception:
-            pass
-        try:
-            await r.aclose()
-        except Exception:
-            pass
+        ACTIVE_WEBSOCKETS.labels("events").dec()
+        await hub.unsubscribe(sub)
 
 
-async def _keepalive(websocket: WebSocket) -> None:
+async def _send_backfill(websocket: WebSocket, stream: str, cursor: str) -> str:
     while True:
-        await asyncio.sleep(25)
-        try:
-            await websocket.send_json({"event": "ping"})
-        except Exception:
-            return
+        page = await hub.history(stream, cursor)
+        for message in page:
+            await websocket.send_text(message.text)
+            cursor = message.payload["event_id"]
+        if len(page) < BACKFILL_PAGE_SIZE:
+            return cursor
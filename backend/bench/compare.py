@@ -0,0 +1,76 @@
+"""Compare two bench/suite.py reports: latency percentiles and throughput, old -> new.
+
+Exits 1 if any p95/p99 grew, or any throughput fell, by more than --threshold (default 10%), or
+if a scenario of the old report is missing from the new one or failed there (has "error").
+
+    python -m bench.compare bench/results/abc123.json bench/results/def456.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Any, Iterator
+
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+GATED_LATENCY_KEYS = ("p95_ms", "p99_ms")
+
+
+def _metrics(results: dict[str, Any], prefix: str = "") -> Iterator[tuple[str, float]]:
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _metrics(value, f"{name}.")
+        elif isinstance(value, (int, float)) and (key in LATENCY_KEYS or key.endswith("_per_s")):
+            yield name, float(value)
+
+
+def compare(old: dict[str, Any], new: dict[str, Any], threshold: float) -> tuple[list[str], bool]:
+    before = dict(_metrics(old["results"]))
+    lines, regressed = [], False
+    # Metrics are only compared when both reports have them, so a broken scenario would
+    # otherwise pass unnoticed.
+    for scenario, result in old["results"].items():
+        if isinstance(result, dict) and "error" in result:
+            continue
+        after = new["results"].get(scenario)
+        if after is None:
+            lines.append(f"{scenario:40} {'':>12} {'missing':>12} {'':>8}  REGRESSION")
+            regressed = True
+        elif isinstance(after, dict) and "error" in after:
+            lines.append(f"{scenario:40} {'':>12} {'error':>12} {'':>8}  REGRESSION  {after['error']}")
+            regressed = True
+    for name, after in _metrics(new["results"]):
+        if name not in before:
+            continue
+        prev = before[name]
+        change = (after - prev) / prev if prev else 0.0
+        worse = change > threshold if name.endswith("_ms") else change < -threshold
+        gated = name.endswith("_per_s") or name.rsplit(".", 1)[-1] in GATED_LATENCY_KEYS
+        flag = "REGRESSION" if worse and gated else ""
+        regressed |= bool(flag)
+        lines.append(f"{name:40} {prev:>12.2f} {after:>12.2f} {change:>+8.1%}  {flag}")
+    return lines, regressed
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=0.10)
+    args = p.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"{'metric':40} {(old.get('commit') or 'old')[:12]:>12} {(new.get('commit') or 'new')[:12]:>12}")
+    lines, regressed = compare(old, new, args.threshold)
+    print("\n".join(lines))
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Offline evaluator throughput: per-run `offline_basic_eval` loop vs `offline_batch_eval`.
+
+    python -m bench.eval_throughput --sizes 10000 1000000 --batch 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+
+from app.evals import offline_basic_eval, offline_batch_eval
+
+WORDS = (
+    "agent tool call retrieve summarize answer the of and current date format iso json "
+    "model prompt output latency token cost error replay evaluate run step trace span"
+).split()
+
+
+def synthetic_pairs(n: int, seed: int = 0) -> list[tuple[str, str]]:
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(n):
+        prompt = " ".join(rng.choices(WORDS, k=rng.randint(8, 30))) + "?"
+        output = " ".join(rng.choices(WORDS, k=rng.randint(20, 120))) + "."
+        pairs.append((prompt, output))
+    return pairs
+
+
+def _time(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000])
+    p.add_argument("--batch", type=int, default=10_000, help="pairs per offline_batch_eval call")
+    p.add_argument("--skip-loop-above", type=int, default=1_000_000)
+    args = p.parse_args()
+
+    report = []
+    for n in args.sizes:
+        pairs = synthetic_pairs(n)
+
+        batch_s = _time(lambda: [offline_batch_eval(pairs[i : i + args.batch]) for i in range(0, n, args.batch)])
+        row = {"runs": n, "batch_size": args.batch, "batch_s": round(batch_s, 3), "batch_runs_per_s": round(n / batch_s)}
+
+        if n <= args.skip_loop_above:
+            loop_s = _time(lambda: [offline_basic_eval(p, o) for p, o in pairs])
+            row.update({"per_run_s": round(loop_s, 3), "per_run_runs_per_s": round(n / loop_s)})
+        report.append(row)
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
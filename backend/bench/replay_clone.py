@@ -0,0 +1,122 @@
+"""Replay fallback clone: per-step ORM clone (previous path) vs server-side INSERT ... SELECT.
+
+Needs the Postgres from docker-compose (DATABASE_URL). Creates a source run per size, clones it
+both ways, checks that both clones list the same steps in the same created_at order, then
+deletes everything it created.
+
+    python -m bench.replay_clone --steps 100 2000 --payload-kb 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from app.db import SessionLocal
+from app.models import AgentRun, AgentStep, RunStatus, StepType
+from app.replay import _clone_steps
+
+
+def _orm_clone(db, run: AgentRun, replay: AgentRun) -> None:
+    # The pre-server-side fallback: load every step, add and commit one clone at a time.
+    for s in run.steps:
+        db.add(
+            AgentStep(
+                run_id=replay.id,
+                step_type=s.step_type,
+                name=s.name,
+                input=s.input,
+                output=s.output,
+                latency_ms=s.latency_ms,
+                cost_usd=s.cost_usd,
+                tokens=s.tokens,
+                error_message=s.error_message,
+            )
+        )
+        db.commit()
+    replay.status = RunStatus.replayed
+    db.commit()
+
+
+def _source_run(db, steps: int, payload_kb: int) -> AgentRun:
+    run = AgentRun(agent_name="bench-clone", input_prompt="bench", status=RunStatus.success)
+    db.add(run)
+    db.commit()
+    blob = "x" * (payload_kb * 1024)
+    start = datetime.utcnow()
+    db.execute(
+        insert(AgentStep),
+        [
+            {
+                "run_id": run.id,
+                "step_type": StepType.llm_call,
+                "name": f"step-{i}",
+                "input": {"i": i, "blob": blob},
+                "output": {"i": i, "blob": blob},
+                "latency_ms": 1.0,
+                "cost_usd": 0.0,
+                "tokens": 1,
+                "created_at": start + timedelta(milliseconds=i),
+            }
+            for i in range(steps)
+        ],
+    )
+    db.commit()
+    return run
+
+
+def _names(db, run_id: int) -> list[str]:
+    return list(
+        db.scalars(select(AgentStep.name).where(AgentStep.run_id == run_id).order_by(AgentStep.created_at))
+    )
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--steps", type=int, nargs="+", default=[100, 2000])
+    p.add_argument("--payload-kb", type=int, default=4)
+    args = p.parse_args()
+
+    report = []
+    db = SessionLocal()
+    try:
+        for n in args.steps:
+            run = _source_run(db, n, args.payload_kb)
+            timings = {}
+            clones = {}
+            for label, clone in (("orm", _orm_clone), ("server_side", _clone_steps)):
+                replay = AgentRun(agent_name="bench-clone (replay)", input_prompt="bench")
+                db.add(replay)
+                db.commit()
+                db.expire_all()
+                start = time.perf_counter()
+                clone(db, db.get(AgentRun, run.id), replay)
+                timings[label] = time.perf_counter() - start
+                clones[label] = replay.id
+
+            same = _names(db, clones["orm"]) == _names(db, clones["server_side"]) == _names(db, run.id)
+            report.append(
+                {
+                    "steps": n,
+                    "payload_kb": args.payload_kb,
+                    "orm_s": round(timings["orm"], 3),
+                    "server_side_s": round(timings["server_side"], 3),
+                    "speedup": round(timings["orm"] / timings["server_side"], 1),
+                    "same_order": same,
+                }
+            )
+            for run_id in (run.id, *clones.values()):
+                db.delete(db.get(AgentRun, run_id))
+            db.commit()
+    finally:
+        db.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
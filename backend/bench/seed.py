@@ -0,0 +1,134 @@
+"""Synthetic data generator: bulk-load runs and steps with COPY for read benchmarks at scale.
+
+Needs the Postgres from docker-compose (DATABASE_URL). Seeded runs are named `bench-seed-*`,
+so they can be listed by the suite and removed with --drop.
+
+    python -m bench.seed --runs 20000 --steps-per-run 100     # 2M steps
+    python -m bench.seed --drop
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app.db import engine
+
+SEED_PREFIX = "bench-seed"
+STEP_TYPES = ("llm_call", "tool_call", "retrieval", "agent_log")
+WORDS = "agent tool call retrieve summarize answer model prompt output latency token cost".split()
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choices(WORDS, k=n))
+
+
+def seed(
+    runs: int, steps_per_run: int, agents: int = 20, payload_words: int = 40, rng_seed: int = 0
+) -> dict:
+    rng = random.Random(rng_seed)
+    start = time.perf_counter()
+    base = datetime.now(timezone.utc) - timedelta(days=30)
+
+    with engine.connect() as conn:
+        first_id = conn.execute(text("SELECT coalesce(max(id), 0) + 1 FROM agent_runs")).scalar()
+        raw = conn.connection.driver_connection
+        with raw.cursor() as cur:
+            run_cols = (
+                "id, agent_name, input_prompt, final_output, total_tokens, total_cost_usd, "
+                "status, created_at, updated_at"
+            )
+            with cur.copy(f"COPY agent_runs ({run_cols}) FROM STDIN") as copy:
+                for i in range(runs):
+                    created = base + timedelta(seconds=i * 30)
+                    copy.write_row(
+                        (
+                            first_id + i,
+                            f"{SEED_PREFIX}-{i % agents}",
+                            _sentence(rng, 12),
+                            _sentence(rng, payload_words),
+                            rng.randint(100, 5000),
+                            round(rng.random() / 10, 4),
+                            "failed" if rng.random() < 0.05 else "success",
+                            created,
+                            created,
+                        )
+                    )
+
+            step_cols = (
+                "run_id, step_type, name, input, output, latency_ms, cost_usd, tokens, created_at"
+            )
+            with cur.copy(f"COPY agent_steps ({step_cols}) FROM STDIN") as copy:
+                for i in range(runs):
+                    created = base + timedelta(seconds=i * 30)
+                    for j in range(steps_per_run):
+                        step_type = rng.choice(STEP_TYPES)
+                        copy.write_row(
+                            (
+                                first_id + i,
+                                step_type,
+                                f"{step_type}-{j}",
+                                json.dumps({"prompt": _sentence(rng, payload_words)}),
+                                json.dumps({"text": _sentence(rng, payload_words)}),
+                                rng.lognormvariate(4, 1),
+                                0.0,
+                                rng.randint(10, 500),
+                                created + timedelta(milliseconds=j * 50),
+                            )
+                        )
+        conn.execute(text("SELECT setval('agent_runs_id_seq', max(id)) FROM agent_runs"))
+        conn.execute(text("ANALYZE agent_runs"))
+        conn.execute(text("ANALYZE agent_steps"))
+        conn.commit()
+
+    elapsed = time.perf_counter() - start
+    steps = runs * steps_per_run
+    return {
+        "runs": runs,
+        "steps": steps,
+        "seconds": round(elapsed, 1),
+        "steps_per_s": round(steps / elapsed),
+    }
+
+
+def seeded_run_ids(limit: int = 1000) -> list[int]:
+    with engine.connect() as conn:
+        return list(
+            conn.execute(
+                text(
+                    "SELECT id FROM agent_runs WHERE agent_name LIKE :p ORDER BY random() LIMIT :n"
+                ),
+                {"p": f"{SEED_PREFIX}-%", "n": limit},
+            ).scalars()
+        )
+
+
+def drop() -> int:
+    with engine.begin() as conn:
+        return conn.execute(
+            text("DELETE FROM agent_runs WHERE agent_name LIKE :p"), {"p": f"{SEED_PREFIX}-%"}
+        ).rowcount
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--runs", type=int, default=10_000)
+    p.add_argument("--steps-per-run", type=int, default=100)
+    p.add_argument("--agents", type=int, default=20)
+    p.add_argument("--payload-words", type=int, default=40)
+    p.add_argument("--drop", action="store_true", help="delete previously seeded runs and exit")
+    args = p.parse_args()
+
+    if args.drop:
+        print(json.dumps({"deleted_runs": drop()}))
+        return
+    print(json.dumps(seed(args.runs, args.steps_per_run, args.agents, args.payload_words)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""Benchmark suite for the hot paths, against a running backend (docker-compose or local).
+
+Scenarios:
+- ingest:  POST /runs/{id}/steps at a fixed client concurrency (latency + steps/s)
+- reads:   GET /runs (list pages) and GET /runs/{id} on seeded runs (see bench/seed.py)
+- ws:      end-to-end step latency, POST /runs/{id}/steps -> frame on N WebSocket clients
+- replay:  POST /runs/{id}/replay of demo runs until the replay finishes
+- eval:    offline evaluator throughput in-process, and POST /runs/{id}/evaluate to task done
+
+Every scenario reports p50/p95/p99 (ms) and throughput. Results go to one JSON file stamped
+with the git commit, for `python -m bench.compare old.json new.json`.
+
+    python -m bench.seed --runs 20000 --steps-per-run 100
+    python -m bench.suite --out bench/results/$(git rev-parse --short HEAD).json
+    python -m bench.suite --scenarios ingest ws --ingest-steps 20000 --concurrency 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+SCENARIOS = ("ingest", "reads", "ws", "replay", "eval")
+
+
+def _pct(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def stats(latencies_s: list[float], elapsed_s: float, unit: str = "requests") -> dict[str, Any]:
+    ms = [v * 1000 for v in latencies_s]
+    return {
+        "count": len(ms),
+        "p50_ms": round(_pct(ms, 0.50), 2),
+        "p95_ms": round(_pct(ms, 0.95), 2),
+        "p99_ms": round(_pct(ms, 0.99), 2),
+        "max_ms": round(max(ms), 2) if ms else 0.0,
+        f"{unit}_per_s": round(len(ms) / elapsed_s, 1) if elapsed_s else 0.0,
+    }
+
+
+async def _timed_many(
+    n: int, concurrency: int, call: Callable[[int], Awaitable[Any]]
+) -> dict[str, Any]:
+    latencies: list[float] = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with sem:
+            start = time.perf_counter()
+            await call(i)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return stats(latencies, time.perf_counter() - start)
+
+
+async def _new_run(client: httpx.AsyncClient, agent: str) -> int:
+    r = await client.post("/runs", json={"agent_name": agent, "input_prompt": "bench"})
+    r.raise_for_status()
+    return r.json()["id"]
+
+
+def _step(i: int, payload: str) -> dict[str, Any]:
+    return {
+        "step_type": "llm_call",
+        "name": f"bench-{i}",
+        "input": {"prompt": payload},
+        "output": {"text": payload},
+        "latency_ms": 12.5,
+        "tokens": 42,
+    }
+
+
+async def bench_ingest(client: httpx.AsyncClient, args: argparse.Namespace) -> dict[str, Any]:
+    payload = "x" * args.payload_bytes
+    runs = [await _new_run(client, "bench-ingest") for _ in range(args.ingest_runs)]
+
+    async def post(i: int) -> None:
+        r = await client.post(f"/runs/{runs[i % len(runs)]}/steps", json=_step(i, payload))
+        r.raise_for_status()
+
+    result = await _timed_many(args.ingest_steps, args.concurrency, post)
+    return {"concurrency": args.concurrency, "payload_bytes": args.payload_bytes, **result}
+
+
+async def bench_reads(client: httpx.AsyncClient, args: argparse.Namespace) -> dict[str, Any]:
+    from bench.seed import seeded_run_ids
+
+    run_ids = seeded_run_ids(1000)
+    if not run_ids:
+        return {"skipped": "no seeded runs; run python -m bench.seed first"}
+
+    async def list_page(i: int) -> None:
+        r = await client.get("/runs", params={"limit": 50, "offset": (i * 50) % 5000})
+        r.raise_for_status()
+
+    async def detail(i: int) -> None:
+        r = await client.get(f"/runs/{random.choice(run_ids)}")
+        r.raise_for_status()
+
+    return {
+        "list": await _timed_many(args.read_requests, args.concurrency, list_page),
+        "detail": await _timed_many(args.read_requests, args.concurrency, detail),
+    }
+
+
+async def bench_ws(client: httpx.AsyncClient, args: argparse.Namespace) -> dict[str, Any]:
+    import websockets
+
+    run_id = await _new_run(client, "bench-ws")
+    ws_url = args.base_url.replace("http", "ws", 1).rstrip("/") + f"/ws/runs/{run_id}"
+    sent: dict[str, float] = {}
+    latencies: list[float] = []
+    done = asyncio.Event()
+    expected = args.ws_clients * args.ws_messages
+
+    async def listen(ready: asyncio.Event) -> None:
+        async with websockets.connect(ws_url, max_queue=None) as ws:
+            ready.set()
+            seen = 0
+            while seen < args.ws_messages:
+                msg = json.loads(await ws.recv())
+                name = (msg.get("step") or {}).get("name")
+                if msg.get("event") != "step" or name not in sent:
+                    continue
+                latencies.append(time.perf_counter() - sent[name])
+                seen += 1
+                if len(latencies) == expected:
+                    done.set()
+
+    readies = [asyncio.Event() for _ in range(args.ws_clients)]
+    listeners = [asyncio.create_task(listen(ready)) for ready in readies]
+    await asyncio.gather(*(ready.wait() for ready in readies))
+    await asyncio.sleep(0.5)
+
+    start = time.perf_counter()
+    for i in range(args.ws_messages):
+        step = _step(i, "ws")
+        sent[step["name"]] = time.perf_counter()
+        (await client.post(f"/runs/{run_id}/steps", json=step)).raise_for_status()
+        await asyncio.sleep(args.ws_interval)
+    try:
+        await asyncio.wait_for(done.wait(), timeout=60)
+    finally:
+        for task in listeners:
+            task.cancel()
+    result = stats(latencies, time.perf_counter() - start, unit="deliveries")
+    return {"clients": args.ws_clients, "messages": args.ws_messages, **result}
+
+
+async def _wait_finished(client: httpx.AsyncClient, run_id: int, timeout_s: float = 300) -> str:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        status = (await client.get(f"/runs/{run_id}")).json()["status"]
+        if status != "running":
+            return status
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"run {run_id} still running after {timeout_s}s")
+
+
+async def bench_replay(client: httpx.AsyncClient, args: argparse.Namespace) -> dict[str, Any]:
+    sources = []
+    for _ in range(min(args.replays, 10)):
+        r = await client.post("/demo/run")
+        r.raise_for_status()
+        sources.append(r.json()["run_id"])
+
+    statuses: list[str] = []
+
+    async def replay(i: int) -> None:
+        r = await client.post(f"/runs/{sources[i % len(sources)]}/replay")
+        r.raise_for_status()
+        statuses.append(await _wait_finished(client, r.json()["replay_run_id"]))
+
+    result = await _timed_many(args.replays, args.replay_concurrency, replay)
+    return {
+        "replayed": statuses.count("replayed"),
+        "concurrency": args.replay_concurrency,
+        **result,
+    }
+
+
+async def bench_eval(client: httpx.AsyncClient, args: argparse.Namespace) -> dict[str, Any]:
+    from app.evals import offline_batch_eval
+    from bench.eval_throughput import synthetic_pairs
+
+    pairs = synthetic_pairs(args.eval_pairs)
+    start = time.perf_counter()
+    for i in range(0, len(pairs), 10_000):
+        offline_batch_eval(pairs[i : i + 10_000])
+    offline_s = time.perf_counter() - start
+
+    r = await client.post("/demo/run")
+    r.raise_for_status()
+    run_id = r.json()["run_id"]
+
+    async def evaluate(i: int) -> None:
+        task_id = (await client.post(f"/runs/{run_id}/evaluate")).json()["task_id"]
+        while True:
+            state = (await client.get(f"/tasks/{task_id}")).json()["state"]
+            if state in ("SUCCESS", "FAILURE"):
+                return
+            await asyncio.sleep(0.02)
+
+    return {
+        "offline": {"pairs": len(pairs), "pairs_per_s": round(len(pairs) / offline_s)},
+        "task": await _timed_many(args.eval_tasks, args.concurrency, evaluate),
+    }
+
+
+BENCHES = {
+    "ingest": bench_ingest,
+    "reads": bench_reads,
+    "ws": bench_ws,
+    "replay": bench_replay,
+    "eval": bench_eval,
+}
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL)
+        return out.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    report: dict[str, Any] = {
+        "commit": _git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "base_url": args.base_url,
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "scenarios")},
+        "results": {},
+    }
+    limits = httpx.Limits(
+        max_connections=args.concurrency, max_keepalive_connections=args.concurrency
+    )
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120, limits=limits) as client:
+        (await client.get("/health")).raise_for_status()
+        for name in args.scenarios:
+            started = time.perf_counter()
+            try:
+                result = await BENCHES[name](client, args)
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+            result["wall_s"] = round(time.perf_counter() - started, 2)
+            report["results"][name] = result
+            print(json.dumps({name: result}))
+    return report
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--base-url", default=os.environ.get("BENCH_BASE_URL", "http://localhost:8000"))
+    p.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    p.add_argument("--out", default=None, help="write the JSON report here")
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--ingest-runs", type=int, default=10)
+    p.add_argument("--ingest-steps", type=int, default=5000)
+    p.add_argument("--payload-bytes", type=int, default=1024)
+    p.add_argument("--read-requests", type=int, default=2000)
+    p.add_argument("--ws-clients", type=int, default=100)
+    p.add_argument("--ws-messages", type=int, default=50)
+    p.add_argument("--ws-interval", type=float, default=0.05)
+    p.add_argument("--replays", type=int, default=50)
+    p.add_argument("--replay-concurrency", type=int, default=8)
+    p.add_argument("--eval-pairs", type=int, default=100_000)
+    p.add_argument("--eval-tasks", type=int, default=200)
+    args = p.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
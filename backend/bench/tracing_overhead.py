@@ -0,0 +1,105 @@
+"""Per-request tracing overhead: previous synchronous console export vs each tracing mode.
+
+A "request" is a root span with a few child spans and attributes, like the replay endpoint.
+Console output goes to a null sink and OTLP to an exporter that discards batches, so only the
+in-process cost is measured.
+
+    python -m bench.tracing_overhead --requests 20000 --children 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import time
+from typing import Sequence
+
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    ConsoleSpanExporter,
+    SimpleSpanProcessor,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.trace import NoOpTracerProvider
+
+from app.config import settings
+from app.tracing import build_tracer_provider
+
+
+class _DiscardExporter(SpanExporter):
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        return SpanExportResult.SUCCESS
+
+
+def _null_console() -> ConsoleSpanExporter:
+    # Formats every span like the real console exporter, then writes nowhere.
+    return ConsoleSpanExporter(out=io.StringIO())
+
+
+def _legacy() -> TracerProvider:
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(_null_console()))
+    return provider
+
+
+def _request(tracer, children: int, i: int) -> None:
+    with tracer.start_as_current_span("request") as root:
+        root.set_attribute("run.id", i)
+        for c in range(children):
+            with tracer.start_as_current_span(f"step-{c}") as span:
+                span.set_attribute("step.index", c)
+
+
+def _per_request_us(provider, requests: int, children: int) -> float:
+    tracer = provider.get_tracer("bench")
+    for i in range(min(requests, 500)):
+        _request(tracer, children, i)
+    start = time.perf_counter()
+    for i in range(requests):
+        _request(tracer, children, i)
+    elapsed = time.perf_counter() - start
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
+    return round(elapsed / requests * 1_000_000, 1)
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--requests", type=int, default=20000)
+    p.add_argument("--children", type=int, default=5)
+    p.add_argument("--ratio", type=float, default=0.1)
+    args = p.parse_args()
+
+    settings.tracing_sample_ratio = args.ratio
+    cases = {
+        "legacy_console_sync": _legacy,
+        "off": lambda: NoOpTracerProvider(),
+    }
+    for tail in (False, True):
+        suffix = "_tail" if tail else "_head"
+        cases[f"console_batched{suffix}"] = (
+            lambda tail=tail: _with_tail(tail, lambda: build_tracer_provider("console", _null_console()))
+        )
+        cases[f"otlp_batched{suffix}"] = (
+            lambda tail=tail: _with_tail(tail, lambda: build_tracer_provider("otlp", _DiscardExporter()))
+        )
+
+    report = {"requests": args.requests, "children": args.children, "ratio": args.ratio, "us_per_request": {}}
+    for name, make in cases.items():
+        report["us_per_request"][name] = _per_request_us(make(), args.requests, args.children)
+    print(json.dumps(report, indent=2))
+
+
+def _with_tail(tail: bool, build):
+    previous = settings.tracing_tail_sampling
+    settings.tracing_tail_sampling = tail
+    try:
+        return build()
+    finally:
+        settings.tracing_tail_sampling = previous
+
+
+if __name__ == "__main__":
+    main()
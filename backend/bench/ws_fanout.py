@@ -0,0 +1,113 @@
+"""WebSocket fan-out load test.
+
+Opens N concurrent sockets on one run channel of a running backend, publishes
+timestamped messages straight to Redis and reports delivery latency plus the
+server's resident memory before and after the sockets connect.
+
+    python -m bench.ws_fanout --sockets 5000 --messages 50 --server-pid $(pgrep -f uvicorn | head -1)
+
+5k sockets need a raised file descriptor limit (`ulimit -n 20000`) on both ends.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import redis
+import websockets
+
+
+def _rss_kb(pid: int | None) -> int | None:
+    if not pid:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _pct(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def _client(url: str, expected: int, latencies: list[float], ready: asyncio.Event, counter: list[int], total: int):
+    async with websockets.connect(url, max_queue=None, open_timeout=60) as ws:
+        counter[0] += 1
+        if counter[0] == total:
+            ready.set()
+        seen = 0
+        while seen < expected:
+            msg = json.loads(await ws.recv())
+            if msg.get("event") != "bench":
+                continue
+            latencies.append((time.time() - msg["sent_at"]) * 1000)
+            seen += 1
+
+
+async def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--ws-url", default="ws://localhost:8000")
+    p.add_argument("--redis-url", default="redis://localhost:6379/0")
+    p.add_argument("--run-id", type=int, default=999_999)
+    p.add_argument("--sockets", type=int, default=5000)
+    p.add_argument("--messages", type=int, default=20)
+    p.add_argument("--interval", type=float, default=0.2)
+    p.add_argument("--server-pid", type=int, default=None)
+    args = p.parse_args()
+
+    url = f"{args.ws_url.rstrip('/')}/ws/runs/{args.run_id}"
+    rss_before = _rss_kb(args.server_pid)
+
+    latencies: list[float] = []
+    ready = asyncio.Event()
+    counter = [0]
+    t0 = time.perf_counter()
+    clients = [
+        asyncio.create_task(_client(url, args.messages, latencies, ready, counter, args.sockets))
+        for _ in range(args.sockets)
+    ]
+    await asyncio.wait_for(ready.wait(), timeout=300)
+    connect_s = time.perf_counter() - t0
+    # Give the server a moment to finish registering subscribers.
+    await asyncio.sleep(1.0)
+    rss_connected = _rss_kb(args.server_pid)
+
+    r = redis.Redis.from_url(args.redis_url)
+    channel = f"orchestrai:run:{args.run_id}"
+    for i in range(args.messages):
+        r.publish(channel, json.dumps({"event": "bench", "seq": i, "sent_at": time.time()}))
+        await asyncio.sleep(args.interval)
+
+    await asyncio.wait_for(asyncio.gather(*clients), timeout=300)
+
+    report = {
+        "sockets": args.sockets,
+        "messages": args.messages,
+        "deliveries": len(latencies),
+        "connect_s": round(connect_s, 3),
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 2) if latencies else 0.0,
+            "p95": round(_pct(latencies, 0.95), 2),
+            "p99": round(_pct(latencies, 0.99), 2),
+            "max": round(max(latencies), 2) if latencies else 0.0,
+        },
+        "server_rss_kb": {"before": rss_before, "connected": rss_connected},
+    }
+    if rss_before and rss_connected:
+        report["server_rss_kb"]["per_socket"] = round((rss_connected - rss_before) / args.sockets, 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
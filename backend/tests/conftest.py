@@ -0,0 +1,23 @@
+import os
+import tempfile
+
+import pytest
+
+# The suite runs against the embedded single-process backend (SQLite, in-process event bus and
+# task threads) unless EMBEDDED is set explicitly. Must happen before app.config is imported.
+if "EMBEDDED" not in os.environ:
+    os.environ["EMBEDDED"] = "true"
+    os.environ["EMBEDDED_DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/orchestrai-test.db"
+# No span export from tests: the console exporter's thread would write to pytest's closed
+# stdout at exit. Tests that check tracing build their own providers.
+os.environ.setdefault("TRACING_MODE", "off")
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as c:  # runs startup: creates the schema
+        yield c
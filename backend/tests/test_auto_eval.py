@@ -0,0 +1,67 @@
+from app import auto_eval
+from app.config import settings
+
+
+def test_sampling_is_deterministic_and_per_agent(monkeypatch):
+    monkeypatch.setattr(settings, "auto_eval_sample_rate", 0.25)
+    monkeypatch.setattr(settings, "auto_eval_agent_sample_rates", {"always": 1.0, "never": 0.0})
+
+    assert all(auto_eval.sampled(i, "always") for i in range(100))
+    assert not any(auto_eval.sampled(i, "never") for i in range(100))
+
+    picks = [auto_eval.sampled(i, "other") for i in range(10_000)]
+    assert picks == [auto_eval.sampled(i, "other") for i in range(10_000)]
+    assert 2000 < sum(picks) < 3000
+
+
+class FakeRedis:
+    """The pending-entries commands recover() uses, with fixed pending and claimable entries."""
+
+    def __init__(self, own, claimable=(), deliveries=None):
+        self.own = dict(own)
+        self.claimable = list(claimable)
+        self.deliveries = deliveries or {}
+        self.acked = []
+        self.dead = []
+
+    def xpending_range(self, stream, group, min, max, count, consumername):
+        return [{"message_id": i, "times_delivered": self.deliveries.get(i, 1)} for i in list(self.own)[:count]]
+
+    def xclaim(self, stream, group, name, min_idle, ids):
+        # Like Redis 7: entries trimmed from the stream are dropped from the pending list.
+        claimed = [(i, self.own[i]) for i in ids if self.own[i] != "trimmed"]
+        self.own = dict(claimed)
+        return claimed
+
+    def xautoclaim(self, *args, count):
+        claimed = self.claimable[:count]
+        self.own.update((i, f) for i, f in claimed if f)
+        return ["0-0", claimed, []]
+
+    def xack(self, stream, group, *ids):
+        self.acked.extend(ids)
+
+    def xadd(self, stream, fields, maxlen, approximate):
+        self.dead.append((stream, fields))
+
+
+def test_recover_acks_entries_trimmed_from_the_stream():
+    r = FakeRedis({"1-0": "trimmed", "2-0": {"run_id": "7"}, "3-0": {}}, claimable=[("4-0", None)])
+    consumer = auto_eval.AutoEvalConsumer(r, "c1", batch_size=10, max_wait_ms=10)
+
+    assert consumer.recover() == [("2-0", {"run_id": "7"})]
+    assert sorted(r.acked) == ["1-0", "3-0", "4-0"]
+
+
+def test_recover_dead_letters_entries_past_max_deliveries(monkeypatch):
+    monkeypatch.setattr(settings, "auto_eval_max_deliveries", 3)
+    r = FakeRedis(
+        {"1-0": {"run_id": "1"}},
+        claimable=[("2-0", {"run_id": "2"})],
+        deliveries={"1-0": 2, "2-0": 4},
+    )
+    consumer = auto_eval.AutoEvalConsumer(r, "c1", batch_size=10, max_wait_ms=10)
+
+    assert consumer.recover() == [("1-0", {"run_id": "1"})]
+    assert r.acked == ["2-0"]
+    assert r.dead == [(auto_eval.DEAD_LETTER_STREAM, {"run_id": "2", "entry_id": "2-0", "deliveries": 4})]
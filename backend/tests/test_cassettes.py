@@ -0,0 +1,64 @@
+import asyncio
+import gzip
+
+import httpx
+import pytest
+
+from app.cassettes import Cassette, CassetteMiss, CassetteTransport, Recording, request_key
+
+
+def _call(transport, url="https://api.example.test/v1/chat?key=secret", body=None):
+    async def go():
+        async with httpx.AsyncClient(transport=transport) as client:
+            r = await client.post(url, json=body or {"model": "m", "prompt": "hi"})
+            r.raise_for_status()
+            return r.json()
+
+    return asyncio.run(go())
+
+
+def test_record_then_replay_offline(tmp_path):
+    calls = []
+
+    def provider(request):
+        calls.append(request)
+        return httpx.Response(200, json={"text": "hello"})
+
+    path = tmp_path / "t.jsonl.gz"
+    recorder = CassetteTransport(Cassette(path), "record", inner=httpx.MockTransport(provider))
+    assert _call(recorder) == {"text": "hello"}
+
+    def offline(request):
+        raise AssertionError("replay must not reach the provider")
+
+    # A fresh Cassette reads the file back; the key ignores the API key and JSON key order.
+    player = CassetteTransport(Cassette(path), "replay", inner=httpx.MockTransport(offline))
+    replayed = _call(player, url="https://api.example.test/v1/chat?key=other", body={"prompt": "hi", "model": "m"})
+    assert replayed == {"text": "hello"}
+    assert len(calls) == 1
+    assert b"secret" not in gzip.decompress(path.read_bytes())
+
+    with pytest.raises(CassetteMiss):
+        _call(player, body={"model": "m", "prompt": "something else"})
+
+
+def test_request_key_depends_on_body_and_path():
+    a = httpx.Request("POST", "https://x.test/a", json={"p": 1})
+    assert request_key(a) == request_key(httpx.Request("POST", "https://x.test/a", json={"p": 1}))
+    assert request_key(a) != request_key(httpx.Request("POST", "https://x.test/b", json={"p": 1}))
+    assert request_key(a) != request_key(httpx.Request("POST", "https://x.test/a", json={"p": 2}))
+
+
+def test_cassettes_sharing_a_file_see_each_others_appends(tmp_path):
+    path = tmp_path / "shared.jsonl.gz"
+    api, worker = Cassette(path), Cassette(path)
+    req = httpx.Request("POST", "https://x.test/a", json={"p": 1})
+    other = httpx.Request("POST", "https://x.test/a", json={"p": 2})
+    recording = Recording(200, "application/json", '{"ok":1}', 5.0)
+
+    api.put(request_key(req), req, recording)
+    # The worker indexes the API's append on a miss, then appends after it.
+    assert worker.get(request_key(req)) == recording
+    worker.put(request_key(other), other, recording)
+    assert api.get(request_key(other)) == recording
+    assert len(Cassette(path)) == 2
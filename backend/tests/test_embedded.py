@@ -0,0 +1,164 @@
+import json
+import time
+
+
+def _wait_for_task(client, task_id, timeout_s=10.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        body = client.get(f"/tasks/{task_id}").json()
+        if body["state"] in ("SUCCESS", "FAILURE"):
+            return body
+        time.sleep(0.02)
+    raise AssertionError(f"task {task_id} did not finish")
+
+
+def test_run_lifecycle_streams_over_websocket(client):
+    run = client.post("/runs", json={"agent_name": "embedded-agent", "input_prompt": "hi"}).json()
+    run_id = run["id"]
+    client.post(f"/runs/{run_id}/steps", json={"step_type": "llm_call", "name": "llm", "output": {"t": 1}})
+    batch = [{"step_type": "tool_call", "name": f"tool-{i}", "input": {"i": i}} for i in range(3)]
+    assert len(client.post(f"/runs/{run_id}/steps/batch", json={"steps": batch}).json()["step_ids"]) == 3
+    client.patch(f"/runs/{run_id}", json={"status": "success", "final_output": "done"})
+
+    detail = client.get(f"/runs/{run_id}").json()
+    assert detail["status"] == "success"
+    assert [s["name"] for s in detail["steps"]] == ["user_input", "llm", "tool-0", "tool-1", "tool-2"]
+    assert detail["steps"][2]["input"] == {"i": 0}
+
+    with client.websocket_connect(f"/ws/runs/{run_id}?last_event_id=0") as ws:
+        frames = [json.loads(ws.receive_text()) for _ in range(7)]
+        assert [f["event"] for f in frames] == ["run_created"] + ["step"] * 5 + ["status"]
+        ids = [f["event_id"] for f in frames]
+        assert ids == sorted(ids, key=lambda i: tuple(map(int, i.split("-"))))
+
+        client.post(f"/runs/{run_id}/steps", json={"step_type": "agent_log", "name": "live"})
+        live = json.loads(ws.receive_text())
+        assert live["event"] == "step" and live["step"]["name"] == "live"
+
+
+def test_evaluation_and_replay_run_on_task_threads(client):
+    run_id = client.post("/demo/run").json()["run_id"]
+
+    job = client.post(f"/runs/{run_id}/evaluate").json()
+    assert _wait_for_task(client, job["task_id"])["state"] == "SUCCESS"
+    assert client.get(f"/runs/{run_id}").json()["eval_status"] == "success"
+
+    job = client.post(f"/runs/{run_id}/replay").json()
+    assert _wait_for_task(client, job["task_id"])["state"] == "SUCCESS"
+    replay = client.get(f"/runs/{job['replay_run_id']}").json()
+    assert replay["status"] == "replayed"
+    assert [s["name"] for s in replay["steps"]] == ["user_input", "fake_llm", "clock"]
+
+
+def test_retried_ingest_is_stored_and_published_once(client):
+    body = {"agent_name": "retrying-agent", "input_prompt": "hi", "idempotency_key": "run-1"}
+    run_id = client.post("/runs", json=body).json()["id"]
+    assert client.post("/runs", json=body).json()["id"] == run_id
+
+    step = {"step_type": "llm_call", "name": "llm", "idempotency_key": "s-0", "seq": 0}
+    first = client.post(f"/runs/{run_id}/steps", json=step).json()
+    retry = client.post(f"/runs/{run_id}/steps", json=step).json()
+    assert retry == {"ok": True, "step_id": first["step_id"], "duplicate": True}
+
+    batch = [step, {**step, "idempotency_key": "s-1", "seq": 1}, {**step, "idempotency_key": None, "seq": 2}]
+    out = client.post(f"/runs/{run_id}/steps/batch", json={"steps": batch}).json()
+    assert out["step_ids"][0] == first["step_id"] and out["duplicates"] == 1
+
+    steps = client.get(f"/runs/{run_id}").json()["steps"]
+    assert [s["seq"] for s in steps] == [None, 0, 1, 2]
+
+    with client.websocket_connect(f"/ws/runs/{run_id}?last_event_id=0") as ws:
+        frames = [json.loads(ws.receive_text()) for _ in range(5)]
+        assert [f["event"] for f in frames] == ["run_created"] + ["step"] * 4
+        client.post(f"/runs/{run_id}/steps", json={"step_type": "agent_log", "name": "after"})
+        assert json.loads(ws.receive_text())["step"]["name"] == "after"
+
+
+def test_run_totals_are_maintained_on_write_and_backfilled(client):
+    from sqlalchemy import update
+
+    from app.db import SessionLocal
+    from app.models import AgentRun
+
+    run_id = client.post("/runs", json={"agent_name": "totals-agent", "input_prompt": "hi"}).json()["id"]
+    llm = {"step_type": "llm_call", "tokens": 30, "cost_usd": 0.25, "latency_ms": 100.0, "idempotency_key": "a"}
+    client.post(f"/runs/{run_id}/steps", json=llm)
+    client.post(f"/runs/{run_id}/steps", json=llm)  # retry: not counted twice
+    batch = [{"step_type": "tool_call", "latency_ms": 20.0}, {"step_type": "error", "error_message": "x", "tokens": 5}]
+    client.post(f"/runs/{run_id}/steps/batch", json={"steps": batch})
+
+    expected = {"step_count": 4, "error_count": 1, "total_tokens": 35, "total_cost_usd": 0.25, "total_latency_ms": 120.0}
+    run = client.get(f"/runs/{run_id}").json()
+    assert {k: run[k] for k in expected} == expected
+    assert (run["first_step_at"], run["last_step_at"]) == (run["steps"][0]["created_at"], run["steps"][-1]["created_at"])
+
+    with SessionLocal() as db:
+        db.execute(update(AgentRun).values(step_count=0, error_count=0, total_latency_ms=0.0, first_step_at=None))
+        db.commit()
+    job = client.post("/runs/totals/backfill").json()
+    assert _wait_for_task(client, job["task_id"])["state"] == "SUCCESS"
+    backfilled = client.get(f"/runs/{run_id}").json()
+    assert {k: backfilled[k] for k in expected} == expected
+    assert backfilled["first_step_at"] == run["first_step_at"]
+
+
+def test_bulk_evaluation_filters_runs_and_updates_snapshots(client):
+    from datetime import datetime
+
+    from sqlalchemy import select, update
+
+    from app.db import SessionLocal
+    from app.models import AgentRun, RunEval
+
+    def create(agent, created_at, eval_status=None):
+        run_id = client.post("/runs", json={"agent_name": agent, "input_prompt": "count to three"}).json()["id"]
+        with SessionLocal() as db:
+            db.execute(
+                update(AgentRun)
+                .where(AgentRun.id == run_id)
+                .values(created_at=created_at, final_output="one two three", eval_status=eval_status)
+            )
+            db.commit()
+        return run_id
+
+    matched = [create("bulk-a", datetime(2020, 1, 1, h)) for h in (1, 2, 3)]
+    unmatched = [
+        create("bulk-a", datetime(2020, 1, 1, 4), eval_status="success"),  # already evaluated
+        create("bulk-a", datetime(2020, 1, 3)),  # outside the range
+        create("bulk-b", datetime(2020, 1, 1, 5)),  # other agent
+    ]
+
+    criteria = {
+        "agent_name": "bulk-a",
+        "missing_eval": True,
+        "created_after": "2020-01-01T00:00:00",
+        "created_before": "2020-01-02T00:00:00",
+        "chunk_size": 2,
+    }
+    job = client.post("/runs/evaluate", json=criteria).json()
+    done = _wait_for_task(client, job["task_id"])
+    assert done["state"] == "SUCCESS"
+    assert (done["info"]["processed"], done["info"]["total"]) == (3, 3)
+
+    with SessionLocal() as db:
+        evaluated = db.scalars(select(RunEval.run_id).where(RunEval.run_id.in_(matched + unmatched))).all()
+        assert sorted(evaluated) == matched
+        runs = {r.id: r for r in db.scalars(select(AgentRun).where(AgentRun.id.in_(matched + unmatched)))}
+    for run_id in matched:
+        assert runs[run_id].eval_status == "success" and runs[run_id].eval_provider == "offline_basic"
+        assert runs[run_id].eval_scores
+    assert [runs[run_id].eval_scores for run_id in unmatched] == [None, None, None]
+    assert [runs[run_id].eval_status for run_id in unmatched] == ["success", None, None]
+
+
+def test_only_running_replays_can_be_cancelled(client):
+    from app.db import SessionLocal
+    from app.models import AgentRun
+    from app.replay import start_replay
+
+    run_id = client.post("/runs", json={"agent_name": "live-agent", "input_prompt": "hi"}).json()["id"]
+    assert client.post(f"/runs/{run_id}/cancel").status_code == 409
+
+    with SessionLocal() as db:
+        replay_id = start_replay(db, db.get(AgentRun, run_id)).id
+    assert client.post(f"/runs/{replay_id}/cancel").json() == {"ok": True, "run_id": replay_id}
@@ -0,0 +1,23 @@
+from app.eval_memo import EvalResultMemo, memo_key
+from app.evals import EvalResult
+
+
+def test_memo_key_depends_on_version_and_boundaries():
+    base = memo_key("offline_basic", "2", "prompt", "output")
+    assert base == memo_key("offline_basic", "2", "prompt", "output")
+    assert base != memo_key("offline_basic", "3", "prompt", "output")
+    assert memo_key("e", "1", "ab", "c") != memo_key("e", "1", "a", "bc")
+
+
+def test_lru_hit_skips_evaluator_and_database():
+    memo = EvalResultMemo(lru_size=2)
+    cached = EvalResult(provider="offline_basic", scores={"output_length": 3})
+    memo.lru.put(memo_key("offline_basic", "2", "p", "out"), cached)
+
+    def evaluator(pairs):
+        raise AssertionError("should not recompute")
+
+    results, hits = memo.evaluate(None, "offline_basic", "2", evaluator, [("p", "out"), ("p", "out")])
+    assert results == [cached, cached]
+    assert hits == [True, True]
+    assert memo.hits == 2 and memo.misses == 0
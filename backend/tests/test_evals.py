@@ -0,0 +1,40 @@
+from app.evals import offline_basic_eval, offline_batch_eval
+
+
+def _legacy_scores(input_prompt: str, final_output: str | None) -> dict:
+    # Original per-run implementation; the batch evaluator must agree on these keys.
+    text = (final_output or "").strip()
+    prompt_words = {w.lower().strip(".,:;!?()[]{}\"'") for w in input_prompt.split() if len(w) > 3}
+    out_words = {w.lower().strip(".,:;!?()[]{}\"'") for w in text.split()}
+    return {
+        "non_empty_output": bool(text),
+        "output_length": len(text),
+        "keyword_overlap": len(prompt_words.intersection(out_words)),
+    }
+
+
+PAIRS = [
+    ("Find the current date and format it as ISO.", "2026-02-22T10:00:00 is the current date."),
+    ("", None),
+    ("Summarize this (((( text", "(((( ))) summarize"),
+    ("Ünïcode WORDS and spaces İstanbul", "ünïcode words İstanbul\x1cand"),
+    ("repeat repeat repeat", "  repeat repeat repeat  "),
+    ("Return JSON please", '{"answer": [1, 2]}'),
+]
+
+
+def test_batch_matches_legacy_metrics():
+    results = offline_batch_eval(PAIRS)
+    for (prompt, output), result in zip(PAIRS, results):
+        legacy = _legacy_scores(prompt, output)
+        assert {k: result.scores[k] for k in legacy} == legacy
+        assert offline_basic_eval(prompt, output).scores == result.scores
+
+
+def test_batch_extra_metrics():
+    by_output = {o: r.scores for (_, o), r in zip(PAIRS, offline_batch_eval(PAIRS))}
+    assert by_output['{"answer": [1, 2]}']["valid_json"] is True
+    assert by_output["  repeat repeat repeat  "]["repetition_rate"] == round(2 / 3, 4)
+    assert by_output["  repeat repeat repeat  "]["novel_bigram_rate"] == 0.0
+    assert by_output["  repeat repeat repeat  "]["jaccard"] == 1.0
+    assert by_output[None]["length_ratio_tokens"] == 0.0
@@ -0,0 +1,50 @@
+from app.config import settings
+from app.eval_memo import memo
+from app.evals import EvalResult, embedding_similarity_eval
+from app.evaluators import EVALUATORS, Evaluator, run_evaluators
+
+
+class _EmptyDB:
+    # Memo table lookups find nothing; inserts are ignored.
+    def execute(self, *args, **kwargs):
+        return []
+
+
+def test_scores_from_all_evaluators_are_merged(monkeypatch):
+    monkeypatch.setattr(settings, "eval_pool_workers", 0)
+    memo.lru.clear()
+    evaluators = [EVALUATORS["offline_basic"], EVALUATORS["embedding_similarity"]]
+
+    (result,), (hit,) = run_evaluators(_EmptyDB(), [("summarize the report", "the report summary")], evaluators)
+
+    assert result.provider == "offline_basic+embedding_similarity"
+    assert "jaccard" in result.scores and 0.0 < result.scores["embedding_similarity"] <= 1.0
+    assert hit is False
+
+    _, (hit,) = run_evaluators(_EmptyDB(), [("summarize the report", "the report summary")], evaluators)
+    assert hit is True
+
+
+def test_failing_evaluator_is_noted_not_fatal(monkeypatch):
+    monkeypatch.setattr(settings, "eval_pool_workers", 0)
+
+    def broken(pairs):
+        raise RuntimeError("model missing")
+
+    evaluators = [EVALUATORS["offline_basic"], Evaluator("broken", "1", broken, cost="cpu")]
+    (result,), _ = run_evaluators(_EmptyDB(), [("a prompt", "an output")], evaluators)
+
+    assert result.provider == "offline_basic"
+    assert "broken failed: model missing" in result.notes
+    assert result.status == "success"
+
+    (result,), _ = run_evaluators(_EmptyDB(), [("a prompt", "an output")], evaluators[1:])
+    assert (result.status, result.scores, result.notes) == ("failed", {}, "broken failed: model missing")
+
+
+def test_embedding_similarity_of_identical_text_is_one():
+    (same,) = embedding_similarity_eval([("hello world", "hello world")])
+    (empty,) = embedding_similarity_eval([("hello world", None)])
+    assert isinstance(same, EvalResult)
+    assert same.scores["embedding_similarity"] == 1.0
+    assert empty.scores["embedding_similarity"] == 0.0
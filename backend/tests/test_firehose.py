@@ -0,0 +1,76 @@
+import asyncio
+
+from starlette.datastructures import QueryParams
+
+from app.firehose import FirehoseFilter, FirehoseSubscription
+from app.ws import HubMessage
+
+
+def _msg(payload: dict) -> HubMessage:
+    return HubMessage(channel="orchestrai:firehose", payload=payload, text="{}")
+
+
+def _step(run_id: int, step_type: str = "llm_call", agent: str = "a", error: str | None = None) -> dict:
+    return {
+        "event": "step",
+        "run_id": run_id,
+        "agent_name": agent,
+        "step": {"step_type": step_type, "error_message": error},
+    }
+
+
+def _status(run_id: int, status: str, agent: str = "a") -> dict:
+    return {"event": "status", "run_id": run_id, "agent_name": agent, "run": {"status": status}}
+
+
+def test_filter_from_query():
+    f = FirehoseFilter.from_query(QueryParams("agent_name=a,b&agent_name=c&status=failed&errors_only=true"))
+    assert f.agent_names == {"a", "b", "c"}
+    assert f.statuses == {"failed"}
+    assert f.errors_only
+
+
+def test_filter_matches():
+    f = FirehoseFilter(agent_names=frozenset({"a"}), step_types=frozenset({"tool_call"}))
+    assert f.matches(_step(1, "tool_call"))
+    assert not f.matches(_step(1, "llm_call"))
+    assert not f.matches(_step(1, "tool_call", agent="b"))
+    assert not f.matches(_status(1, "success"))
+
+    errors = FirehoseFilter(errors_only=True)
+    assert errors.matches(_step(1, "error"))
+    assert errors.matches(_step(1, "llm_call", error="boom"))
+    assert errors.matches(_status(1, "failed"))
+    assert not errors.matches(_status(1, "success"))
+
+
+def test_slow_consumer_is_coalesced_then_evicted():
+    async def scenario():
+        sub = FirehoseSubscription(channel="c", queue=asyncio.Queue(maxsize=1), max_coalesced=2)
+        assert not sub.offer(_msg(_step(1)))
+        sub.offer(_msg(_status(1, "running")))
+        sub.offer(_msg(_status(1, "success")))
+        sub.offer(_msg(_status(2, "success")))
+        assert sub.coalescing
+        assert [m.payload["run"]["status"] for m in sub.pending.values()] == ["success", "success"]
+        assert not sub.evicted.is_set()
+
+        sub.offer(_msg(_status(3, "success")))
+        assert sub.evicted.is_set()
+        assert not sub.pending
+
+    asyncio.run(scenario())
+
+
+def test_coalescing_keeps_the_latest_frame_per_run_and_event():
+    async def scenario():
+        sub = FirehoseSubscription(channel="c", queue=asyncio.Queue(maxsize=1))
+        sub.offer(_msg(_step(1)))
+        sub.offer(_msg(_status(1, "running")))
+        sub.offer(_msg(_step(1, "tool_call")))
+        sub.offer(_msg(_status(1, "success")))
+        sub.offer(_msg(_step(1, "llm_call")))
+        frames = [(m.payload["event"], m.payload.get("run", m.payload.get("step"))) for m in sub.take_pending()]
+        assert frames == [("status", {"status": "success"}), ("step", {"step_type": "llm_call", "error_message": None})]
+
+    asyncio.run(scenario())
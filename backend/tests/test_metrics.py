@@ -0,0 +1,38 @@
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.metrics import REGISTRY, ProviderMetricsTransport
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_provider_transport_records_latency_and_errors():
+    def provider(request):
+        return httpx.Response(429 if request.url.path == "/limited" else 200, json={"ok": True})
+
+    transport = ProviderMetricsTransport(httpx.MockTransport(provider), "test-provider")
+    before = _sample("orchestrai_model_call_seconds_count", provider="test-provider")
+
+    async def go():
+        async with httpx.AsyncClient(transport=transport) as client:
+            await client.post("http://model.test/ok", json={})
+            await client.post("http://model.test/limited", json={})
+
+    asyncio.run(go())
+
+    assert _sample("orchestrai_model_call_seconds_count", provider="test-provider") == before + 2
+    assert _sample("orchestrai_model_ttft_seconds_count", provider="test-provider") >= 2
+    assert _sample("orchestrai_model_call_errors_total", provider="test-provider", status="429") >= 1
+    assert _sample("orchestrai_model_calls_in_flight", provider="test-provider") == 0
+
+
+def test_metrics_endpoint_exposes_request_histogram():
+    client = TestClient(app)
+    client.get("/health")
+    body = client.get("/metrics").text
+    assert 'orchestrai_http_request_seconds_count{method="GET",route="/health",status="200"}' in body
@@ -0,0 +1,37 @@
+import pytest
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, text
+
+from app import migrations
+
+
+def _engine_at(revision):
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) PRIMARY KEY)"))
+        if revision:
+            conn.execute(text("INSERT INTO alembic_version VALUES (:r)"), {"r": revision})
+    return engine
+
+
+def test_head_revisions_match_alembic():
+    cfg = Config(str(migrations.BACKEND_DIR / "alembic.ini"))
+    cfg.set_main_option("script_location", str(migrations.BACKEND_DIR / "alembic"))
+    assert migrations.head_revisions() == set(ScriptDirectory.from_config(cfg).get_heads())
+
+
+def test_migrate_only_upgrades_a_database_that_is_behind(monkeypatch):
+    upgrades = []
+    monkeypatch.setattr(migrations, "_upgrade", lambda conn: upgrades.append(conn))
+    (head,) = migrations.head_revisions()
+
+    current = _engine_at(head)
+    assert migrations.migrate(current) is False
+    migrations.require_current(current)
+
+    behind = _engine_at("0001_init")
+    with pytest.raises(migrations.SchemaOutOfDate):
+        migrations.require_current(behind)
+    assert migrations.migrate(behind) is True
+    assert len(upgrades) == 1
@@ -0,0 +1,115 @@
+import json
+
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import Status, StatusCode
+
+from app.models import StepType
+from app.otlp import DEFAULT_ATTRIBUTE_MAP, decode_json, decode_protobuf, map_span, step_row
+
+
+def _export():
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider(resource=Resource.create({"service.name": "support-bot"}))
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    tracer = provider.get_tracer("agent")
+    with tracer.start_as_current_span("invoke_agent", attributes={"gen_ai.operation.name": "invoke_agent"}):
+        with tracer.start_as_current_span(
+            "chat gpt-4o",
+            attributes={
+                "gen_ai.operation.name": "chat",
+                "gen_ai.request.model": "gpt-4o",
+                "gen_ai.input.messages": json.dumps([{"role": "user", "content": "hi"}]),
+                "gen_ai.usage.input_tokens": 12,
+                "gen_ai.usage.output_tokens": 30,
+                "http.route": "/v1/chat",
+            },
+        ):
+            pass
+        with tracer.start_as_current_span("lookup", attributes={"gen_ai.tool.name": "kb_search"}) as tool:
+            tool.set_status(Status(StatusCode.ERROR, "timeout"))
+        with tracer.start_as_current_span("GET /internal"):
+            pass
+    return exporter.get_finished_spans()
+
+
+def test_protobuf_export_maps_to_steps():
+    spans = decode_protobuf(encode_spans(_export()).SerializeToString())
+    mapped = {s.name: map_span(s, DEFAULT_ATTRIBUTE_MAP) for s in spans}
+
+    assert [m.span.name for m in mapped.values() if m.is_root] == ["invoke_agent"]
+    assert not mapped["GET /internal"].is_step
+    assert mapped["invoke_agent"].fields["agent_name"] == "support-bot"
+
+    keys = {name for names in DEFAULT_ATTRIBUTE_MAP.values() for name in names}
+    chat = step_row(mapped["chat gpt-4o"], 7, keys)
+    assert chat["step_type"] == StepType.llm_call
+    assert chat["tokens"] == 42
+    assert chat["cost_usd"] == (12 * 2.50 + 30 * 10.00) / 1_000_000  # priced by model: no cost attribute
+    assert chat["input"] == {
+        "model": "gpt-4o",
+        "prompt": [{"role": "user", "content": "hi"}],
+        "attributes": {"http.route": "/v1/chat"},
+    }
+    assert chat["trace_id"] == mapped["invoke_agent"].span.trace_id
+
+    tool = step_row(mapped["lookup"], 7, keys)
+    assert (tool["step_type"], tool["name"], tool["error_message"]) == (StepType.error, "kb_search", "timeout")
+
+
+def test_json_export_decodes_like_protobuf():
+    body = {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "bot"}}]},
+                "scopeSpans": [
+                    {
+                        "spans": [
+                            {
+                                "traceId": "5B8EFFF798038103D269B633813FC60C",
+                                "spanId": "EEE19B7EC3C1B174",
+                                "parentSpanId": "EEE19B7EC3C1B173",
+                                "name": "chat",
+                                "startTimeUnixNano": "1544712660000000000",
+                                "endTimeUnixNano": "1544712661500000000",
+                                "attributes": [
+                                    {"key": "gen_ai.usage.input_tokens", "value": {"intValue": "5"}},
+                                    {"key": "gen_ai.operation.name", "value": {"stringValue": "chat"}},
+                                ],
+                                "status": {"code": 2, "message": "rate limited"},
+                            }
+                        ]
+                    }
+                ],
+            }
+        ]
+    }
+    (span,) = decode_json(json.dumps(body).encode())
+    assert span.trace_id == "5b8efff798038103d269b633813fc60c"
+    assert span.parent_span_id == "eee19b7ec3c1b173"
+    assert span.error and span.status_message == "rate limited"
+
+    row = step_row(map_span(span, DEFAULT_ATTRIBUTE_MAP), 1, set())
+    assert row["latency_ms"] == 1500.0
+    assert row["tokens"] == 5
+
+
+def test_gzip_body_is_inflated_within_the_size_limit(client, monkeypatch):
+    import gzip
+
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "otlp_max_body_bytes", 4096)
+    headers = {"content-type": "application/x-protobuf", "content-encoding": "gzip"}
+
+    bomb = gzip.compress(b"\0" * 64 * 1024)
+    assert len(bomb) < 4096
+    assert client.post("/v1/traces", content=bomb, headers=headers).status_code == 413
+    assert client.post("/v1/traces", content=b"x" * 4097, headers=headers).status_code == 413
+    assert client.post("/v1/traces", content=b"not gzip", headers=headers).status_code == 400
+    body = gzip.compress(encode_spans(_export()).SerializeToString())
+    assert client.post("/v1/traces", content=body[:-20], headers=headers).status_code == 400
+    assert client.post("/v1/traces", content=body, headers=headers).status_code == 200
@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.profiling import Sampler, SlowOpWatchdog, to_collapsed, to_speedscope
+
+
+def _busy(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def test_sampler_sees_busy_thread_in_wall_and_cpu_modes():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy, args=(stop,), name="busy")
+    worker.start()
+    try:
+        profiles = {}
+        for mode in ("wall", "cpu"):
+            sampler = Sampler(mode, 0.002).start()
+            time.sleep(0.2)
+            profiles[mode] = sampler.stop()
+    finally:
+        stop.set()
+        worker.join()
+
+    for sampler in profiles.values():
+        assert any(stack[0] == "busy" and stack[-1][0].endswith("<genexpr>") for stack in sampler.samples)
+        doc = to_speedscope(sampler, "test")
+        frames = doc["shared"]["frames"]
+        assert any(f["name"] == "_busy" for f in frames)
+        assert len(doc["profiles"][0]["samples"]) == len(doc["profiles"][0]["weights"])
+    assert "thread busy;" in to_collapsed(profiles["cpu"])
+
+
+def test_watchdog_logs_stacks_of_slow_operations(caplog):
+    watchdog = SlowOpWatchdog(threshold_ms=50, interval_ms=5)
+    with caplog.at_level(logging.WARNING, logger="app.profiling"):
+        op = watchdog.begin("request", "GET /slow")
+        stop = threading.Event()
+        threading.Timer(0.2, stop.set).start()
+        _busy(stop)
+        watchdog.end(op)
+        fast = watchdog.begin("request", "GET /fast")
+        watchdog.end(fast)
+
+    (record,) = caplog.records
+    assert "slow request GET /slow" in record.getMessage()
+    assert "_busy" in record.getMessage()
+
+
+def test_per_request_profile_requires_admin_token(monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+    client = TestClient(app)
+
+    assert client.get("/health", headers={"X-Profile": "wall"}).json()["ok"] is True
+    assert client.post("/admin/profile", params={"seconds": 0.01}).status_code == 403
+
+    r = client.get("/health", headers={"X-Profile": "wall", "X-Admin-Token": "s3cret"})
+    assert r.headers["x-profiled-status"] == "200"
+    assert r.json()["profiles"][0]["type"] == "sampled"
+
+
+def test_per_request_profile_is_refused_while_another_profile_runs(monkeypatch):
+    from app.profiling import _profile_lock
+
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+    client = TestClient(app)
+    with _profile_lock:
+        r = client.get("/health", headers={"X-Profile": "wall", "X-Admin-Token": "s3cret"})
+    assert r.status_code == 409
+    assert client.get("/health", headers={"X-Profile": "wall", "X-Admin-Token": "s3cret"}).status_code == 200
@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import hf_ort, hf_tgi, model_apis, ollama, provider_sim
+
+
+@pytest.fixture(autouse=True)
+def instant_sim(monkeypatch):
+    fast = provider_sim.SimSettings(ttft_ms=0, tokens_per_s=0, output_tokens=20, seed=1)
+    monkeypatch.setattr(provider_sim, "settings", fast)
+
+
+def test_adapters_parse_simulated_responses(monkeypatch):
+    for module in (ollama, hf_ort, hf_tgi, model_apis):
+        monkeypatch.setattr(
+            module, "provider_transport", lambda _: httpx.ASGITransport(app=provider_sim.app)
+        )
+    base = "http://sim"
+    kwargs = {"api_key": "sim", "model": "m", "prompt": "hi there", "temperature": None}
+
+    async def go():
+        return [
+            (await ollama.ollama_chat(base_url=base, model="m", prompt="hi")).content,
+            (await hf_ort.hf_ort_generate(base_url=base, model_id="m", prompt="hi")).text,
+            (await hf_tgi.tgi_generate(base_url=base, prompt="hi")).text,
+            (await model_apis.openai_chat(**kwargs, max_tokens=5)).text,
+            (await model_apis.anthropic_messages(**kwargs, max_tokens=None)).text,
+            (await model_apis.gemini_generate(**kwargs, max_tokens=None)).text,
+        ]
+
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{base}/v1")
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", f"{base}/v1")
+    monkeypatch.setenv("GEMINI_BASE_URL", f"{base}/v1beta")
+    texts = asyncio.run(go())
+
+    assert all(texts)
+    assert len(texts[3].split()) == 5
+
+
+def test_streaming_and_injected_errors():
+    client = TestClient(provider_sim.app)
+    body = {"model": "m", "messages": [{"role": "user", "content": "hi"}], "stream": True}
+    with client.stream("POST", "/v1/chat/completions", json=body) as r:
+        data = [line[6:] for line in r.iter_lines() if line.startswith("data: ")]
+    assert data[-1] == "[DONE]"
+    text = "".join(json.loads(d)["choices"][0]["delta"].get("content", "") for d in data[:-1])
+    assert len(text.split()) >= 1
+
+    r = client.put("/sim/config", json={"rate_limit_rate": 1.0})
+    assert r.json()["rate_limit_rate"] == 1.0
+    r = client.post("/v1/messages", json={"model": "m", "messages": [], "max_tokens": 5})
+    assert r.status_code == 429
+    assert r.headers["retry-after"] == "1"
+    assert r.json()["error"]["type"] == "rate_limit_error"
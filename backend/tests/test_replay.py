@@ -0,0 +1,117 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import replay as replay_mod
+from app.models import RunStatus
+
+
+class _FakeSession:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+        self.executed = []
+
+    def add(self, obj):
+        pass
+
+    def flush(self):
+        pass
+
+    def execute(self, stmt, params=None):
+        self.executed.append((stmt, params))
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def _runs(agent_name="demo-agent"):
+    run = SimpleNamespace(id=1, agent_name=agent_name, steps=[])
+    replay = SimpleNamespace(id=2, agent_name=f"{agent_name} (replay)", status=RunStatus.running, error_message=None)
+    return run, replay
+
+
+def test_cancelled_replay_is_marked_failed(monkeypatch):
+    events = []
+    monkeypatch.setattr(replay_mod, "replay_cancel_requested", lambda run_id: True)
+    monkeypatch.setattr(replay_mod, "publish_run_event", lambda event, run, **kw: events.append((event, run.status)))
+    run, replay = _runs()
+
+    replay_mod.run_replay(_FakeSession(), run, replay)
+
+    assert replay.status == RunStatus.failed
+    assert replay.error_message == "replay cancelled"
+    assert events == [("status", RunStatus.failed)]
+
+
+def test_executor_error_fails_replay_and_propagates(monkeypatch):
+    def broken(db, replay):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(replay_mod, "replay_cancel_requested", lambda run_id: False)
+    monkeypatch.setattr(replay_mod, "publish_run_event", lambda *a, **kw: None)
+    monkeypatch.setitem(replay_mod.AGENT_EXECUTORS, "broken-agent", broken)
+    run, replay = _runs("broken-agent")
+    db = _FakeSession()
+
+    with pytest.raises(RuntimeError):
+        replay_mod.run_replay(db, run, replay)
+    assert replay.status == RunStatus.failed
+    assert replay.error_message == "replay failed: boom"
+    assert db.rollbacks == 1
+
+
+def test_clone_fallback_publishes_one_ready_event(monkeypatch):
+    events = []
+
+    class _CloneSession(_FakeSession):
+        def execute(self, stmt, params=None):
+            super().execute(stmt, params)
+            return SimpleNamespace(rowcount=2000)
+
+    monkeypatch.setattr(replay_mod, "replay_cancel_requested", lambda run_id: False)
+    monkeypatch.setattr(replay_mod, "publish_run_event", lambda event, run, **kw: events.append((event, kw)))
+    run, replay = _runs("unregistered-agent")
+    run.final_output = "done"
+    db = _CloneSession()
+
+    replay_mod.run_replay(db, run, replay)
+
+    assert events == [("replay_ready", {"source_run_id": 1, "cloned_steps": 2000}), ("status", {})]
+    assert replay.status == RunStatus.replayed and replay.final_output == "done"
+    # The INSERT ... SELECT and the replay's totals, recomputed from the copied steps.
+    assert len(db.executed) == 2 and db.commits == 1
+
+
+def test_api_replay_uses_recorded_options_and_model_override(monkeypatch):
+    calls = []
+
+    async def fake_openai(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(text="new answer", raw={}, usage={"total_tokens": 42})
+
+    steps = []
+    monkeypatch.setattr(replay_mod, "replay_cancel_requested", lambda run_id: False)
+    monkeypatch.setattr(replay_mod, "publish_run_step", lambda run, step: steps.append(step))
+    monkeypatch.setitem(replay_mod._API_CALLS, "openai", fake_openai)
+
+    recorded = SimpleNamespace(
+        step_type=replay_mod.StepType.llm_call,
+        name="api_model_call",
+        input={"provider": "openai", "model": "gpt-old", "temperature": 0.2, "max_tokens": 64},
+    )
+    run = SimpleNamespace(id=1, agent_name="api:openai", steps=[recorded])
+    replay = SimpleNamespace(id=2, input_prompt="hi", status=RunStatus.running)
+    ctx = replay_mod.ReplayContext(run=run, replay=replay, model="gpt-new")
+
+    db = _FakeSession()
+    replay_mod.api_executor(db, ctx)
+
+    assert calls == [{"api_key": None, "model": "gpt-new", "prompt": "hi", "temperature": 0.2, "max_tokens": 64}]
+    assert [s.name for s in steps] == ["user_input", "api_model_call"]
+    assert replay.final_output == "new answer" and steps[1].tokens == 42
+    assert [params[0]["tokens"] for _, params in db.executed] == [0, 42]
+    assert replay.status == RunStatus.replayed
@@ -0,0 +1,32 @@
+from app.replay_suites import output_similarity, summarize
+
+
+def _diff(status, latency_delta, similarity, jaccard_delta):
+    return {
+        "status": status,
+        "latency_ms": {"original": 100.0, "replay": 100.0 + latency_delta, "delta": latency_delta},
+        "tokens": {"original": 10, "replay": 12, "delta": 2},
+        "scores": {"jaccard": {"original": 0.5, "replay": 0.5 + jaccard_delta, "delta": jaccard_delta}},
+        "output_similarity": similarity,
+    }
+
+
+def test_summary_averages_replayed_items_only():
+    summary = summarize(
+        [
+            _diff("replayed", -20.0, 0.8, 0.1),
+            _diff("replayed", 40.0, 0.6, -0.3),
+            {"status": "failed", "error": "boom"},
+        ]
+    )
+    assert summary["items"] == 3 and summary["replayed"] == 2 and summary["failed"] == 1
+    assert summary["mean_latency_ms_delta"] == 10.0
+    assert summary["mean_tokens_delta"] == 2.0
+    assert summary["mean_output_similarity"] == 0.7
+    assert summary["mean_score_deltas"] == {"jaccard": -0.1}
+
+
+def test_output_similarity():
+    assert output_similarity("The answer is 42.", "the ANSWER is 42") == 1.0
+    assert output_similarity("a b", "c d") == 0.0
+    assert output_similarity(None, "") == 1.0
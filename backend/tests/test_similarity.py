@@ -0,0 +1,21 @@
+from app.similarity import band_buckets, estimate_similarity, signature
+
+
+def test_signature_estimates_jaccard_and_shares_buckets():
+    words = [f"w{i}" for i in range(200)]
+    base = signature(" ".join(words), "done")
+    near = signature(" ".join(words[:190] + [f"x{i}" for i in range(10)]), "done")
+    other = signature("an unrelated prompt about something else", "entirely different output here")
+
+    # 199 shingles each (198 prompt 3-grams + 1 output word), 189 shared: Jaccard 189 / 209.
+    assert abs(estimate_similarity(base, near) - 189 / 209) < 0.1
+    assert estimate_similarity(base, other) < 0.1
+    assert set(band_buckets(base)) & set(band_buckets(near))
+    assert not set(band_buckets(base)) & set(band_buckets(other))
+
+
+def test_signature_is_stable_and_empty_runs_are_skipped():
+    assert (signature("same prompt text", "same output") == signature("same prompt text", "same output")).all()
+    assert signature("", None) is None
+    # Prompt and output shingles are kept apart.
+    assert estimate_similarity(signature("alpha beta gamma", ""), signature("", "alpha beta gamma")) < 0.1
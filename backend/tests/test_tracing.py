@@ -0,0 +1,83 @@
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import Status, StatusCode
+
+from app.config import settings
+from app.tracing import TailSamplingProcessor, build_tracer_provider
+
+
+def _tail_tracer(ratio: float, slow_ms: float):
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    tail = TailSamplingProcessor(SimpleSpanProcessor(exporter), ratio, slow_ms)
+    provider.add_span_processor(tail)
+    return provider.get_tracer("test"), tail, exporter
+
+
+def test_tail_sampling_keeps_error_traces_and_drops_the_rest_at_ratio_zero():
+    tracer, tail, exporter = _tail_tracer(ratio=0.0, slow_ms=60_000)
+
+    with tracer.start_as_current_span("fine"):
+        with tracer.start_as_current_span("fine-child"):
+            pass
+    with tracer.start_as_current_span("broken"):
+        with tracer.start_as_current_span("broken-child") as child:
+            child.set_status(Status(StatusCode.ERROR))
+
+    assert sorted(s.name for s in exporter.get_finished_spans()) == ["broken", "broken-child"]
+    assert (tail.kept, tail.dropped) == (1, 1)
+
+
+def test_tail_sampling_keeps_slow_traces_and_everything_at_ratio_one():
+    tracer, _, exporter = _tail_tracer(ratio=0.0, slow_ms=0)
+    with tracer.start_as_current_span("slow"):
+        pass
+    assert [s.name for s in exporter.get_finished_spans()] == ["slow"]
+
+    tracer, _, exporter = _tail_tracer(ratio=1.0, slow_ms=60_000)
+    with tracer.start_as_current_span("fast"):
+        pass
+    assert [s.name for s in exporter.get_finished_spans()] == ["fast"]
+
+
+def test_tracing_off_builds_no_provider():
+    assert build_tracer_provider("off") is None
+    provider = build_tracer_provider("console", InMemorySpanExporter())
+    assert provider is not None
+    assert provider.sampler.get_description().startswith("ParentBased")
+    provider.shutdown()
+
+
+def test_batch_processor_gets_the_configured_queue_limits(monkeypatch):
+    from app import tracing
+
+    limits = {}
+
+    class RecordingProcessor(SimpleSpanProcessor):
+        def __init__(self, exporter, **kwargs):
+            limits.update(kwargs)
+            super().__init__(exporter)
+
+    monkeypatch.setattr(tracing, "BatchSpanProcessor", RecordingProcessor)
+    monkeypatch.setattr(settings, "tracing_queue_size", 64)
+    monkeypatch.setattr(settings, "tracing_export_batch_size", 16)
+    monkeypatch.setattr(settings, "tracing_schedule_delay_ms", 250)
+
+    build_tracer_provider("console", InMemorySpanExporter()).shutdown()
+    assert limits == {"max_queue_size": 64, "max_export_batch_size": 16, "schedule_delay_millis": 250}
+
+
+def test_steps_default_to_the_active_span():
+    from app.models import AgentStep
+    from app.tracing import current_span_id, current_trace_id
+
+    trace_default = AgentStep.__table__.c.trace_id.default
+    span_default = AgentStep.__table__.c.span_id.default
+    assert current_trace_id() is None and trace_default.arg(None) is None
+
+    tracer = TracerProvider().get_tracer("test")
+    with tracer.start_as_current_span("llm_call") as span:
+        ctx = span.get_span_context()
+        assert trace_default.arg(None) == format(ctx.trace_id, "032x") == current_trace_id()
+        assert span_default.arg(None) == format(ctx.span_id, "016x") == current_span_id()
@@ -0,0 +1,80 @@
+import asyncio
+
+from app.ws import SubscriptionHub
+
+
+class FakePubSub:
+    def __init__(self):
+        self.channels: list[str] = []
+        self.unsubscribed: list[str] = []
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+
+    async def unsubscribe(self, channel):
+        self.unsubscribed.append(channel)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        await asyncio.sleep(timeout)
+        return None
+
+
+def _hub() -> tuple[SubscriptionHub, FakePubSub]:
+    hub = SubscriptionHub("redis://unused")
+    pubsub = FakePubSub()
+
+    async def ensure_pubsub():
+        hub._pubsub = pubsub
+        return pubsub
+
+    hub._ensure_pubsub = ensure_pubsub  # type: ignore[method-assign]
+    return hub, pubsub
+
+
+def test_hub_subscribes_channel_once_and_fans_out():
+    async def scenario():
+        hub, pubsub = _hub()
+        a = await hub.subscribe("orchestrai:run:1")
+        b = await hub.subscribe("orchestrai:run:1")
+        assert pubsub.channels == ["orchestrai:run:1"]
+
+        hub.dispatch("orchestrai:run:1", '{"event": "step", "run_id": 1}')
+        ma, mb = a.queue.get_nowait(), b.queue.get_nowait()
+        assert ma is mb
+        assert ma.payload == {"event": "step", "run_id": 1}
+
+        await hub.unsubscribe(a)
+        assert pubsub.unsubscribed == []
+        await hub.unsubscribe(b)
+        assert pubsub.unsubscribed == ["orchestrai:run:1"]
+        assert hub.stats()["subscribers"] == 0
+        await hub.close()
+
+    asyncio.run(scenario())
+
+
+def test_hub_drops_oldest_frame_for_slow_subscriber():
+    async def scenario():
+        hub, _ = _hub()
+        hub.queue_size = 2
+        q = await hub.subscribe("c")
+        for i in range(3):
+            hub.dispatch("c", f'{{"n": {i}}}')
+        assert [q.queue.get_nowait().payload["n"] for _ in range(2)] == [1, 2]
+        assert q.dropped == hub.frames_dropped == 1
+        await hub.close()
+
+    asyncio.run(scenario())
+
+
+def test_hub_attaches_stream_event_id_from_frame():
+    async def scenario():
+        hub, _ = _hub()
+        q = await hub.subscribe("c")
+        hub.dispatch("c", '1700000000000-3|{"event": "step"}')
+        msg = q.queue.get_nowait()
+        assert msg.payload == {"event": "step", "event_id": "1700000000000-3"}
+        assert '"event_id": "1700000000000-3"' in msg.text
+        await hub.close()
+
+    asyncio.run(scenario())
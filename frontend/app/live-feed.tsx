@@ -0,0 +1,96 @@
+'use client';
+
+import { useEffect, useState } from 'react';
+
+const MAX_EVENTS = 25;
+
+function describe(msg: any): string {
+  if (msg.event === 'step') return `${msg.step?.step_type || 'step'} ${msg.step?.name || ''}`.trim();
+  if (msg.event === 'eval') return `eval ${msg.run?.eval_status || ''}`.trim();
+  if (msg.event === 'lagged') return `${msg.coalesced_runs} runs coalesced (slow connection)`;
+  return `${msg.event} ${msg.run?.status || ''}`.trim();
+}
+
+export default function LiveFeed() {
+  const [events, setEvents] = useState<any[]>([]);
+  const [live, setLive] = useState(false);
+  const [errorsOnly, setErrorsOnly] = useState(false);
+
+  useEffect(() => {
+    let ws: WebSocket | null = null;
+    let stopped = false;
+    let timer: any = null;
+
+    function wsUrl() {
+      // Filters are applied server-side at subscribe time.
+      const query = errorsOnly ? '?errors_only=true' : '';
+      const apiBase = process.env.NEXT_PUBLIC_API_BASE_URL;
+      if (apiBase) {
+        return apiBase.replace(/^http/, 'ws') + '/ws/firehose' + query;
+      }
+      const proto = window.location.protocol === 'https:' ? 'wss' : 'ws';
+      return `${proto}://${window.location.hostname}:8000/ws/firehose` + query;
+    }
+
+    function connect(attempt: number) {
+      if (stopped) return;
+      ws = new WebSocket(wsUrl());
+      ws.onopen = () => setLive(true);
+      ws.onclose = () => {
+        setLive(false);
+        if (stopped) return;
+        const backoff = Math.min(8000, 250 * 2 ** Math.min(attempt + 1, 5));
+        timer = setTimeout(() => connect(attempt + 1), backoff);
+      };
+      ws.onmessage = (ev) => {
+        try {
+          const msg = JSON.parse(ev.data);
+          if (msg?.event === 'ping') return;
+          setEvents((prev) => [{ ...msg, _at: Date.now() }, ...prev].slice(0, MAX_EVENTS));
+        } catch {
+          // ignore
+        }
+      };
+    }
+
+    connect(0);
+
+    return () => {
+      stopped = true;
+      setLive(false);
+      if (timer) clearTimeout(timer);
+      if (ws) ws.close();
+    };
+  }, [errorsOnly]);
+
+  return (
+    <div className="card">
+      <div className="row" style={{ marginBottom: 10 }}>
+        <div>
+          <div className="sectionTitle">Live activity</div>
+          <div className="small">Live: {live ? 'connected' : 'disconnected'}</div>
+        </div>
+        <label className="small" style={{ display: 'flex', gap: 6, alignItems: 'center' }}>
+          <input type="checkbox" checked={errorsOnly} onChange={(e) => setErrorsOnly(e.target.checked)} />
+          Errors only
+        </label>
+      </div>
+      {events.length === 0 ? (
+        <div className="small">Waiting for events…</div>
+      ) : (
+        <table className="table">
+          <tbody>
+            {events.map((e, i) => (
+              <tr key={`${e.event_id || e._at}-${i}`}>
+                <td>{new Date(e._at).toISOString().slice(11, 19)}</td>
+                <td>{e.run_id ? <a href={`/runs/${e.run_id}`}>#{e.run_id}</a> : '—'}</td>
+                <td>{e.agent_name || '—'}</td>
+                <td>{describe(e)}</td>
+              </tr>
+            ))}
+          </tbody>
+        </table>
+      )}
+    </div>
+  );
+}
@@ -13,6 +13,7 @@ import NewOllamaRun from './new-ollama-run';
 import RunHFButton from './run-hf-button';
 import NewHFRun from './new-hf-run';
 import CollapsibleCard from './collapsible-card';
+import LiveFeed from './live-feed';
 
 export default async function Page() {
   const runs = await getRuns();
@@ -221,6 +222,10 @@ export default async function Page() {
 
       <div style={{ height: 14 }} />
 
+      <LiveFeed />
+
+      <div style={{ height: 14 }} />
+
       <div className="cards2">
         <CollapsibleCard
           title="New Ollama run"
@@ -25,7 +25,7 @@ export default async function RunPage({ params }: { params: { id: string } }) {
             <div className="small">{run.agent_name}</div>
           </div>
           <div style={{ display: 'flex', gap: 10 }}>
-            <RunActions runId={params.id} apiBase={getPublicApiBase()} />
+            <RunActions runId={params.id} apiBase={getPublicApiBase()} status={run.status} />
           </div>
         </div>
 
@@ -6,6 +6,7 @@ import { useState } from 'react';
 type Props = {
   runId: string;
   apiBase: string;
+  status?: string;
 };
 
 async function postJson(url: string) {
@@ -17,9 +18,9 @@ async function postJson(url: string) {
   return res.json().catch(() => ({}));
 }
 
-export default function RunActions({ runId, apiBase }: Props) {
+export default function RunActions({ runId, apiBase, status }: Props) {
   const router = useRouter();
-  const [busy, setBusy] = useState<null | 'evaluate' | 'replay'>(null);
+  const [busy, setBusy] = useState<null | 'evaluate' | 'replay' | 'cancel'>(null);
   const disabled = busy !== null;
 
   async function refreshSoon() {
@@ -98,16 +99,37 @@ export default function RunActions({ runId, apiBase }: Props) {
           try {
             setBusy('replay');
             console.log('[orchestrai] replay start', { runId, apiBase });
-            await postJson(`${apiBase}/runs/${runId}/replay`);
-            alert('Replay started.');
-            await refreshSoon();
+            const res = await postJson(`${apiBase}/runs/${runId}/replay`);
+            // The replay runs in the background; its page streams steps as they are written.
+            if (res?.replay_run_id) router.push(`/runs/${res.replay_run_id}`);
           } finally {
             setBusy(null);
           }
         }}
       >
-        {busy === 'replay' ? 'Replaying…' : 'Replay'}
+        {busy === 'replay' ? 'Starting replay…' : 'Replay'}
       </button>
+
+      {status === 'running' ? (
+        <button
+          className="button"
+          type="button"
+          disabled={disabled}
+          onClick={async () => {
+            try {
+              setBusy('cancel');
+              await postJson(`${apiBase}/runs/${runId}/cancel`);
+              await refreshSoon();
+            } catch (e) {
+              alert(e instanceof Error ? e.message : String(e));
+            } finally {
+              setBusy(null);
+            }
+          }}
+        >
+          {busy === 'cancel' ? 'Cancelling…' : 'Cancel'}
+        </button>
+      ) : null}
     </>
   );
 }
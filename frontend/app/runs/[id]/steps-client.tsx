@@ -31,15 +31,34 @@ export default function LiveSteps({
     let ws: WebSocket | null = null;
     let stopped = false;
     let timer: any = null;
+    // Resume point in the run's event stream; "0" backfills everything the server retained,
+    // covering steps logged between the page render and the first connect.
+    let lastEventId = '0';
+
+    async function reloadSteps() {
+      const apiBase =
+        process.env.NEXT_PUBLIC_API_BASE_URL ||
+        `${window.location.protocol}//${window.location.hostname}:8000`;
+      try {
+        const res = await fetch(`${apiBase}/runs/${runId}`, { cache: 'no-store' });
+        if (res.ok) {
+          const run = await res.json();
+          if (!stopped && Array.isArray(run?.steps)) setSteps(run.steps);
+        }
+      } catch {
+        // ignore; the next event or a page refresh catches up
+      }
+    }
 
     function wsUrl() {
+      const query = `?last_event_id=${encodeURIComponent(lastEventId)}`;
       const apiBase = process.env.NEXT_PUBLIC_API_BASE_URL;
       if (apiBase) {
         // http://host:8000 -> ws://host:8000
-        return apiBase.replace(/^http/, 'ws') + `/ws/runs/${runId}`;
+        return apiBase.replace(/^http/, 'ws') + `/ws/runs/${runId}` + query;
       }
       const proto = window.location.protocol === 'https:' ? 'wss' : 'ws';
-      return `${proto}://${window.location.hostname}:8000/ws/runs/${runId}`;
+      return `${proto}://${window.location.hostname}:8000/ws/runs/${runId}` + query;
     }
 
     function connect(attempt: number) {
@@ -61,11 +80,15 @@ export default function LiveSteps({
         ws.onmessage = (ev) => {
           try {
             const msg = JSON.parse(ev.data);
+            if (typeof msg?.event_id === 'string') lastEventId = msg.event_id;
             if (msg?.event === 'step' && msg?.step) {
               setSteps((prev) => {
                 if (prev.some((s) => s.id === msg.step.id)) return prev;
                 return [...prev, msg.step].sort((a, b) => (a.id || 0) - (b.id || 0));
               });
+            } else if (msg?.event === 'replay_ready' || msg?.event === 'steps_ingested') {
+              // Cloned replays and OTLP exports publish one event for a batch of steps.
+              reloadSteps();
             }
           } catch {
             // ignore
@@ -137,6 +160,9 @@ export default function LiveSteps({
               </div>
               <div className="stepMeta">
                 {s.latency_ms ? `${Math.round(s.latency_ms)}ms` : ''}
+                {s.trace_id && (
+                  <TraceLink traceId={s.trace_id} spanId={s.span_id} />
+                )}
               </div>
             </div>
 
@@ -176,3 +202,22 @@ export default function LiveSteps({
     </div>
   );
 }
+
+// NEXT_PUBLIC_TRACE_URL is a trace viewer URL template, e.g. http://localhost:16686/trace/{trace_id}
+function TraceLink({ traceId, spanId }: { traceId: string; spanId?: string | null }) {
+  const template = process.env.NEXT_PUBLIC_TRACE_URL;
+  const label = `trace ${traceId.slice(0, 8)}`;
+  if (!template) {
+    return (
+      <span style={{ marginLeft: 8 }} title={`trace ${traceId}${spanId ? ` span ${spanId}` : ''}`}>
+        {label}
+      </span>
+    );
+  }
+  const href = template.replace('{trace_id}', traceId).replace('{span_id}', spanId || '');
+  return (
+    <a style={{ marginLeft: 8 }} href={href} target="_blank" rel="noreferrer">
+      {label}
+    </a>
+  );
+}
@@ -0,0 +1,130 @@
+"""Per-step overhead an agent loop pays for logging: direct REST calls vs the buffered SDK.
+
+Each variant logs --steps steps from a tight loop and times every logging call. Without
+--base-url the backend is an in-process fake that answers after --rtt-ms (a stand-in for the
+network round trip + ingest), so the direct numbers are about rtt and the SDK numbers are the
+enqueue cost alone; with --base-url it runs against a real backend.
+
+    python bench/step_overhead.py --steps 20000 --rtt-ms 2
+    python bench/step_overhead.py --base-url http://localhost:8000 --steps 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+from orchestrai_client import AsyncClient, Client
+
+
+def _summary(samples_ns: list[int], wall_s: float, flush_s: float | None = None) -> dict:
+    us = sorted(s / 1000 for s in samples_ns)
+    out = {
+        "p50_us": round(us[len(us) // 2], 2),
+        "p99_us": round(us[int(len(us) * 0.99)], 2),
+        "mean_us": round(statistics.fmean(us), 2),
+        "loop_s": round(wall_s, 3),
+    }
+    if flush_s is not None:
+        out["flush_s"] = round(flush_s, 3)
+    return out
+
+
+def _fake_backend(rtt_ms: float):
+    def handle(request: httpx.Request) -> httpx.Response:
+        time.sleep(rtt_ms / 1000)
+        if request.url.path == "/runs":
+            return httpx.Response(200, json={"id": 1})
+        return httpx.Response(200, json={"ok": True})
+
+    async def ahandle(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(rtt_ms / 1000)
+        return httpx.Response(200, json={"id": 1} if request.url.path == "/runs" else {"ok": True})
+
+    return httpx.MockTransport(handle), httpx.MockTransport(ahandle)
+
+
+STEP = {"step_type": "tool_call", "name": "search", "input": {"q": "x" * 200}, "latency_ms": 1.0}
+
+
+def bench_direct(base_url: str, transport, run_id: int, steps: int) -> dict:
+    samples = []
+    with httpx.Client(base_url=base_url, transport=transport) as http:
+        start = time.perf_counter()
+        for _ in range(steps):
+            t = time.perf_counter_ns()
+            http.post(f"/runs/{run_id}/steps", json=STEP).raise_for_status()
+            samples.append(time.perf_counter_ns() - t)
+        return _summary(samples, time.perf_counter() - start)
+
+
+def bench_sdk(base_url: str, transport, steps: int, use_context: bool) -> dict:
+    samples = []
+    client = Client(base_url, transport=transport, max_buffer=steps + 10, flush_on_exit=False)
+    run_id = client.start_run("bench-sdk", "overhead")
+    start = time.perf_counter()
+    for _ in range(steps):
+        t = time.perf_counter_ns()
+        if use_context:
+            with client.step("search", input=STEP["input"], run_id=run_id) as s:
+                s.output = {"hits": 3}
+        else:
+            client.log_step(
+                "tool_call", "search", run_id=run_id, input=STEP["input"], latency_ms=1.0
+            )
+        samples.append(time.perf_counter_ns() - t)
+    wall = time.perf_counter() - start
+    start = time.perf_counter()
+    client.close(timeout_s=600)
+    result = _summary(samples, wall, time.perf_counter() - start)
+    return {**result, "requests": client.stats.requests, "sent": client.stats.sent}
+
+
+async def bench_async_sdk(base_url: str, transport, steps: int) -> dict:
+    samples = []
+    client = AsyncClient(base_url, transport=transport, max_buffer=steps + 10)
+    run_id = await client.start_run("bench-sdk-async", "overhead")
+    start = time.perf_counter()
+    for i in range(steps):
+        t = time.perf_counter_ns()
+        client.log_step("tool_call", "search", run_id=run_id, input=STEP["input"], latency_ms=1.0)
+        samples.append(time.perf_counter_ns() - t)
+        if i % 100 == 0:
+            await asyncio.sleep(0)  # an agent awaits something now and then
+    wall = time.perf_counter() - start
+    start = time.perf_counter()
+    await client.aclose(timeout_s=600)
+    result = _summary(samples, wall, time.perf_counter() - start)
+    return {**result, "requests": client.stats.requests, "sent": client.stats.sent}
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--base-url", default=None)
+    p.add_argument("--steps", type=int, default=10_000)
+    p.add_argument("--direct-steps", type=int, default=1000)
+    p.add_argument("--rtt-ms", type=float, default=2.0)
+    args = p.parse_args()
+
+    base_url = args.base_url or "http://fake"
+    sync_t, async_t = (None, None) if args.base_url else _fake_backend(args.rtt_ms)
+
+    with Client(base_url, transport=sync_t, flush_on_exit=False) as c:
+        run_id = c.start_run("bench-direct", "overhead")
+    results = {
+        "direct_post": bench_direct(base_url, sync_t, run_id, args.direct_steps),
+        "sdk_log_step": bench_sdk(base_url, sync_t, args.steps, use_context=False),
+        "sdk_step_context": bench_sdk(base_url, sync_t, args.steps, use_context=True),
+        "async_sdk_log_step": asyncio.run(bench_async_sdk(base_url, async_t, args.steps)),
+    }
+    backend = args.base_url or f"fake rtt={args.rtt_ms}ms"
+    print(json.dumps({"backend": backend, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""Python client for the OrchestrAI backend: buffered, non-blocking run and step logging."""
+
+from orchestrai_client._core import Run, Stats, Step, current_run
+from orchestrai_client.aio import AsyncClient
+from orchestrai_client.client import Client
+
+__all__ = ["AsyncClient", "Client", "Run", "Stats", "Step", "current_run"]
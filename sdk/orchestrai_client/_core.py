@@ -0,0 +1,327 @@
+"""Pieces shared by the sync and async clients: step payloads, batching, retries, helpers."""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, TypeVar
+
+import httpx
+
+logger = logging.getLogger("orchestrai_client")
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Retried with backoff; any other 4xx is a bad request and the batch is dropped.
+RETRY_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+current_run: contextvars.ContextVar[int | None] = contextvars.ContextVar(
+    "orchestrai_current_run", default=None
+)
+
+
+@dataclass
+class Op:
+    """One buffered write: a step to append, or a run update sent after the run's earlier steps."""
+
+    kind: str  # "step" | "update"
+    run_id: int
+    body: dict[str, Any]
+
+
+@dataclass
+class Stats:
+    enqueued: int = 0
+    sent: int = 0
+    dropped: int = 0  # buffer full
+    failed: int = 0  # gave up after retries, or rejected by the server
+    requests: int = 0
+    retries: int = 0
+
+
+@dataclass
+class Step:
+    """Mutable step handed out by `client.step(...)`; set output/tokens/cost before it closes."""
+
+    name: str
+    step_type: str = "tool_call"
+    input: dict[str, Any] | None = None
+    output: dict[str, Any] | None = None
+    tokens: int | None = None
+    cost_usd: float | None = None
+    error_message: str | None = None
+    latency_ms: float | None = None
+    run_id: int | None = None
+    _started: float = field(default=0.0, repr=False)
+
+
+@dataclass
+class Run:
+    """Yielded by `client.run(...)`; set `output` to record the run's final output."""
+
+    id: int
+    output: str | None = None
+
+
+def jsonable(value: Any) -> Any:
+    try:
+        json.dumps(value)
+        return value
+    except (TypeError, ValueError):
+        return repr(value)
+
+
+def as_dict(value: Any, key: str) -> dict[str, Any] | None:
+    if value is None or isinstance(value, dict):
+        return value
+    return {key: jsonable(value)}
+
+
+def batches(ops: Iterable[Op], max_steps: int) -> list[tuple[str, int, list[dict[str, Any]]]]:
+    """Consecutive steps of one run become one request; order across requests is kept."""
+    out: list[tuple[str, int, list[dict[str, Any]]]] = []
+    for op in ops:
+        last = out[-1] if out else None
+        if (
+            op.kind == "step"
+            and last is not None
+            and last[0] == "step"
+            and last[1] == op.run_id
+            and len(last[2]) < max_steps
+        ):
+            last[2].append(op.body)
+        else:
+            out.append((op.kind, op.run_id, [op.body]))
+    return out
+
+
+def request_for(kind: str, run_id: int, bodies: list[dict[str, Any]]) -> tuple[str, str, Any]:
+    if kind == "update":
+        return "PATCH", f"/runs/{run_id}", bodies[0]
+    return "POST", f"/runs/{run_id}/steps/batch", {"steps": bodies}
+
+
+def retry_delay(
+    attempt: int, response: httpx.Response | None, backoff_s: float, max_backoff_s: float
+) -> float | None:
+    """Seconds to wait before retrying, or None when the request should not be retried."""
+    if response is not None and response.status_code not in RETRY_STATUS:
+        return None
+    if response is not None and "retry-after" in response.headers:
+        try:
+            return min(float(response.headers["retry-after"]), max_backoff_s)
+        except ValueError:
+            pass
+    # Full jitter: spreads retries of many agents hitting the same outage.
+    return random.uniform(0, min(max_backoff_s, backoff_s * 2**attempt))
+
+
+class BaseClient:
+    """Buffering and helper API common to `Client` and `AsyncClient`."""
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        batch_size: int,
+        flush_interval_s: float,
+        max_buffer: int,
+        max_retries: int,
+        backoff_s: float,
+        max_backoff_s: float,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.max_buffer = max_buffer
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.stats = Stats()
+        self._seq: dict[int, itertools.count] = {}
+
+    def _enqueue(self, op: Op) -> bool:
+        raise NotImplementedError
+
+    def _dropped(self) -> None:
+        self.stats.dropped += 1
+        if self.stats.dropped in (1, 10, 100) or self.stats.dropped % 1000 == 0:
+            logger.warning(
+                "buffer full (%d); %d writes dropped", self.max_buffer, self.stats.dropped
+            )
+
+    def _record(self, ok: bool, n: int) -> None:
+        if ok:
+            self.stats.sent += n
+        else:
+            self.stats.failed += n
+
+    def _finish_body(self, run: Run, exc: BaseException | None) -> dict[str, Any]:
+        if exc is None:
+            return {"status": "success", "final_output": run.output}
+        error = f"{type(exc).__name__}: {exc}"
+        return {"status": "failed", "final_output": run.output, "error_message": error}
+
+    def _run_body(self, agent_name: str, input_prompt: str) -> dict[str, Any]:
+        # One key for all attempts, so a retried POST /runs returns the same run.
+        key = uuid.uuid4().hex
+        return {"agent_name": agent_name, "input_prompt": input_prompt, "idempotency_key": key}
+
+    def _run_id(self, run_id: int | None) -> int:
+        run_id = run_id if run_id is not None else current_run.get()
+        if run_id is None:
+            raise ValueError("no run_id given and no current run (use client.run(...))")
+        return run_id
+
+    def log_step(
+        self,
+        step_type: str,
+        name: str | None = None,
+        *,
+        run_id: int | None = None,
+        input: dict[str, Any] | None = None,
+        output: dict[str, Any] | None = None,
+        latency_ms: float | None = None,
+        cost_usd: float | None = None,
+        tokens: int | None = None,
+        error_message: str | None = None,
+    ) -> str:
+        """Buffer a step for the background flusher and return its idempotency key.
+
+        Never blocks on the network: when the buffer is full the step is dropped and counted
+        in `stats.dropped`.
+        """
+        run_id = self._run_id(run_id)
+        counter = self._seq.get(run_id)
+        if counter is None:
+            counter = self._seq[run_id] = itertools.count()
+        key = uuid.uuid4().hex
+        body = {
+            "step_type": step_type,
+            "name": name,
+            "input": input,
+            "output": output,
+            "latency_ms": latency_ms,
+            "cost_usd": cost_usd,
+            "tokens": tokens,
+            "error_message": error_message,
+            "idempotency_key": key,
+            "seq": next(counter),
+        }
+        self._enqueue(Op("step", run_id, body))
+        return key
+
+    def update_run(self, run_id: int | None = None, **fields: Any) -> None:
+        """Buffer a run update (status, output, totals), sent after the run's earlier steps."""
+        self._enqueue(Op("update", self._run_id(run_id), fields))
+
+    def finish_run(
+        self,
+        run_id: int | None = None,
+        *,
+        status: str = "success",
+        final_output: str | None = None,
+        error_message: str | None = None,
+        **fields: Any,
+    ) -> None:
+        self._seq.pop(self._run_id(run_id), None)
+        body = {"status": status, "final_output": final_output, "error_message": error_message}
+        self.update_run(run_id, **{k: v for k, v in body.items() if v is not None}, **fields)
+
+    def step(
+        self,
+        name: str,
+        step_type: str = "tool_call",
+        *,
+        input: dict[str, Any] | None = None,
+        run_id: int | None = None,
+    ) -> _StepContext:
+        """Time a block as one step: `with client.step("search", input=q) as s: s.output = ...`.
+
+        Works with `with` and `async with`. An exception is recorded on the step and re-raised.
+        """
+        return _StepContext(self, Step(name, step_type, input=input, run_id=run_id))
+
+    def trace(
+        self, name: str | None = None, step_type: str = "tool_call", capture: bool = True
+    ) -> Callable[[F], F]:
+        """Decorator logging each call of a (sync or async) function as a step of the current run.
+
+        With `capture`, arguments become the step input and the return value its output.
+        """
+
+        def decorate(fn: F) -> F:
+            step_name = name or fn.__qualname__
+            signature = inspect.signature(fn)
+
+            def start(args: tuple, kwargs: dict) -> _StepContext:
+                step_input = None
+                if capture:
+                    bound = signature.bind_partial(*args, **kwargs)
+                    step_input = {k: jsonable(v) for k, v in bound.arguments.items()}
+                return self.step(step_name, step_type, input=step_input)
+
+            if inspect.iscoroutinefunction(fn):
+
+                @functools.wraps(fn)
+                async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                    with start(args, kwargs) as step:
+                        result = await fn(*args, **kwargs)
+                        if capture:
+                            step.output = as_dict(result, "result")
+                        return result
+
+                return async_wrapper  # type: ignore[return-value]
+
+            @functools.wraps(fn)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with start(args, kwargs) as step:
+                    result = fn(*args, **kwargs)
+                    if capture:
+                        step.output = as_dict(result, "result")
+                    return result
+
+            return wrapper  # type: ignore[return-value]
+
+        return decorate
+
+
+class _StepContext:
+    def __init__(self, client: BaseClient, step: Step) -> None:
+        self.client = client
+        self.step = step
+
+    def __enter__(self) -> Step:
+        self.step._started = time.perf_counter()
+        return self.step
+
+    def __exit__(self, exc_type: Any, exc: BaseException | None, tb: Any) -> None:
+        s = self.step
+        s.latency_ms = (time.perf_counter() - s._started) * 1000
+        if exc is not None and s.error_message is None:
+            s.error_message = f"{type(exc).__name__}: {exc}"
+        self.client.log_step(
+            s.step_type,
+            s.name,
+            run_id=s.run_id,
+            input=s.input,
+            output=s.output,
+            latency_ms=s.latency_ms,
+            cost_usd=s.cost_usd,
+            tokens=s.tokens,
+            error_message=s.error_message,
+        )
+
+    async def __aenter__(self) -> Step:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type: Any, exc: BaseException | None, tb: Any) -> None:
+        self.__exit__(exc_type, exc, tb)
@@ -0,0 +1,179 @@
+"""Asyncio client: steps are buffered and sent by a background task on the caller's loop."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from typing import Any, AsyncIterator
+
+import httpx
+
+from orchestrai_client._core import (
+    BaseClient,
+    Op,
+    Run,
+    batches,
+    current_run,
+    logger,
+    request_for,
+    retry_delay,
+)
+
+
+class AsyncClient(BaseClient):
+    """Async counterpart of `Client`, for agents running on asyncio.
+
+        async with AsyncClient("http://localhost:8000") as client:
+            async with client.run("my-agent", prompt) as run:
+                async with client.step("llm", "llm_call", input={"prompt": prompt}) as step:
+                    step.output = {"text": await llm(prompt)}
+                run.output = ...
+
+    `log_step` is a plain (non-async) call that appends to a bounded buffer; a task started on
+    first use sends batches. Use `async with` or `await client.aclose()` so the buffer is
+    flushed before the event loop stops; there is no flush at interpreter exit.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        *,
+        batch_size: int = 100,
+        flush_interval_s: float = 0.2,
+        max_buffer: int = 10_000,
+        max_retries: int = 5,
+        backoff_s: float = 0.2,
+        max_backoff_s: float = 10.0,
+        timeout_s: float = 10.0,
+        headers: dict[str, str] | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        super().__init__(
+            base_url,
+            batch_size=batch_size,
+            flush_interval_s=flush_interval_s,
+            max_buffer=max_buffer,
+            max_retries=max_retries,
+            backoff_s=backoff_s,
+            max_backoff_s=max_backoff_s,
+        )
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url, timeout=timeout_s, headers=headers, transport=transport
+        )
+        self._queue: asyncio.Queue[Op] = asyncio.Queue(maxsize=max_buffer)
+        self._flush_now = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._closed = False
+
+    def _enqueue(self, op: Op) -> bool:
+        if self._closed:
+            raise RuntimeError("client is closed")
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._worker())
+        try:
+            self._queue.put_nowait(op)
+        except asyncio.QueueFull:
+            self._dropped()
+            return False
+        self.stats.enqueued += 1
+        return True
+
+    async def _request(self, method: str, url: str, body: Any) -> httpx.Response | None:
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                self.stats.requests += 1
+                response = await self._http.request(method, url, json=body)
+                if response.status_code < 400:
+                    return response
+            except httpx.TransportError as e:
+                logger.debug("%s %s failed: %s", method, url, e)
+            delay = retry_delay(attempt, response, self.backoff_s, self.max_backoff_s)
+            if delay is None or attempt == self.max_retries:
+                status = response.status_code if response is not None else "no response"
+                logger.warning("%s %s failed (%s); giving up", method, url, status)
+                return None
+            self.stats.retries += 1
+            await asyncio.sleep(delay)
+        return None
+
+    async def _collect(self) -> list[Op]:
+        """Wait for the first op, then linger up to flush_interval_s to fill the batch."""
+        ops = [await self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval_s
+        while len(ops) < self.batch_size:
+            if not self._queue.empty():
+                ops.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._flush_now.is_set():
+                break
+            with contextlib.suppress(asyncio.TimeoutError):
+                ops.append(await asyncio.wait_for(self._queue.get(), min(remaining, 0.01)))
+        return ops
+
+    async def _worker(self) -> None:
+        while True:
+            ops = await self._collect()
+            for kind, run_id, bodies in batches(ops, self.batch_size):
+                try:
+                    ok = await self._request(*request_for(kind, run_id, bodies)) is not None
+                except Exception:
+                    logger.exception("sending %s for run %s failed", kind, run_id)
+                    ok = False
+                self._record(ok, len(bodies))
+            for _ in ops:
+                self._queue.task_done()
+
+    async def flush(self, timeout_s: float | None = None) -> bool:
+        """Wait until everything buffered so far was sent (or given up on); False on timeout."""
+        self._flush_now.set()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout_s)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._flush_now.clear()
+
+    async def aclose(self, timeout_s: float = 10.0) -> None:
+        """Flush (bounded by timeout_s) and stop the background task."""
+        if self._closed:
+            return
+        await self.flush(timeout_s)
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        await self._http.aclose()
+
+    async def __aenter__(self) -> AsyncClient:
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.aclose()
+
+    async def start_run(self, agent_name: str, input_prompt: str) -> int:
+        """Create a run and return its id. This call waits for the server (with safe retries)."""
+        body = self._run_body(agent_name, input_prompt)
+        response = await self._request("POST", "/runs", body)
+        if response is None:
+            raise RuntimeError("could not create run")
+        return response.json()["id"]
+
+    @contextlib.asynccontextmanager
+    async def run(self, agent_name: str, input_prompt: str) -> AsyncIterator[Run]:
+        """Create a run, make it the current run for steps, and finish it on exit."""
+        run = Run(await self.start_run(agent_name, input_prompt))
+        token = current_run.set(run.id)
+        try:
+            yield run
+        except BaseException as e:
+            self.finish_run(run.id, **self._finish_body(run, e))
+            raise
+        else:
+            self.finish_run(run.id, **self._finish_body(run, None))
+        finally:
+            current_run.reset(token)
@@ -0,0 +1,195 @@
+"""Synchronous client: steps are buffered and sent by a background thread."""
+
+from __future__ import annotations
+
+import atexit
+import contextlib
+import queue
+import threading
+import time
+from typing import Any, Iterator
+
+import httpx
+
+from orchestrai_client._core import (
+    BaseClient,
+    Op,
+    Run,
+    batches,
+    current_run,
+    logger,
+    request_for,
+    retry_delay,
+)
+
+
+class Client(BaseClient):
+    """Logs runs and steps to an OrchestrAI backend without blocking the agent.
+
+        client = Client("http://localhost:8000")
+        with client.run("my-agent", prompt) as run:
+            with client.step("search", input={"q": q}) as step:
+                step.output = {"hits": search(q)}
+            run.output = answer
+
+    `log_step` only appends to a bounded in-memory buffer; a daemon thread sends it in
+    `POST /runs/{id}/steps/batch` requests of up to `batch_size` steps, waiting up to
+    `flush_interval_s` for a batch to fill. Failed requests are retried with backoff (honouring
+    Retry-After), and the buffer is flushed at interpreter exit.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        *,
+        batch_size: int = 100,
+        flush_interval_s: float = 0.2,
+        max_buffer: int = 10_000,
+        max_retries: int = 5,
+        backoff_s: float = 0.2,
+        max_backoff_s: float = 10.0,
+        timeout_s: float = 10.0,
+        headers: dict[str, str] | None = None,
+        transport: httpx.BaseTransport | None = None,
+        flush_on_exit: bool = True,
+    ) -> None:
+        super().__init__(
+            base_url,
+            batch_size=batch_size,
+            flush_interval_s=flush_interval_s,
+            max_buffer=max_buffer,
+            max_retries=max_retries,
+            backoff_s=backoff_s,
+            max_backoff_s=max_backoff_s,
+        )
+        self._http = httpx.Client(
+            base_url=self.base_url, timeout=timeout_s, headers=headers, transport=transport
+        )
+        self._queue: queue.Queue[Op] = queue.Queue(maxsize=max_buffer)
+        self._flush_now = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._worker, name="orchestrai-flush", daemon=True)
+        self._thread.start()
+        self._atexit = flush_on_exit
+        if flush_on_exit:
+            atexit.register(self.close)
+
+    def _enqueue(self, op: Op) -> bool:
+        if self._closed.is_set():
+            raise RuntimeError("client is closed")
+        try:
+            self._queue.put_nowait(op)
+        except queue.Full:
+            self._dropped()
+            return False
+        self.stats.enqueued += 1
+        return True
+
+    def _request(self, method: str, url: str, body: Any) -> httpx.Response | None:
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                self.stats.requests += 1
+                response = self._http.request(method, url, json=body)
+                if response.status_code < 400:
+                    return response
+            except httpx.TransportError as e:
+                logger.debug("%s %s failed: %s", method, url, e)
+            delay = retry_delay(attempt, response, self.backoff_s, self.max_backoff_s)
+            if delay is None or attempt == self.max_retries:
+                status = response.status_code if response is not None else "no response"
+                logger.warning("%s %s failed (%s); giving up", method, url, status)
+                return None
+            self.stats.retries += 1
+            time.sleep(delay)
+        return None
+
+    def _collect(self) -> list[Op]:
+        """Block for the first op, then linger up to flush_interval_s to fill the batch."""
+        try:
+            ops = [self._queue.get(timeout=self.flush_interval_s)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval_s
+        while len(ops) < self.batch_size:
+            try:
+                ops.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._flush_now.is_set() or self._closed.is_set():
+                break
+            try:
+                ops.append(self._queue.get(timeout=min(remaining, 0.01)))
+            except queue.Empty:
+                pass
+        return ops
+
+    def _worker(self) -> None:
+        while not (self._closed.is_set() and self._queue.empty()):
+            ops = self._collect()
+            for kind, run_id, bodies in batches(ops, self.batch_size):
+                try:
+                    ok = self._request(*request_for(kind, run_id, bodies)) is not None
+                except Exception:
+                    logger.exception("sending %s for run %s failed", kind, run_id)
+                    ok = False
+                self._record(ok, len(bodies))
+            for _ in ops:
+                self._queue.task_done()
+
+    def flush(self, timeout_s: float | None = None) -> bool:
+        """Wait until everything buffered so far was sent (or given up on); False on timeout."""
+        deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        self._flush_now.set()
+        try:
+            with self._queue.all_tasks_done:
+                while self._queue.unfinished_tasks:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._queue.all_tasks_done.wait(remaining)
+            return True
+        finally:
+            self._flush_now.clear()
+
+    def close(self, timeout_s: float = 10.0) -> None:
+        """Flush (bounded by timeout_s) and stop the background thread."""
+        if self._closed.is_set():
+            return
+        if self._atexit:
+            atexit.unregister(self.close)
+        self.flush(timeout_s)
+        self._closed.set()
+        self._thread.join(timeout=1.0)
+        self._http.close()
+
+    def __enter__(self) -> Client:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def start_run(self, agent_name: str, input_prompt: str) -> int:
+        """Create a run and return its id. This call waits for the server (with safe retries)."""
+        body = self._run_body(agent_name, input_prompt)
+        response = self._request("POST", "/runs", body)
+        if response is None:
+            raise RuntimeError("could not create run")
+        return response.json()["id"]
+
+    @contextlib.contextmanager
+    def run(self, agent_name: str, input_prompt: str) -> Iterator[Run]:
+        """Create a run, make it the current run for steps, and finish it on exit."""
+        run = Run(self.start_run(agent_name, input_prompt))
+        token = current_run.set(run.id)
+        try:
+            yield run
+        except BaseException as e:
+            self.finish_run(run.id, **self._finish_body(run, e))
+            raise
+        else:
+            self.finish_run(run.id, **self._finish_body(run, None))
+        finally:
+            current_run.reset(token)
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import httpx
+
+from orchestrai_client import AsyncClient, Client
+
+
+class FakeBackend:
+    def __init__(self, fail_first: int = 0, status: int = 503):
+        self.requests = []
+        self.delivered = []
+        self.fail_first = fail_first
+        self.status = status
+
+    def __call__(self, request):
+        body = json.loads(request.content) if request.content else None
+        self.requests.append((request.method, request.url.path, body))
+        if request.url.path.endswith("/steps/batch") and self.fail_first:
+            self.fail_first -= 1
+            return httpx.Response(self.status, headers={"Retry-After": "0"})
+        self.delivered.append(body)
+        if request.url.path == "/runs":
+            return httpx.Response(200, json={"id": 7})
+        return httpx.Response(200, json={"ok": True})
+
+    def steps(self):
+        return [s for body in self.delivered if body and "steps" in body for s in body["steps"]]
+
+
+def test_sync_client_batches_steps_in_order_and_finishes_run():
+    backend = FakeBackend()
+    client = Client("http://backend", transport=httpx.MockTransport(backend), flush_on_exit=False)
+
+    @client.trace(step_type="tool_call")
+    def search(query):
+        return ["a", "b"]
+
+    with client:
+        with client.run("agent", "hello") as run:
+            search("q")
+            with client.step("llm", "llm_call", input={"prompt": "p"}) as step:
+                step.output = {"text": "t"}
+                step.tokens = 3
+            run.output = "done"
+
+    steps = backend.steps()
+    assert [s["name"] for s in steps] == [search.__qualname__, "llm"]
+    assert [s["seq"] for s in steps] == [0, 1]
+    assert steps[0]["input"] == {"query": "q"} and steps[0]["output"] == {"result": ["a", "b"]}
+    assert steps[1]["latency_ms"] >= 0 and steps[1]["tokens"] == 3
+    assert len({s["idempotency_key"] for s in steps}) == 2
+    finish = {"status": "success", "final_output": "done"}
+    assert backend.requests[-1] == ("PATCH", "/runs/7", finish)
+    assert client.stats.sent == 3 and client.stats.failed == 0
+
+
+def test_sync_client_retries_then_gives_up_on_client_errors():
+    backend = FakeBackend(fail_first=2)
+    client = Client(
+        "http://backend", transport=httpx.MockTransport(backend), backoff_s=0, flush_on_exit=False
+    )
+    client.log_step("agent_log", "retried", run_id=1)
+    assert client.flush(5)
+    assert client.stats.retries == 2 and client.stats.sent == 1
+
+    backend.fail_first, backend.status = 1, 422
+    client.log_step("agent_log", "rejected", run_id=1)
+    client.close()
+    assert client.stats.failed == 1 and client.stats.retries == 2
+
+
+def test_async_client_flushes_on_close():
+    backend = FakeBackend(fail_first=1)
+
+    async def agent():
+        transport = httpx.MockTransport(backend)
+        async with AsyncClient("http://backend", transport=transport, backoff_s=0) as client:
+            async with client.run("agent", "hello"):
+                for i in range(250):
+                    client.log_step("tool_call", f"step-{i}")
+        return client
+
+    client = asyncio.run(agent())
+    assert [s["seq"] for s in backend.steps()] == list(range(250))
+    assert backend.requests[-1][0] == "PATCH"
+    assert client.stats.sent == 251 and client.stats.retries == 1